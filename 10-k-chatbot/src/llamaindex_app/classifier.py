@@ -1,5 +1,6 @@
 from enum import Enum
-from typing import Tuple
+from typing import AsyncIterator, Dict, List, Tuple
+import asyncio
 import logging
 from llama_index.core import Response
 from pydantic import BaseModel, Field
@@ -36,10 +37,27 @@ class QueryCategory(str, Enum):
     OUT_OF_SCOPE = "out_of_scope"
 
 
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def _iter_stream_deltas(stream) -> AsyncIterator[str]:
+    """Yield text deltas from an OpenAI stream, closing it when done or abandoned."""
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+        if close:
+            await close()
+
+
 class QueryClassifier:
-    def __init__(self, query_engine, openai_client):
+    def __init__(self, query_engine, openai_client, async_openai_client=None):
         self.query_engine = query_engine
         self.openai_client = openai_client
+        self.async_openai_client = async_openai_client
         self.risk_tools = RiskScoringTools.get_all_tools()
         self.settings = Settings()
         self.tracer = trace.get_tracer(__name__)
@@ -57,19 +75,45 @@ class QueryClassifier:
             logger.error(f"Failed to parse classification response: {e}")
             raise
 
+    def _completion_kwargs(self, system_prompt: str, query: str) -> Dict:
+        return {
+            "model": self.settings.OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": query},
+            ],
+            "temperature": 0,
+            "max_tokens": 4096,
+        }
+
     def _call_openai(self, system_prompt: str, query: str, span=None) -> str:
         try:
             if span:
                 span.set_attribute(SpanAttributes.LLM_PROMPT_TEMPLATE, system_prompt)
 
             response = self.openai_client.chat.completions.create(
-                model=self.settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query},
-                ],
-                temperature=0,
-                max_tokens=4096,
+                **self._completion_kwargs(system_prompt, query)
+            )
+
+            return response.choices[0].message.content
+        except Exception as e:
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise OpenAIError(f"OpenAI API error: {str(e)}")
+
+    async def _acall_openai(self, system_prompt: str, query: str, span=None) -> str:
+        if self.async_openai_client is None:
+            return await asyncio.to_thread(
+                self._call_openai, system_prompt, query, span
+            )
+
+        try:
+            if span:
+                span.set_attribute(SpanAttributes.LLM_PROMPT_TEMPLATE, system_prompt)
+
+            response = await self.async_openai_client.chat.completions.create(
+                **self._completion_kwargs(system_prompt, query)
             )
 
             return response.choices[0].message.content
@@ -79,6 +123,31 @@ class QueryClassifier:
                 span.record_exception(e)
             raise OpenAIError(f"OpenAI API error: {str(e)}")
 
+    async def _astream_openai(
+        self, system_prompt: str, query: str, span=None
+    ) -> AsyncIterator[str]:
+        """Start a streaming completion and return an iterator of text deltas."""
+        if self.async_openai_client is None:
+            response_text = await self._acall_openai(system_prompt, query, span)
+            return _single_chunk(response_text)
+
+        try:
+            if span:
+                span.set_attribute(SpanAttributes.LLM_PROMPT_TEMPLATE, system_prompt)
+
+            stream = await self.async_openai_client.chat.completions.create(
+                **self._completion_kwargs(system_prompt, query),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+        except Exception as e:
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise OpenAIError(f"OpenAI API error: {str(e)}")
+
+        return _iter_stream_deltas(stream)
+
     def classify_query(self, query: str, span=None) -> Tuple[QueryCategory, float]:
         template_vars = {"query": str(query)}
 
@@ -97,24 +166,90 @@ class QueryClassifier:
 
         return QueryCategory(classification.category), classification.confidence
 
+    async def aclassify_query(
+        self, query: str, span=None
+    ) -> Tuple[QueryCategory, float]:
+        template_vars = {"query": str(query)}
+
+        with using_prompt_template(
+            template=CLASSIFICATION_PROMPT,
+            variables=template_vars,
+            version=TEMPLATE_VERSION,
+        ):
+            formatted_prompt = CLASSIFICATION_PROMPT.format(**template_vars)
+            output = await self._acall_openai(formatted_prompt, query, span)
+            classification = self._parse_classification_response(output)
+
+        if span:
+            span.set_attribute("query.category", classification.category)
+            span.set_attribute("query.confidence", classification.confidence)
+
+        return QueryCategory(classification.category), classification.confidence
+
+    def _rag_template_vars(self, query: str, nodes: List) -> Dict[str, str]:
+        # Create a dictionary of context variables, with empty strings as defaults
+        template_vars = {
+            "context_1": "",
+            "context_2": "",
+            "context_3": "",
+            "query": str(query),
+        }
+
+        # Fill in available contexts from nodes
+        for i, node in enumerate(nodes, start=1):
+            if i <= 3:  # Only use first 3 nodes
+                template_vars[f"context_{i}"] = str(node.text)
+
+        return template_vars
+
     def get_response(self, query: str, category: QueryCategory, span=None) -> Response:
         try:
             if category == QueryCategory.ASSURANT_10K:
                 try:
                     nodes = self.query_engine.retrieve(query)
+                    template_vars = self._rag_template_vars(query, nodes)
+
+                    with using_prompt_template(
+                        template=RAG_PROMPT,
+                        variables=template_vars,
+                        version=TEMPLATE_VERSION,
+                    ):
+                        formatted_prompt = RAG_PROMPT.format(**template_vars)
+                        response_text = self._call_openai(formatted_prompt, query, span)
 
-                    # Create a dictionary of context variables, with empty strings as defaults
-                    template_vars = {
-                        "context_1": "",
-                        "context_2": "",
-                        "context_3": "",
-                        "query": str(query),
-                    }
+                    return Response(response=response_text, source_nodes=nodes)
+                except Exception as e:
+                    logger.error(
+                        f"Error in Assurant 10-K response generation: {str(e)}"
+                    )
+                    raise
+            elif category == QueryCategory.RISK_ASSESSMENT:
+                tool = next(
+                    t
+                    for t in self.risk_tools
+                    if t.metadata.name == "calculate_risk_score"
+                )
+                result = tool()
+                return Response(response=result)
+            else:
+                return Response(
+                    response="I'm trained to help with questions about Assurant's recent 10-K reports and risk assessment inquiries. How can I assist you with either of these topics?"
+                )
+        except Exception as e:
+            logger.error(f"Error getting response: {str(e)}")
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise
 
-                    # Fill in available contexts from nodes
-                    for i, node in enumerate(nodes, start=1):
-                        if i <= 3:  # Only use first 3 nodes
-                            template_vars[f"context_{i}"] = str(node.text)
+    async def aget_response(
+        self, query: str, category: QueryCategory, span=None
+    ) -> Response:
+        try:
+            if category == QueryCategory.ASSURANT_10K:
+                try:
+                    nodes = await self.query_engine.aretrieve(query)
+                    template_vars = self._rag_template_vars(query, nodes)
 
                     with using_prompt_template(
                         template=RAG_PROMPT,
@@ -122,7 +257,9 @@ class QueryClassifier:
                         version=TEMPLATE_VERSION,
                     ):
                         formatted_prompt = RAG_PROMPT.format(**template_vars)
-                        response_text = self._call_openai(formatted_prompt, query, span)
+                        response_text = await self._acall_openai(
+                            formatted_prompt, query, span
+                        )
 
                     return Response(response=response_text, source_nodes=nodes)
                 except Exception as e:
@@ -148,3 +285,51 @@ class QueryClassifier:
                 span.set_status(Status(StatusCode.ERROR))
                 span.record_exception(e)
             raise
+
+    async def astream_response(
+        self, query: str, category: QueryCategory, span=None
+    ) -> Tuple[List, AsyncIterator[str]]:
+        """
+        Like aget_response, but returns the source nodes and an iterator of
+        response text deltas as soon as generation starts.
+        """
+        try:
+            if category == QueryCategory.ASSURANT_10K:
+                try:
+                    nodes = await self.query_engine.aretrieve(query)
+                    template_vars = self._rag_template_vars(query, nodes)
+
+                    with using_prompt_template(
+                        template=RAG_PROMPT,
+                        variables=template_vars,
+                        version=TEMPLATE_VERSION,
+                    ):
+                        formatted_prompt = RAG_PROMPT.format(**template_vars)
+                        deltas = await self._astream_openai(
+                            formatted_prompt, query, span
+                        )
+
+                    return nodes, deltas
+                except Exception as e:
+                    logger.error(
+                        f"Error in Assurant 10-K response generation: {str(e)}"
+                    )
+                    raise
+            elif category == QueryCategory.RISK_ASSESSMENT:
+                tool = next(
+                    t
+                    for t in self.risk_tools
+                    if t.metadata.name == "calculate_risk_score"
+                )
+                result = tool()
+                return [], _single_chunk(str(result))
+            else:
+                return [], _single_chunk(
+                    "I'm trained to help with questions about Assurant's recent 10-K reports and risk assessment inquiries. How can I assist you with either of these topics?"
+                )
+        except Exception as e:
+            logger.error(f"Error getting response: {str(e)}")
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise
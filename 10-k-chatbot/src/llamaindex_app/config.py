@@ -51,6 +51,14 @@ class Settings(BaseSettings):
     STORAGE_DIR: str = str(Path("storage").absolute())
     CHUNK_SIZE: int = 1024
     CHUNK_OVERLAP: int = 20
+    # Fuse BM25 keyword hits with vector hits by reciprocal rank, which helps
+    # exact terms (standard numbers, part numbers, fiscal years)
+    HYBRID_SEARCH: bool = False
+    HYBRID_CANDIDATES: int = 20  # Hits taken from each ranking before fusion
+    HYBRID_RRF_K: int = 60
+    # Restrict retrieval to the fiscal years a question names ("2024 net
+    # income"), read from the 10-K file names at ingestion
+    METADATA_FILTERS: bool = False
     COLLECTOR_ENDPOINT: str = "https://otlp.arize.com/v1"
 
     # OpenAI settings
@@ -71,6 +79,10 @@ class Settings(BaseSettings):
     API_MAX_RETRIES: int = 3
     API_RETRY_DELAY: int = 1
 
+    # Async pipeline settings
+    RETRIEVAL_WORKERS: int = 4  # Threads for query embedding + vector search
+    GUARD_WORKERS: int = 32  # Threads for the blocking guard LLM calls
+
     # Phoenix settings
     phoenix_project_name: str = "10k-chatbot"
 
@@ -80,11 +92,12 @@ class Settings(BaseSettings):
         extra = "allow"
 
 
-def validate_query_for_jailbreak(query: str) -> bool:
+def validate_query_for_jailbreak(query: str, api_key: Optional[str] = None) -> bool:
     """
     Validate input for potential jailbreak attempts
 
     :param query: Input query to validate
+    :param api_key: OpenAI API key, defaults to OPENAI_API_KEY from the environment
     :return: True if safe, False if jailbreak detected
     """
     JAILBREAK_TEMPLATE = """
@@ -106,7 +119,7 @@ def validate_query_for_jailbreak(query: str) -> bool:
         expect_df = llm_classify(
             dataframe=df_in,
             template=JAILBREAK_TEMPLATE,
-            model=OpenAIModel(model="gpt-4o"),
+            model=OpenAIModel(model="gpt-4o", api_key=api_key),
             rails=rails,
             provide_explanation=True,
         )
@@ -119,11 +132,14 @@ def validate_query_for_jailbreak(query: str) -> bool:
         return False
 
 
-def validate_query_for_toxic_language(query: str) -> bool:
+def validate_query_for_toxic_language(
+    query: str, api_key: Optional[str] = None
+) -> bool:
     """
     Validate input for toxic language
 
     :param query: Input query to validate
+    :param api_key: OpenAI API key, defaults to OPENAI_API_KEY from the environment
     :return: True if safe, False if toxic language detected
     """
     TOXICITY_TEMPLATE = """
@@ -151,7 +167,7 @@ def validate_query_for_toxic_language(query: str) -> bool:
         expect_df = llm_classify(
             dataframe=df_in,
             template=TOXICITY_TEMPLATE,
-            model=OpenAIModel(model="gpt-4o"),
+            model=OpenAIModel(model="gpt-4o", api_key=api_key),
             rails=rails,
             provide_explanation=True,
         )
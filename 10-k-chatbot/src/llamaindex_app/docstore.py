@@ -0,0 +1,205 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import sqlite3
+import threading
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseKVStore
+
+logger = logging.getLogger(__name__)
+
+DOCSTORE_FILE = "docstore.sqlite"
+LEGACY_DOCSTORE_FILE = "docstore.json"
+
+
+class SQLiteKVStore(BaseKVStore):
+    """
+    Key-value store in a SQLite table, read one key at a time.
+
+    Values are stored as JSON text. A small LRU of recently read values
+    keeps hot nodes from hitting SQLite on every query.
+    """
+
+    def __init__(self, path: str, cache_size: int = 256):
+        self.path = str(path)
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (collection, key))"
+        )
+        db.commit()
+        return db
+
+    def move(self, path: str):
+        """Atomically move the database to path and reopen it there."""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+            os.replace(self.path, path)
+            self.path = str(path)
+            self._db = self._connect()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, cache_key: Tuple[str, str], value: str):
+        if self._cache_size <= 0:
+            return
+        self._cache[cache_key] = value
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(
+        self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = 1,
+    ) -> None:
+        rows = [(collection, key, json.dumps(val)) for key, val in kv_pairs]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", rows)
+            self._db.commit()
+            for _, key, _ in rows:
+                self._cache.pop((collection, key), None)
+
+    async def aput_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = 1,
+    ) -> None:
+        self.put_all(kv_pairs, collection=collection, batch_size=batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        cache_key = (collection, key)
+        with self._lock:
+            value = self._cache.get(cache_key)
+            if value is not None:
+                self._cache.move_to_end(cache_key)
+            else:
+                row = self._db.execute(
+                    "SELECT value FROM kv WHERE collection = ? AND key = ?",
+                    (collection, key),
+                ).fetchone()
+                if row is None:
+                    return None
+                value = row[0]
+                self._remember(cache_key, value)
+        # Parse a fresh dict each time so callers cannot mutate cached values
+        return json.loads(value)
+
+    async def aget(
+        self, key: str, collection: str = DEFAULT_COLLECTION
+    ) -> Optional[dict]:
+        return self.get(key, collection=collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM kv WHERE collection = ?", (collection,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection=collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            ).rowcount
+            self._db.commit()
+            self._cache.pop((collection, key), None)
+        return deleted > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """
+    Docstore that reads nodes from SQLite on demand instead of parsing the
+    whole docstore.json at startup.
+
+    Writes go straight to the database. ``persist`` moves a store that was
+    built elsewhere (e.g. a temporary file during a rebuild) into place as
+    ``docstore.sqlite``, so readers of the previous file are not disturbed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache_size: int = 256,
+        namespace: Optional[str] = None,
+        batch_size: int = 100,
+    ):
+        super().__init__(
+            SQLiteKVStore(path, cache_size), namespace=namespace, batch_size=batch_size
+        )
+
+    @property
+    def path(self) -> str:
+        return self._kvstore.path
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return (Path(persist_dir) / DOCSTORE_FILE).exists()
+
+    @classmethod
+    def from_persist_dir(
+        cls, persist_dir: str, cache_size: int = 256
+    ) -> "SQLiteDocumentStore":
+        return cls(str(Path(persist_dir) / DOCSTORE_FILE), cache_size)
+
+    @classmethod
+    def from_docstore_json(
+        cls, json_path: str, db_path: str, cache_size: int = 256
+    ) -> "SQLiteDocumentStore":
+        """Convert a persisted SimpleDocumentStore (docstore.json)."""
+        with open(json_path, encoding="utf-8") as f:
+            collections: Dict[str, Dict[str, Any]] = json.load(f)
+
+        tmp_path = f"{db_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        kvstore = SQLiteKVStore(tmp_path)
+        for collection, values in collections.items():
+            kvstore.put_all(list(values.items()), collection=collection)
+        kvstore.move(db_path)
+        kvstore.close()
+
+        logger.info(f"Converted {json_path} to {db_path}")
+        return cls(db_path, cache_size)
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Persist next to ``persist_path``.
+
+        The storage context passes the legacy ``docstore.json`` path; the
+        database is moved beside it as ``docstore.sqlite`` if it lives
+        elsewhere, and is otherwise already up to date.
+        """
+        target = str(Path(persist_path).with_name(DOCSTORE_FILE))
+        if os.path.abspath(target) != os.path.abspath(self.path):
+            self._kvstore.move(target)
+            logger.info(f"Persisted docstore to {target}")
@@ -0,0 +1,131 @@
+from typing import Any, List, Optional, Sequence
+import logging
+import time
+from llama_index.core import QueryBundle
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from opentelemetry import trace
+from src.llamaindex_app.lexical_index import BM25Index, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+
+def index_node_ids(index) -> List[str]:
+    """Docstore ids of the index's nodes, in insertion order."""
+    return list(index.index_struct.nodes_dict.values())
+
+
+def node_metadata(index, node_ids: Sequence[str]) -> List[dict]:
+    """Metadata of the given nodes."""
+    return [node.metadata for node in index.docstore.get_nodes(list(node_ids))]
+
+
+def node_texts(index, node_ids: Sequence[str]) -> List[str]:
+    """Texts of the given nodes, as they were embedded."""
+    return [
+        node.get_content(metadata_mode=MetadataMode.EMBED)
+        for node in index.docstore.get_nodes(list(node_ids))
+    ]
+
+
+def _filter_query(prefilter, query: str):
+    """Filters for the metadata values a query names, tagged on the span."""
+    if prefilter is None:
+        return None
+    filters = prefilter.parse(query)
+    if filters is not None:
+        summary = "; ".join(
+            f"{f.key}={','.join(map(str, f.value))}" for f in filters.filters
+        )
+        trace.get_current_span().set_attribute("retrieval.filter", summary)
+    return filters
+
+
+class ScopedRetriever(BaseRetriever):
+    """
+    Vector retriever restricted to the nodes with the metadata values a
+    query names, as parsed by a MetadataPreFilter (see metadata_filters).
+    """
+
+    def __init__(self, index, prefilter, similarity_top_k: int = 3, **kwargs: Any):
+        self._index = index
+        self.prefilter = prefilter
+        self.similarity_top_k = similarity_top_k
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        filters = _filter_query(self.prefilter, query_bundle.query_str)
+        return self._index.as_retriever(
+            similarity_top_k=self.similarity_top_k, filters=filters
+        ).retrieve(query_bundle)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses the index's vector hits with BM25 keyword hits.
+
+    The best ``hybrid_candidates`` hits of each ranking are fused by
+    reciprocal rank and the best ``similarity_top_k`` are returned, with
+    the fused scores as node scores. Keyword-only hits are loaded from the
+    docstore.
+
+    With a MetadataPreFilter, both rankings only keep the nodes with the
+    metadata values a query names.
+    """
+
+    def __init__(
+        self,
+        index,
+        lexical: BM25Index,
+        similarity_top_k: int = 3,
+        hybrid_candidates: int = 20,
+        rrf_k: int = 60,
+        prefilter: Optional[Any] = None,
+        **kwargs: Any,
+    ):
+        self._index = index
+        self._docstore = index.docstore
+        self.lexical = lexical
+        self.prefilter = prefilter
+        self.similarity_top_k = similarity_top_k
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        filters = _filter_query(self.prefilter, query_bundle.query_str)
+        vector_nodes = self._index.as_retriever(
+            similarity_top_k=max(self.similarity_top_k, self.hybrid_candidates),
+            filters=filters,
+        ).retrieve(query_bundle)
+        nodes = {n.node.node_id: n.node for n in vector_nodes}
+
+        start = time.perf_counter()
+        lexical_hits = self.lexical.search(
+            query_bundle.query_str, self.hybrid_candidates
+        )
+        span = trace.get_current_span()
+        span.set_attribute("retrieval.lexical_ms", (time.perf_counter() - start) * 1000)
+        span.set_attribute("retrieval.lexical_hits", len(lexical_hits))
+        if filters is not None:
+            # The BM25 index is not partitioned, so filter its hits afterwards
+            missing = [node_id for node_id, _ in lexical_hits if node_id not in nodes]
+            for node in self._docstore.get_nodes(missing):
+                nodes[node.node_id] = node
+            lexical_hits = [
+                (node_id, score)
+                for node_id, score in lexical_hits
+                if self.prefilter.matches(nodes[node_id].metadata, filters)
+            ]
+
+        hits = reciprocal_rank_fusion(
+            [[(n.node.node_id, n.score) for n in vector_nodes], lexical_hits],
+            self.similarity_top_k,
+            self.rrf_k,
+        )
+        missing = [node_id for node_id, _ in hits if node_id not in nodes]
+        for node in self._docstore.get_nodes(missing):
+            nodes[node.node_id] = node
+        return [
+            NodeWithScore(node=nodes[node_id], score=score) for node_id, score in hits
+        ]
@@ -1,4 +1,8 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import asyncio
+import contextvars
 import logging
 from llama_index.core import (
     SimpleDirectoryReader,
@@ -7,22 +11,62 @@ from llama_index.core import (
     load_index_from_storage,
     Settings as LlamaSettings,
 )
+from llama_index.core.schema import BaseNode
 from llama_index.llms.openai import OpenAI as LlamaOpenAI
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from phoenix.trace import suppress_tracing
 from tenacity import retry, stop_after_attempt, wait_exponential
 from src.llamaindex_app.config import Settings
+from src.llamaindex_app.hybrid_retriever import (
+    HybridRetriever,
+    ScopedRetriever,
+    index_node_ids,
+    node_metadata,
+    node_texts,
+)
+from src.llamaindex_app.lexical_index import BM25Index
+from src.llamaindex_app.manifest import IngestionManifest, replace_file_nodes
+from src.llamaindex_app.metadata_filters import MetadataPreFilter, file_metadata
+from src.llamaindex_app.docstore import (
+    DOCSTORE_FILE,
+    LEGACY_DOCSTORE_FILE,
+    SQLiteDocumentStore,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# Bounded pool for the CPU-bound query embedding + vector search step
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_retrieval_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Get the process-wide retrieval thread pool, creating it on first use."""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="retrieval"
+        )
+    return _retrieval_executor
+
+
 class QueryEngine:
-    def __init__(self, retriever):
+    def __init__(self, retriever, executor: Optional[ThreadPoolExecutor] = None):
         self.retriever = retriever
+        self.executor = executor
 
     def retrieve(self, query: str):
         return self.retriever.retrieve(query)
 
+    async def aretrieve(self, query: str):
+        """Retrieve on the bounded retrieval pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry the tracing context into the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, ctx.run, self.retriever.retrieve, query
+        )
+
 
 class IndexManager:
     def __init__(self, openai_client=None):
@@ -60,25 +104,78 @@ class IndexManager:
                 )
                 logger.warning("To install: pip install llama-index-llms-openai")
 
+    def _load_docstore(self) -> SQLiteDocumentStore:
+        """Open the SQLite docstore, converting a legacy docstore.json."""
+        persist_dir = str(self.storage_path)
+        if SQLiteDocumentStore.exists(persist_dir):
+            return SQLiteDocumentStore.from_persist_dir(persist_dir)
+
+        logger.info(f"Converting {LEGACY_DOCSTORE_FILE} to SQLite")
+        return SQLiteDocumentStore.from_docstore_json(
+            str(self.storage_path / LEGACY_DOCSTORE_FILE),
+            str(self.storage_path / DOCSTORE_FILE),
+        )
+
+    def _get_data_path(self) -> Path:
+        """Get the data directory path."""
+        # This path should point to the root 'data' folder, not 'src/data'
+        project_root = Path(
+            __file__
+        ).parent.parent.parent  # Go up from src/llamaindex_app to the project root
+        return project_root / "data"
+
+    def _get_pdf_files(self) -> List[str]:
+        """Get the paths of the PDF files to index."""
+        data_path = self._get_data_path()
+        logger.info(f"Using data path: {data_path}")
+
+        # Specify exact filenames
+        filenames = ["Arize AI Docs.pdf"]
+
+        # Check if files exist
+        pdf_files = []
+        for filename in filenames:
+            file_path = data_path / filename
+            logger.info(f"Checking for file: {file_path}")
+            if file_path.exists():
+                pdf_files.append(str(file_path))
+                logger.info(f"File found: {file_path}")
+            else:
+                logger.error(f"File not found: {file_path}")
+                # List files in the data directory to help debug
+                if data_path.exists():
+                    logger.info(
+                        f"Files in data directory: {[f.name for f in data_path.iterdir() if f.is_file()]}"
+                    )
+                else:
+                    logger.error(f"Data directory does not exist: {data_path}")
+                raise FileNotFoundError(f"File not found: {file_path}")
+        return pdf_files
+
     @retry(
         stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)
     )
     def load_or_create_index(self):
+        """Load the persisted index and re-index changed files, or build a new one."""
         # Check if index already exists (pre-built in Docker image)
         if self.storage_path.exists() and any(self.storage_path.iterdir()):
             try:
                 logger.info("Loading existing index from storage...")
                 storage_context = StorageContext.from_defaults(
-                    persist_dir=str(self.storage_path)
+                    persist_dir=str(self.storage_path),
+                    docstore=self._load_docstore(),
                 )
                 index = load_index_from_storage(storage_context)
                 logger.info("Successfully loaded existing index")
-                return index
+                return self._update_index(index)
             except Exception as e:
                 logger.warning(f"Failed to load existing index: {e}")
                 # Fall through to create new index
 
-        # Create new index if loading failed or no index exists
+        return self._create_new_index()
+
+    def _create_new_index(self):
+        """Create a new index from the PDF files, replacing any stored one."""
         if not self.storage_path.exists():
             self.storage_path.mkdir(parents=True, exist_ok=True)
         elif any(self.storage_path.iterdir()):
@@ -89,57 +186,113 @@ class IndexManager:
 
         try:
             logger.info("Creating new index from specific PDF files...")
+            pdf_files = self._get_pdf_files()
+            nodes_by_file = self._parse_files(pdf_files)
 
-            # Determine the correct data path
-            # This path should point to the root 'data' folder, not 'src/data'
-            project_root = Path(
-                __file__
-            ).parent.parent.parent  # Go up from src/llamaindex_app to the project root
-            data_path = project_root / "data"
-
-            logger.info(f"Using data path: {data_path}")
-
-            # Specify exact filenames
-            filenames = ["Arize AI Docs.pdf"]
-
-            # Check if files exist
-            pdf_files = []
-            for filename in filenames:
-                file_path = data_path / filename
-                logger.info(f"Checking for file: {file_path}")
-                if file_path.exists():
-                    pdf_files.append(str(file_path))
-                    logger.info(f"File found: {file_path}")
-                else:
-                    logger.error(f"File not found: {file_path}")
-                    # List files in the data directory to help debug
-                    if data_path.exists():
-                        logger.info(
-                            f"Files in data directory: {[f.name for f in data_path.iterdir() if f.is_file()]}"
-                        )
-                    else:
-                        logger.error(f"Data directory does not exist: {data_path}")
-                    raise FileNotFoundError(f"File not found: {file_path}")
-
-            # Only proceed if we found both files
-            if len(pdf_files) == len(filenames):
-                documents = SimpleDirectoryReader(input_files=pdf_files).load_data()
-
-                logger.info(f"Loaded {len(documents)} documents, creating index...")
-                index = VectorStoreIndex.from_documents(
-                    documents, settings=LlamaSettings
-                )
+            logger.info(f"Loaded {len(pdf_files)} PDF files, creating index...")
+            storage_context = StorageContext.from_defaults(
+                docstore=SQLiteDocumentStore(str(self.storage_path / DOCSTORE_FILE))
+            )
+            index = VectorStoreIndex(
+                [node for nodes in nodes_by_file.values() for node in nodes],
+                storage_context=storage_context,
+            )
 
-                logger.info("Persisting index to storage...")
-                index.storage_context.persist(persist_dir=str(self.storage_path))
+            manifest = IngestionManifest()
+            for pdf_file, nodes in nodes_by_file.items():
+                manifest.record(pdf_file, [node.node_id for node in nodes])
 
-                return index
-            else:
-                raise ValueError(f"Expected 2 PDF files, but found {len(pdf_files)}")
+            logger.info("Persisting index to storage...")
+            index.storage_context.persist(persist_dir=str(self.storage_path))
+            manifest.save(str(self.storage_path))
+
+            return index
         except Exception as e:
             logger.error(f"Error creating index: {str(e)}")
             raise
 
+    def _parse_files(self, pdf_files: List[str]) -> Dict[str, List[BaseNode]]:
+        """Load and chunk PDF files, grouping the nodes by file."""
+        node_parser = LlamaSettings.node_parser
+        nodes_by_file: Dict[str, List[BaseNode]] = {}
+        for pdf_file in pdf_files:
+            # Tag each 10-K's nodes with its fiscal year for METADATA_FILTERS
+            documents = SimpleDirectoryReader(
+                input_files=[pdf_file], file_metadata=file_metadata
+            ).load_data()
+            nodes_by_file[pdf_file] = node_parser.get_nodes_from_documents(documents)
+        return nodes_by_file
+
+    def _bootstrap_manifest(self, index) -> IngestionManifest:
+        """Build the manifest of an up-to-date index persisted without one."""
+        node_ids: Dict[str, List[str]] = {}
+        for ref_doc_info in index.docstore.get_all_ref_doc_info().values():
+            file_name = ref_doc_info.metadata.get("file_name")
+            if file_name:
+                node_ids.setdefault(file_name, []).extend(ref_doc_info.node_ids)
+
+        manifest = IngestionManifest()
+        for file_name, ids in node_ids.items():
+            manifest.record(str(self._get_data_path() / file_name), ids)
+        logger.info(f"Created ingestion manifest for {len(node_ids)} indexed files")
+        return manifest
+
+    def _update_index(self, index):
+        """
+        Re-index only the PDF files that changed since the manifest was
+        written: their old nodes are deleted and the new ones embedded and
+        inserted, leaving every other file's nodes in place. A pre-built
+        index without a manifest is taken as up to date.
+        """
+        storage_dir = str(self.storage_path)
+        if not IngestionManifest.exists(storage_dir):
+            self._bootstrap_manifest(index).save(storage_dir)
+            return index
+
+        manifest = IngestionManifest.load(storage_dir)
+        changed, removed = manifest.diff(self._get_pdf_files())
+        if not changed and not removed:
+            manifest.save(storage_dir)
+            logger.info("Index is up to date, no re-indexing required")
+            return index
+
+        logger.info(
+            f"Re-indexing {len(changed)} changed and removing {len(removed)} "
+            "deleted files"
+        )
+        replace_file_nodes(index, manifest, self._parse_files(changed), removed)
+        index.storage_context.persist(persist_dir=storage_dir)
+        manifest.save(storage_dir)
+        return index
+
+    def _load_lexical_index(self) -> BM25Index:
+        """Load the persisted BM25 index, rebuilding it if the corpus changed."""
+        return BM25Index.load_or_build(
+            str(self.storage_path),
+            index_node_ids(self.index),
+            lambda ids: node_texts(self.index, ids),
+        )
+
+    def _load_prefilter(self) -> MetadataPreFilter:
+        """Collect the fiscal years in the index for query filters."""
+        return MetadataPreFilter.from_metadata(
+            node_metadata(self.index, index_node_ids(self.index))
+        )
+
     def get_query_engine(self):
-        retriever = self.index.as_retriever(similarity_top_k=3)
-        return QueryEngine(retriever=retriever)
+        prefilter = self._load_prefilter() if self.settings.METADATA_FILTERS else None
+        if self.settings.HYBRID_SEARCH:
+            retriever = HybridRetriever(
+                self.index,
+                self._load_lexical_index(),
+                similarity_top_k=3,
+                hybrid_candidates=self.settings.HYBRID_CANDIDATES,
+                rrf_k=self.settings.HYBRID_RRF_K,
+                prefilter=prefilter,
+            )
+        elif prefilter is not None:
+            retriever = ScopedRetriever(self.index, prefilter, similarity_top_k=3)
+        else:
+            retriever = self.index.as_retriever(similarity_top_k=3)
+        executor = get_retrieval_executor(self.settings.RETRIEVAL_WORKERS)
+        return QueryEngine(retriever=retriever, executor=executor)
@@ -0,0 +1,85 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set
+import logging
+import re
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.vector_stores import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+
+logger = logging.getLogger(__name__)
+
+_YEAR_PATTERN = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+
+# Values of each filterable field a query can name
+QUERY_PATTERNS: Dict[str, Pattern] = {"fiscal_year": _YEAR_PATTERN}
+
+
+def fiscal_year(file_name: str) -> Optional[int]:
+    """Fiscal year of a 10-K from its file name, e.g. "AIZ 10K - 2023.pdf"."""
+    match = _YEAR_PATTERN.search(Path(file_name).stem)
+    return int(match.group(1)) if match else None
+
+
+def file_metadata(file_path: str) -> Dict[str, Any]:
+    """SimpleDirectoryReader's file metadata plus the 10-K's fiscal year."""
+    metadata = default_file_metadata_func(file_path)
+    year = fiscal_year(file_path)
+    if year is not None:
+        metadata["fiscal_year"] = year
+    return metadata
+
+
+class MetadataPreFilter:
+    """
+    Parses the filterable values a query names (e.g. "2024" for
+    fiscal_year) into MetadataFilters, so retrieval only searches the
+    matching nodes. Only values present in the index are used, so a
+    number that names nothing indexed does not empty the results.
+    """
+
+    def __init__(
+        self,
+        values: Dict[str, Set[Any]],
+        patterns: Optional[Dict[str, Pattern]] = None,
+    ):
+        self.values = values
+        self.patterns = QUERY_PATTERNS if patterns is None else patterns
+
+    @classmethod
+    def from_metadata(
+        cls,
+        metadata: Iterable[Dict[str, Any]],
+        patterns: Optional[Dict[str, Pattern]] = None,
+    ) -> "MetadataPreFilter":
+        patterns = QUERY_PATTERNS if patterns is None else patterns
+        values: Dict[str, Set[Any]] = {field: set() for field in patterns}
+        for node_metadata in metadata:
+            for field in patterns:
+                if node_metadata.get(field) is not None:
+                    values[field].add(node_metadata[field])
+        logger.info(
+            "Metadata filters: "
+            + ", ".join(f"{len(v)} {field} values" for field, v in values.items())
+        )
+        return cls(values, patterns)
+
+    def parse(self, query: str) -> Optional[MetadataFilters]:
+        """Filters for the indexed values named in the query, or None."""
+        filters: List[MetadataFilter] = []
+        for field, pattern in self.patterns.items():
+            known = {str(value): value for value in self.values.get(field, ())}
+            matched = sorted(
+                {known[v] for v in pattern.findall(query) if v in known}, key=str
+            )
+            if matched:
+                filters.append(
+                    MetadataFilter(key=field, value=matched, operator=FilterOperator.IN)
+                )
+        return MetadataFilters(filters=filters) if filters else None
+
+    @staticmethod
+    def matches(metadata: Dict[str, Any], filters: MetadataFilters) -> bool:
+        return all(metadata.get(f.key) in f.value for f in filters.filters)
@@ -50,6 +50,7 @@ class Settings(BaseSettings):
     CHUNK_SIZE: int = 1024
     CHUNK_OVERLAP: int = 20
     COLLECTOR_ENDPOINT: str = "https://otlp.arize.com/v1"
+    VECTOR_STORE_DTYPE: str = "float32"  # or "float16" to halve the vector file
 
     # OpenAI settings
     OPENAI_API_KEY: str  # Required
@@ -67,6 +68,7 @@ class Settings(BaseSettings):
     API_TIMEOUT: int = 60
     API_MAX_RETRIES: int = 3
     API_RETRY_DELAY: int = 1
+    GUARD_WORKERS: int = 32  # Threads for the blocking guard LLM calls
 
     # Phoenix settings
     phoenix_project_name: str = "american-airlines-sustainability-chatbot"
@@ -1,15 +1,21 @@
 from pathlib import Path
+from typing import Dict, List
 import logging
 from llama_index.core import (
     SimpleDirectoryReader,
+    StorageContext,
     VectorStoreIndex,
+    load_index_from_storage,
     Settings as LlamaSettings,
 )
+from llama_index.core.schema import BaseNode
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.openai import OpenAI as LlamaOpenAI
 from phoenix.trace import suppress_tracing
 from tenacity import retry, stop_after_attempt, wait_exponential
 from src.llamaindex_app.config import Settings
+from src.llamaindex_app.manifest import IngestionManifest, replace_file_nodes
+from src.llamaindex_app.vector_store import MmapVectorStore
 
 logger = logging.getLogger(__name__)
 
@@ -57,11 +63,69 @@ class IndexManager:
                 )
                 logger.warning("To install: pip install llama-index-llms-openai")
 
+    def _get_data_path(self) -> Path:
+        """Get the data directory path."""
+        # This path should point to the root 'data' folder, not 'src/data'
+        project_root = Path(
+            __file__
+        ).parent.parent.parent  # Go up from src/llamaindex_app to the project root
+        return project_root / "data"
+
+    def _get_pdf_files(self) -> List[str]:
+        """Get the paths of the PDF files to index."""
+        data_path = self._get_data_path()
+        logger.info(f"Using data path: {data_path}")
+
+        # Specify exact filenames
+        filenames = ["AA - Sustainability 2023.pdf"]
+
+        # Check if files exist
+        pdf_files = []
+        for filename in filenames:
+            file_path = data_path / filename
+            logger.info(f"Checking for file: {file_path}")
+            if file_path.exists():
+                pdf_files.append(str(file_path))
+                logger.info(f"File found: {file_path}")
+            else:
+                logger.error(f"File not found: {file_path}")
+                # List files in the data directory to help debug
+                if data_path.exists():
+                    logger.info(
+                        f"Files in data directory: {[f.name for f in data_path.iterdir() if f.is_file()]}"
+                    )
+                else:
+                    logger.error(f"Data directory does not exist: {data_path}")
+                raise FileNotFoundError(f"File not found: {file_path}")
+        return pdf_files
+
     @retry(
         stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)
     )
     def load_or_create_index(self):
-        # Always recreate the index, don't check if it exists
+        """Load the persisted index and re-index changed files, or build a new one."""
+        storage_dir = str(self.storage_path)
+        # Only an index built with a manifest can be updated in place
+        if IngestionManifest.exists(storage_dir) and MmapVectorStore.exists(
+            storage_dir
+        ):
+            try:
+                logger.info("Loading existing index from storage...")
+                storage_context = StorageContext.from_defaults(
+                    persist_dir=storage_dir,
+                    vector_store=MmapVectorStore.from_persist_dir(storage_dir),
+                )
+                index = load_index_from_storage(storage_context)
+                logger.info("Successfully loaded existing index")
+                return self._update_index(index)
+            except Exception as e:
+                logger.warning(f"Failed to load existing index: {e}")
+                logger.info("Will create new index instead")
+
+        return self._create_new_index()
+
+    def _create_new_index(self):
+        """Create a new index from the PDF files, replacing any stored one."""
         if not self.storage_path.exists():
             self.storage_path.mkdir(parents=True, exist_ok=True)
         elif any(self.storage_path.iterdir()):
@@ -72,57 +136,63 @@ class IndexManager:
 
         try:
             logger.info("Creating new index from specific PDF files...")
-
-            # Determine the correct data path
-            # This path should point to the root 'data' folder, not 'src/data'
-            project_root = Path(
-                __file__
-            ).parent.parent.parent  # Go up from src/llamaindex_app to the project root
-            data_path = project_root / "data"
-
-            logger.info(f"Using data path: {data_path}")
-
-            # Specify exact filenames
-            filenames = ["AA - Sustainability 2023.pdf"]
-
-            # Check if files exist
-            pdf_files = []
-            for filename in filenames:
-                file_path = data_path / filename
-                logger.info(f"Checking for file: {file_path}")
-                if file_path.exists():
-                    pdf_files.append(str(file_path))
-                    logger.info(f"File found: {file_path}")
-                else:
-                    logger.error(f"File not found: {file_path}")
-                    # List files in the data directory to help debug
-                    if data_path.exists():
-                        logger.info(
-                            f"Files in data directory: {[f.name for f in data_path.iterdir() if f.is_file()]}"
-                        )
-                    else:
-                        logger.error(f"Data directory does not exist: {data_path}")
-                    raise FileNotFoundError(f"File not found: {file_path}")
-
-            # Only proceed if we found both files
-            if len(pdf_files) == 1:
-                documents = SimpleDirectoryReader(input_files=pdf_files).load_data()
-
-                logger.info(f"Loaded {len(documents)} documents, creating index...")
-                index = VectorStoreIndex.from_documents(
-                    documents, settings=LlamaSettings
-                )
-
-                logger.info("Persisting index to storage...")
-                index.storage_context.persist(persist_dir=str(self.storage_path))
-
-                return index
-            else:
-                raise ValueError(f"Expected 1 PDF file, but found {len(pdf_files)}")
+            pdf_files = self._get_pdf_files()
+            nodes_by_file = self._parse_files(pdf_files)
+
+            logger.info(f"Loaded {len(pdf_files)} PDF files, creating index...")
+            storage_context = StorageContext.from_defaults(
+                vector_store=MmapVectorStore(dtype=self.settings.VECTOR_STORE_DTYPE)
+            )
+            index = VectorStoreIndex(
+                [node for nodes in nodes_by_file.values() for node in nodes],
+                storage_context=storage_context,
+            )
+
+            manifest = IngestionManifest()
+            for pdf_file, nodes in nodes_by_file.items():
+                manifest.record(pdf_file, [node.node_id for node in nodes])
+
+            logger.info("Persisting index to storage...")
+            index.storage_context.persist(persist_dir=str(self.storage_path))
+            manifest.save(str(self.storage_path))
+
+            return index
         except Exception as e:
             logger.error(f"Error creating index: {str(e)}")
             raise
 
+    def _parse_files(self, pdf_files: List[str]) -> Dict[str, List[BaseNode]]:
+        """Load and chunk PDF files, grouping the nodes by file."""
+        node_parser = LlamaSettings.node_parser
+        nodes_by_file: Dict[str, List[BaseNode]] = {}
+        for pdf_file in pdf_files:
+            documents = SimpleDirectoryReader(input_files=[pdf_file]).load_data()
+            nodes_by_file[pdf_file] = node_parser.get_nodes_from_documents(documents)
+        return nodes_by_file
+
+    def _update_index(self, index):
+        """
+        Re-index only the PDF files that changed since the manifest was
+        written: their old nodes are deleted and the new ones embedded and
+        inserted, leaving every other file's nodes in place.
+        """
+        storage_dir = str(self.storage_path)
+        manifest = IngestionManifest.load(storage_dir)
+        changed, removed = manifest.diff(self._get_pdf_files())
+        if not changed and not removed:
+            manifest.save(storage_dir)
+            logger.info("Index is up to date, no re-indexing required")
+            return index
+
+        logger.info(
+            f"Re-indexing {len(changed)} changed and removing {len(removed)} "
+            "deleted files"
+        )
+        replace_file_nodes(index, manifest, self._parse_files(changed), removed)
+        index.storage_context.persist(persist_dir=storage_dir)
+        manifest.save(storage_dir)
+        return index
+
     def get_query_engine(self):
         retriever = self.index.as_retriever(similarity_top_k=3)
         return QueryEngine(retriever=retriever)
@@ -1,7 +1,9 @@
+import contextvars
 import logging
 import sys
 import uuid
-from typing import Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
 
 from llama_index.core import Response
 from openinference.semconv.trace import SpanAttributes
@@ -9,6 +11,7 @@ from opentelemetry.trace.status import Status, StatusCode
 
 from src.llamaindex_app.classifier import QueryCategory, QueryClassifier
 from src.llamaindex_app.config import (
+    Settings,
     validate_query_for_jailbreak,
     validate_query_for_toxic_language,
 )
@@ -29,6 +32,82 @@ tracer = tracer_provider.get_tracer("llamaindex_app")
 logger = logging.getLogger(__name__)
 
 
+# Guard classifications are blocking LLM calls, so they get their own pool
+_guard_executor: Optional[ThreadPoolExecutor] = None
+
+# Guards run concurrently; the first failing guard short-circuits validation.
+# Each entry is (span name, guard function, error message on failure).
+GUARDS: List[Tuple[str, Callable[[str], bool], str]] = [
+    (
+        "Jailbreak Check",
+        validate_query_for_jailbreak,
+        "Potential jailbreak attempt detected",
+    ),
+    (
+        "Toxic Check",
+        validate_query_for_toxic_language,
+        "Toxic language is not allowed",
+    ),
+]
+
+
+def _get_guard_executor() -> ThreadPoolExecutor:
+    """Return the shared guard pool, creating it on first use."""
+    global _guard_executor
+    if _guard_executor is None:
+        _guard_executor = ThreadPoolExecutor(
+            max_workers=Settings().GUARD_WORKERS, thread_name_prefix="guard"
+        )
+    return _guard_executor
+
+
+def _check_guard(tracer: any, name: str, guard: Callable[[str], bool], query: str):
+    """Run one guard, recording a child span."""
+    with tracer.start_as_current_span(
+        name,
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+            SpanAttributes.INPUT_VALUE: query,
+        },
+    ) as guard_span:
+        passed = guard(query)
+        guard_span.set_attribute(
+            SpanAttributes.OUTPUT_VALUE, "Pass" if passed else "Fail"
+        )
+        guard_span.set_status(Status(StatusCode.OK))
+        return passed
+
+
+def _run_guards(tracer: any, query: str) -> Optional[str]:
+    """
+    Run GUARDS concurrently on the guard pool
+
+    Returns the error message of the first guard to fail, without waiting
+    for the others, or None if every guard passes. Guards that have not
+    started yet are cancelled; running guards finish in the background.
+    """
+    executor = _get_guard_executor()
+    futures = {}
+    for name, guard, message in GUARDS:
+        # Each worker needs its own copy so guard spans parent correctly
+        ctx = contextvars.copy_context()
+        future = executor.submit(ctx.run, _check_guard, tracer, name, guard, query)
+        futures[future] = message
+
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Check in GUARDS order so simultaneous failures are deterministic
+            for future, message in futures.items():
+                if future in done and not future.result():
+                    return message
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
+
+
 def validate_interaction(query: str) -> Optional[str]:
     """
     Validate the user query for potential issues before processing
@@ -45,47 +124,13 @@ def validate_interaction(query: str) -> Optional[str]:
                 SpanAttributes.INPUT_VALUE: query,
             },
         ) as span:
-            with tracer.start_as_current_span(
-                "Jailbreak Check",
-                attributes={
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
-                    SpanAttributes.INPUT_VALUE: query,
-                },
-            ) as jb_span:
-                jailbreak_check = validate_query_for_jailbreak(query)
-                jb_span.set_attribute(
-                    SpanAttributes.OUTPUT_VALUE, "Pass" if jailbreak_check else "Fail"
-                )
-                jb_span.set_status(Status(StatusCode.OK))
-            with tracer.start_as_current_span(
-                "Toxic Check",
-                attributes={
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
-                    SpanAttributes.INPUT_VALUE: query,
-                },
-            ) as toxic_span:
-                toxic_check = validate_query_for_toxic_language(query)
-                toxic_span.set_attribute(
-                    SpanAttributes.OUTPUT_VALUE, "Pass" if toxic_check else "Fail"
-                )
-                toxic_span.set_status(Status(StatusCode.OK))
-
-            if not jailbreak_check:
-                logger.warning(
-                    "Interaction validation failed: Potential jailbreak attempt detected"
-                )
-                span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
-                span.set_status(Status(StatusCode.ERROR))
-                return "Potential jailbreak attempt detected"
-            if not toxic_check:
-                logger.warning(
-                    "Interaction validation failed: Toxic language is not allowed"
-                )
+            validation_error = _run_guards(tracer, query)
+            if validation_error:
+                logger.warning(f"Interaction validation failed: {validation_error}")
                 span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
                 span.set_status(Status(StatusCode.ERROR))
-                return "Toxic language is not allowed"
-        # If both validations pass, return None (no error)
-        return None
+        # If all validations pass, return None (no error)
+        return validation_error
 
     except Exception as e:
         # Log the specific validation error
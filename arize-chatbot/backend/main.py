@@ -1,11 +1,15 @@
+import asyncio
+import json
 import logging
 import os
+import threading
 import uuid
-from contextlib import asynccontextmanager
-from typing import Dict, List, Optional
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 # Set Hugging Face cache directory
@@ -21,14 +25,30 @@ from src.llamaindex_app.flexible_instrumentation import (
     setup_flexible_instrumentation,
 )
 from src.llamaindex_app.index_manager import IndexManager
-from src.llamaindex_app.main import init_openai_client, process_interaction
+from src.llamaindex_app.main import (
+    aprocess_interaction,
+    aprocess_interaction_stream,
+    init_async_openai_client,
+    init_openai_client,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize session manager
-session_manager = SessionManager(cache_ttl_minutes=30)
+# Initialize session manager (pool of components keyed by effective configuration)
+session_manager = SessionManager(
+    cache_ttl_minutes=int(os.getenv("COMPONENT_POOL_TTL_MINUTES", "30")),
+    max_entries=int(os.getenv("COMPONENT_POOL_SIZE", "32")),
+)
+
+# Heavy components shared across every pooled configuration
+shared_components: Dict[str, Any] = {"index_manager": None, "query_engine": None}
+_shared_lock = threading.Lock()
+
+# Upper bound on chat requests processed concurrently by this worker
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "32"))
+chat_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
 
 
 @asynccontextmanager
@@ -117,71 +137,103 @@ def has_valid_arize_config(
     return has_valid, effective_config
 
 
+def get_shared_components(openai_client=None) -> Dict[str, Any]:
+    """
+    Load the heavy, configuration-independent components once.
+
+    The index (and the embedding model loaded with it) does not depend on the
+    Arize or OpenAI credentials, so every pooled configuration shares it.
+    """
+    with _shared_lock:
+        if shared_components["query_engine"] is None:
+            logger.info("Loading shared index and embedding model")
+            index_manager = IndexManager(openai_client=openai_client)
+            shared_components["index_manager"] = index_manager
+            shared_components["query_engine"] = index_manager.get_query_engine()
+        return shared_components
+
+
+def get_tracer_config(
+    has_valid_config: bool,
+    arize_config: Dict[str, str],
+    env_overrides: Optional[Dict[str, str]] = None,
+) -> TracerConfig:
+    """
+    Build the tracing tenant for the effective Arize configuration.
+
+    Instrumentors are installed once; each tenant gets its own long-lived
+    exporter and spans are routed to it per request, so nothing is shut down
+    or reconfigured when configurations differ between requests.
+    """
+    manager = get_instrumentation_manager()
+    if not manager.is_configured():
+        # Default tenant comes from the environment
+        setup_flexible_instrumentation()
+
+    if has_valid_config:
+        # We have valid Arize configuration (either from overrides or environment)
+        config = TracerConfig(
+            space_id=arize_config["space_id"],
+            api_key=arize_config["api_key"],
+            model_id=arize_config["model_id"],
+            use_env_headers=True,  # Same header format as the environment variable
+        )
+
+        # Determine source of configuration for logging
+        has_overrides = env_overrides and any(
+            key.startswith("ARIZE_") and env_overrides.get(key, "").strip()
+            for key in env_overrides.keys()
+        )
+        source = (
+            "overrides + environment fallback"
+            if has_overrides
+            else "environment variables"
+        )
+        logger.info(
+            f"Using Arize configuration from {source}: model_id={arize_config['model_id']}"
+        )
+        return config
+
+    # No valid Arize configuration available - use local-only instrumentation
+    logger.info("No valid Arize configuration found, using local-only instrumentation")
+    return TracerConfig(model_id=arize_config["model_id"])
+
+
 def initialize_app(env_overrides: Optional[Dict[str, str]] = None):
-    """Initialize the application components with optional environment overrides."""
-    # For now, disable caching to ensure proper instrumentation reconfiguration
-    # TODO: Implement smarter caching that handles instrumentation state properly
-    # cached_components = session_manager.get_cached_components(env_overrides)
-    # if cached_components:
-    #     logger.info("Using cached components for this configuration")
-    #     return cached_components
+    """
+    Get the application components for the effective configuration.
 
+    Components are pooled per effective configuration (Arize credentials and
+    OpenAI API key). The index and embedding model are shared by every entry,
+    so a pool miss only builds the OpenAI client and classifier.
+    """
     try:
-        # Setup flexible instrumentation
-        # Always shutdown any existing instrumentation to ensure clean state
-        manager = get_instrumentation_manager()
-        if manager.is_configured():
-            logger.info("Shutting down existing instrumentation before reconfiguring")
-            manager.shutdown()
-
         has_valid_config, arize_config = has_valid_arize_config(env_overrides)
 
-        if has_valid_config:
-            # We have valid Arize configuration (either from overrides or environment)
-            config = TracerConfig(
-                space_id=arize_config["space_id"],
-                api_key=arize_config["api_key"],
-                model_id=arize_config["model_id"],
-                use_env_headers=True,  # Use environment variable headers for compatibility
-            )
-            tracer_provider = manager.configure(config)
-
-            # Determine source of configuration for logging
-            has_overrides = env_overrides and any(
-                key.startswith("ARIZE_") and env_overrides.get(key, "").strip()
-                for key in env_overrides.keys()
-            )
-            source = (
-                "overrides + environment fallback"
-                if has_overrides
-                else "environment variables"
-            )
-            logger.info(
-                f"Using Arize configuration from {source}: model_id={arize_config['model_id']}"
-            )
-        else:
-            # No valid Arize configuration available
-            logger.warning(
-                "No valid Arize configuration found (missing ARIZE_SPACE_ID or ARIZE_API_KEY)"
-            )
-            logger.info(
-                "Instrumentation will be set up but may not export traces successfully"
-            )
-            # Still set up instrumentation with whatever we have (might be empty/test config)
-            tracer_provider = setup_flexible_instrumentation()
-
-        tracer = tracer_provider.get_tracer("llamaindex_app")
-
-        # Initialize OpenAI client
+        pool_key = {
+            **arize_config,
+            "openai_api_key": os.getenv("OPENAI_API_KEY", ""),
+        }
+        cached_components = session_manager.get_cached_components(pool_key)
+        if cached_components:
+            return cached_components
+
+        # Tracing tenant for this configuration
+        tracer_config = get_tracer_config(has_valid_config, arize_config, env_overrides)
+        tracer = get_instrumentation_manager().get_tracer("llamaindex_app")
+
+        # Initialize OpenAI clients
         openai_client = init_openai_client()
+        async_openai_client = init_async_openai_client()
 
-        # Initialize index manager & query engine
-        index_manager = IndexManager(openai_client=openai_client)
-        query_engine = index_manager.get_query_engine()
+        # Reuse the shared index manager & query engine
+        query_engine = get_shared_components(openai_client)["query_engine"]
 
         # Initialize classifier
         classifier = QueryClassifier(
-            query_engine=query_engine, openai_client=openai_client
+            query_engine=query_engine,
+            openai_client=openai_client,
+            async_openai_client=async_openai_client,
         )
 
         # Create components dictionary
@@ -189,11 +241,11 @@ def initialize_app(env_overrides: Optional[Dict[str, str]] = None):
             "query_engine": query_engine,
             "classifier": classifier,
             "tracer": tracer,
+            "tracer_config": tracer_config,
             "openai_client": openai_client,
         }
 
-        # Cache the components - disabled for now to ensure proper reconfiguration
-        # session_manager.cache_components(env_overrides, components)
+        session_manager.cache_components(pool_key, components)
 
         logger.info(
             f"Application initialized successfully with env_overrides: {list(env_overrides.keys()) if env_overrides else 'default'}"
@@ -212,39 +264,107 @@ async def chat(request: ChatRequest):
     # Validate and filter environment overrides
     env_overrides = validate_env_overrides(request.env_overrides)
 
-    # Use temporary environment variables if provided
+    # Overrides are only applied while resolving components; the pooled
+    # components carry their own credentials, so concurrent requests with
+    # different overrides never see each other's environment
     with EnvironmentManager.temporary_env_vars(env_overrides):
         # Initialize or get cached components for this environment configuration
         components = initialize_app(env_overrides)
 
-        session_id = request.session_id or str(uuid.uuid4())
+    session_id = request.session_id or str(uuid.uuid4())
+
+    try:
+        async with chat_semaphore:
+            # Route this request's spans to its own tracing tenant
+            with get_instrumentation_manager().use_tenant(components["tracer_config"]):
+                response, error = await aprocess_interaction(
+                    components["query_engine"],
+                    components["classifier"],
+                    components["tracer"],
+                    request.message,
+                    session_id,
+                )
+
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+
+        sources = None
+        if hasattr(response, "source_nodes") and response.source_nodes:
+            sources = [
+                node.metadata.get("file_name", "Unknown source")
+                for node in response.source_nodes
+            ]
+
+        return ChatResponse(
+            response=response.response, sources=sources, session_id=session_id
+        )
+
+    except Exception as e:
+        logger.error(f"Error processing chat request: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        try:
-            response, error = process_interaction(
-                components["query_engine"],
-                components["classifier"],
-                components["tracer"],
-                request.message,
-                session_id,
-            )
 
-            if error:
-                raise HTTPException(status_code=400, detail=error)
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process a chat message and stream the response as server-sent events.
 
-            sources = None
-            if hasattr(response, "source_nodes") and response.source_nodes:
-                sources = [
-                    node.metadata.get("file_name", "Unknown source")
-                    for node in response.source_nodes
-                ]
+    Emits "token" events with response text as it is generated, then a final
+    "done" event with the sources and session_id (or an "error" event).
+    """
+    # Validate and filter environment overrides
+    env_overrides = validate_env_overrides(request.env_overrides)
 
-            return ChatResponse(
-                response=response.response, sources=sources, session_id=session_id
-            )
+    with EnvironmentManager.temporary_env_vars(env_overrides):
+        # Initialize or get cached components for this environment configuration
+        components = initialize_app(env_overrides)
+
+    session_id = request.session_id or str(uuid.uuid4())
 
-        except Exception as e:
-            logger.error(f"Error processing chat request: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+    # Spans started by the stream belong to this request's tracing tenant
+    tenant_context = get_instrumentation_manager().get_tenant_context(
+        components["tracer_config"]
+    )
+
+    async def event_stream():
+        async with chat_semaphore:
+            async with aclosing(
+                aprocess_interaction_stream(
+                    components["query_engine"],
+                    components["classifier"],
+                    components["tracer"],
+                    request.message,
+                    session_id,
+                    parent_context=tenant_context,
+                )
+            ) as events:
+                async for event, data in events:
+                    if event == "token":
+                        yield _sse_event("token", {"text": data})
+                    elif event == "done":
+                        sources = [
+                            node.metadata.get("file_name", "Unknown source")
+                            for node in data
+                        ]
+                        yield _sse_event(
+                            "done",
+                            {"sources": sources or None, "session_id": session_id},
+                        )
+                    else:
+                        yield _sse_event(
+                            "error", {"detail": data, "session_id": session_id}
+                        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/health")
@@ -264,8 +384,10 @@ async def debug_config():
         manager = get_instrumentation_manager()
         instrumentation_status = {
             "is_configured": manager.is_configured(),
+            "tenant_count": manager.get_tenant_count(),
             "has_valid_arize_config": has_valid_config,
         }
+        component_pool = session_manager.get_stats()
 
         # Safe config info (no sensitive data)
         safe_config = {
@@ -277,6 +399,7 @@ async def debug_config():
         return {
             "instrumentation": instrumentation_status,
             "arize_config": safe_config,
+            "component_pool": component_pool,
             "environment_vars": {
                 "ARIZE_SPACE_ID_set": bool(os.getenv("ARIZE_SPACE_ID")),
                 "ARIZE_API_KEY_set": bool(os.getenv("ARIZE_API_KEY")),
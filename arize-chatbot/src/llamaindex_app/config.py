@@ -70,6 +70,10 @@ class Settings(BaseSettings):
     API_MAX_RETRIES: int = 3
     API_RETRY_DELAY: int = 1
 
+    # Async pipeline settings
+    RETRIEVAL_WORKERS: int = 4  # Threads for query embedding + vector search
+    GUARD_WORKERS: int = 32  # Threads for the blocking guard LLM calls
+
     # Phoenix settings
     phoenix_project_name: str = "10k-chatbot"
 
@@ -79,11 +83,12 @@ class Settings(BaseSettings):
         extra = "allow"
 
 
-def validate_query_for_jailbreak(query: str) -> bool:
+def validate_query_for_jailbreak(query: str, api_key: Optional[str] = None) -> bool:
     """
     Validate input for potential jailbreak attempts
 
     :param query: Input query to validate
+    :param api_key: OpenAI API key, defaults to OPENAI_API_KEY from the environment
     :return: True if safe, False if jailbreak detected
     """
     JAILBREAK_TEMPLATE = """
@@ -105,7 +110,7 @@ def validate_query_for_jailbreak(query: str) -> bool:
         expect_df = llm_classify(
             dataframe=df_in,
             template=JAILBREAK_TEMPLATE,
-            model=OpenAIModel(model="gpt-4o"),
+            model=OpenAIModel(model="gpt-4o", api_key=api_key),
             rails=rails,
             provide_explanation=True,
         )
@@ -118,11 +123,14 @@ def validate_query_for_jailbreak(query: str) -> bool:
         return False
 
 
-def validate_query_for_toxic_language(query: str) -> bool:
+def validate_query_for_toxic_language(
+    query: str, api_key: Optional[str] = None
+) -> bool:
     """
     Validate input for toxic language
 
     :param query: Input query to validate
+    :param api_key: OpenAI API key, defaults to OPENAI_API_KEY from the environment
     :return: True if safe, False if toxic language detected
     """
     TOXICITY_TEMPLATE = """
@@ -150,7 +158,7 @@ def validate_query_for_toxic_language(query: str) -> bool:
         expect_df = llm_classify(
             dataframe=df_in,
             template=TOXICITY_TEMPLATE,
-            model=OpenAIModel(model="gpt-4o"),
+            model=OpenAIModel(model="gpt-4o", api_key=api_key),
             rails=rails,
             provide_explanation=True,
         )
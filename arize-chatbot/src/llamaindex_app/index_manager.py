@@ -1,4 +1,8 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import contextvars
 import logging
 from llama_index.core import (
     SimpleDirectoryReader,
@@ -16,13 +20,37 @@ from src.llamaindex_app.config import Settings
 logger = logging.getLogger(__name__)
 
 
+# Bounded pool for the CPU-bound query embedding + vector search step
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_retrieval_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Get the process-wide retrieval thread pool, creating it on first use."""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="retrieval"
+        )
+    return _retrieval_executor
+
+
 class QueryEngine:
-    def __init__(self, retriever):
+    def __init__(self, retriever, executor: Optional[ThreadPoolExecutor] = None):
         self.retriever = retriever
+        self.executor = executor
 
     def retrieve(self, query: str):
         return self.retriever.retrieve(query)
 
+    async def aretrieve(self, query: str):
+        """Retrieve on the bounded retrieval pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry the tracing context into the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, ctx.run, self.retriever.retrieve, query
+        )
+
 
 class IndexManager:
     def __init__(self, openai_client=None):
@@ -144,4 +172,5 @@ class IndexManager:
 
     def get_query_engine(self):
         retriever = self.index.as_retriever(similarity_top_k=3)
-        return QueryEngine(retriever=retriever)
+        executor = get_retrieval_executor(self.settings.RETRIEVAL_WORKERS)
+        return QueryEngine(retriever=retriever, executor=executor)
@@ -12,6 +12,7 @@ from llama_index.llms.openai import OpenAI as LlamaOpenAI
 from phoenix.trace import suppress_tracing
 from tenacity import retry, stop_after_attempt, wait_exponential
 from src.llamaindex_app.config import Settings
+from src.llamaindex_app.docstore import DOCSTORE_FILE, SQLiteDocumentStore
 
 logger = logging.getLogger(__name__)
 
@@ -108,7 +109,13 @@ class IndexManager:
                 ).load_data()
                 
                 logger.info(f"Loaded {len(documents)} documents, creating index...")
-                index = VectorStoreIndex.from_documents(documents, settings=LlamaSettings)
+                # Nodes are read from SQLite on demand rather than held in memory
+                storage_context = StorageContext.from_defaults(
+                    docstore=SQLiteDocumentStore(str(self.storage_path / DOCSTORE_FILE))
+                )
+                index = VectorStoreIndex.from_documents(
+                    documents, storage_context=storage_context, settings=LlamaSettings
+                )
                 
                 logger.info("Persisting index to storage...")
                 index.storage_context.persist(persist_dir=str(self.storage_path))
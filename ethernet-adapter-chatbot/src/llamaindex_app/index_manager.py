@@ -1,4 +1,8 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import contextvars
 import logging
 from llama_index.core import (
     SimpleDirectoryReader,
@@ -12,17 +16,47 @@ from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from phoenix.trace import suppress_tracing
 from tenacity import retry, stop_after_attempt, wait_exponential
 from src.llamaindex_app.config import Settings
+from src.llamaindex_app.hybrid_retriever import (
+    HybridRetriever,
+    index_node_ids,
+    node_texts,
+)
+from src.llamaindex_app.lexical_index import BM25Index
 
 logger = logging.getLogger(__name__)
 
 
+# Bounded pool for the CPU-bound query embedding + vector search step
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_retrieval_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Get the process-wide retrieval thread pool, creating it on first use."""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="retrieval"
+        )
+    return _retrieval_executor
+
+
 class QueryEngine:
-    def __init__(self, retriever):
+    def __init__(self, retriever, executor: Optional[ThreadPoolExecutor] = None):
         self.retriever = retriever
+        self.executor = executor
 
     def retrieve(self, query: str):
         return self.retriever.retrieve(query)
 
+    async def aretrieve(self, query: str):
+        """Retrieve on the bounded retrieval pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry the tracing context into the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, ctx.run, self.retriever.retrieve, query
+        )
+
 
 class IndexManager:
     def __init__(self, openai_client=None):
@@ -142,6 +176,24 @@ class IndexManager:
             logger.error(f"Error creating index: {str(e)}")
             raise
 
+    def _load_lexical_index(self) -> BM25Index:
+        """Load the persisted BM25 index, rebuilding it if the corpus changed."""
+        return BM25Index.load_or_build(
+            str(self.storage_path),
+            index_node_ids(self.index),
+            lambda ids: node_texts(self.index, ids),
+        )
+
     def get_query_engine(self):
-        retriever = self.index.as_retriever(similarity_top_k=3)
-        return QueryEngine(retriever=retriever)
+        if self.settings.HYBRID_SEARCH:
+            retriever = HybridRetriever(
+                self.index,
+                self._load_lexical_index(),
+                similarity_top_k=3,
+                hybrid_candidates=self.settings.HYBRID_CANDIDATES,
+                rrf_k=self.settings.HYBRID_RRF_K,
+            )
+        else:
+            retriever = self.index.as_retriever(similarity_top_k=3)
+        executor = get_retrieval_executor(self.settings.RETRIEVAL_WORKERS)
+        return QueryEngine(retriever=retriever, executor=executor)
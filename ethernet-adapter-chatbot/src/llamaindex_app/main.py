@@ -1,10 +1,15 @@
+import asyncio
+import contextvars
 import logging
 import sys
 import uuid
-from typing import Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 
 from llama_index.core import Response
 from openinference.semconv.trace import SpanAttributes
+from opentelemetry import context as otel_context
+from opentelemetry import trace
 from opentelemetry.trace.status import Status, StatusCode
 
 from src.llamaindex_app.classifier import QueryCategory, QueryClassifier
@@ -28,6 +33,168 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Guard classifications are blocking LLM calls, so they get their own pool
+_guard_executor: Optional[ThreadPoolExecutor] = None
+
+# Guards run concurrently; the first failing guard short-circuits validation.
+# Each entry is (span name, guard function, error message on failure).
+GUARDS: List[Tuple[str, Callable[..., bool], str]] = [
+    (
+        "Jailbreak Check",
+        validate_query_for_jailbreak,
+        "Potential jailbreak attempt detected",
+    ),
+    (
+        "Toxic Check",
+        validate_query_for_toxic_language,
+        "Toxic language is not allowed",
+    ),
+]
+
+
+def _get_guard_executor() -> ThreadPoolExecutor:
+    """Return the shared guard pool, creating it on first use."""
+    global _guard_executor
+    if _guard_executor is None:
+        from src.llamaindex_app.config import Settings
+
+        _guard_executor = ThreadPoolExecutor(
+            max_workers=Settings().GUARD_WORKERS, thread_name_prefix="guard"
+        )
+    return _guard_executor
+
+
+async def _run_guard(guard: Callable[..., bool], query: str, api_key: Optional[str]):
+    """Run a blocking guard check on the guard pool with the current context."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _get_guard_executor(), ctx.run, guard, query, api_key
+    )
+
+
+def _guard_span(tracer: any, name: str, query: str):
+    """Start a GUARDRAIL span for a single guard check."""
+    return tracer.start_as_current_span(
+        name,
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+            SpanAttributes.INPUT_VALUE: query,
+        },
+        record_exception=False,
+        set_status_on_exception=False,
+    )
+
+
+def _check_guard(
+    tracer: any,
+    name: str,
+    guard: Callable[..., bool],
+    query: str,
+    api_key: Optional[str],
+) -> bool:
+    """Run one guard, recording a child span when a tracer is available."""
+    if not tracer:
+        return guard(query, api_key)
+
+    with _guard_span(tracer, name, query) as guard_span:
+        passed = guard(query, api_key)
+        guard_span.set_attribute(
+            SpanAttributes.OUTPUT_VALUE, "Pass" if passed else "Fail"
+        )
+        guard_span.set_status(Status(StatusCode.OK))
+        return passed
+
+
+async def _acheck_guard(
+    tracer: any,
+    name: str,
+    guard: Callable[..., bool],
+    query: str,
+    api_key: Optional[str],
+) -> bool:
+    """Async counterpart of _check_guard that records cancellation."""
+    if not tracer:
+        return await _run_guard(guard, query, api_key)
+
+    with _guard_span(tracer, name, query) as guard_span:
+        try:
+            passed = await _run_guard(guard, query, api_key)
+        except asyncio.CancelledError:
+            # Another guard already failed, so this verdict is not needed
+            guard_span.set_attribute(SpanAttributes.OUTPUT_VALUE, "Cancelled")
+            guard_span.set_attribute("guard.cancelled", True)
+            raise
+        guard_span.set_attribute(
+            SpanAttributes.OUTPUT_VALUE, "Pass" if passed else "Fail"
+        )
+        guard_span.set_status(Status(StatusCode.OK))
+        return passed
+
+
+def _run_guards(tracer: any, query: str, api_key: Optional[str] = None):
+    """
+    Run all guards concurrently on the guard pool
+
+    Returns the error message of the first guard to fail, without waiting
+    for the others, or None if every guard passes. Guards that have not
+    started yet are cancelled; running guards finish in the background.
+    """
+    executor = _get_guard_executor()
+    futures = {}
+    for name, guard, message in GUARDS:
+        # Each worker needs its own copy so guard spans parent correctly
+        ctx = contextvars.copy_context()
+        future = executor.submit(
+            ctx.run, _check_guard, tracer, name, guard, query, api_key
+        )
+        futures[future] = message
+
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Check in GUARDS order so simultaneous failures are deterministic
+            for future, message in futures.items():
+                if future in done and not future.result():
+                    return message
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def _arun_guards(tracer: any, query: str, api_key: Optional[str] = None):
+    """
+    Async counterpart of _run_guards
+
+    Each guard runs as its own task, so guard spans are parented to the
+    current span. Outstanding guards are cancelled on the first failure.
+    """
+    tasks = {
+        asyncio.create_task(_acheck_guard(tracer, name, guard, query, api_key)): (
+            message
+        )
+        for name, guard, message in GUARDS
+    }
+
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Check in GUARDS order so simultaneous failures are deterministic
+            for task, message in tasks.items():
+                if task in done and not task.result():
+                    return message
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
 
 def validate_interaction(query: str) -> Optional[str]:
     """
@@ -44,14 +211,7 @@ def validate_interaction(query: str) -> Optional[str]:
         if not tracer:
             logger.warning("Tracer not available, skipping telemetry for validation")
             # Still perform validation without telemetry
-            jailbreak_check = validate_query_for_jailbreak(query)
-            toxic_check = validate_query_for_toxic_language(query)
-
-            if not jailbreak_check:
-                return "Potential jailbreak attempt detected"
-            if not toxic_check:
-                return "Toxic language is not allowed"
-            return None
+            return _run_guards(None, query)
 
         with tracer.start_as_current_span(
             name="validate_interaction",
@@ -60,47 +220,57 @@ def validate_interaction(query: str) -> Optional[str]:
                 SpanAttributes.INPUT_VALUE: query,
             },
         ) as span:
-            with tracer.start_as_current_span(
-                "Jailbreak Check",
-                attributes={
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
-                    SpanAttributes.INPUT_VALUE: query,
-                },
-            ) as jb_span:
-                jailbreak_check = validate_query_for_jailbreak(query)
-                jb_span.set_attribute(
-                    SpanAttributes.OUTPUT_VALUE, "Pass" if jailbreak_check else "Fail"
-                )
-                jb_span.set_status(Status(StatusCode.OK))
-            with tracer.start_as_current_span(
-                "Toxic Check",
-                attributes={
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
-                    SpanAttributes.INPUT_VALUE: query,
-                },
-            ) as toxic_span:
-                toxic_check = validate_query_for_toxic_language(query)
-                toxic_span.set_attribute(
-                    SpanAttributes.OUTPUT_VALUE, "Pass" if toxic_check else "Fail"
-                )
-                toxic_span.set_status(Status(StatusCode.OK))
-
-            if not jailbreak_check:
-                logger.warning(
-                    "Interaction validation failed: Potential jailbreak attempt detected"
-                )
+            validation_error = _run_guards(tracer, query)
+            if validation_error:
+                logger.warning(f"Interaction validation failed: {validation_error}")
                 span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
                 span.set_status(Status(StatusCode.ERROR))
-                return "Potential jailbreak attempt detected"
-            if not toxic_check:
-                logger.warning(
-                    "Interaction validation failed: Toxic language is not allowed"
-                )
+        # If all validations pass, return None (no error)
+        return validation_error
+
+    except Exception as e:
+        # Log the specific validation error
+        logger.warning(f"Interaction validation failed: {str(e)}")
+        return "Input validation failed"
+
+
+async def avalidate_interaction(
+    query: str, api_key: Optional[str] = None
+) -> Optional[str]:
+    """
+    Validate the user query without blocking the event loop
+
+    The guard classifications are synchronous LLM calls, so they run
+    concurrently in worker threads with the current tracing context.
+
+    :param query: Input query to validate
+    :param api_key: OpenAI API key for the guard models
+    :return: Error message if validation fails, None if query is valid
+    """
+    try:
+        # Get instrumentation manager and tracer
+        instrumentation_manager = get_instrumentation_manager()
+        tracer = instrumentation_manager.get_tracer("llamaindex_app")
+
+        if not tracer:
+            logger.warning("Tracer not available, skipping telemetry for validation")
+            # Still perform validation without telemetry
+            return await _arun_guards(None, query, api_key)
+
+        with tracer.start_as_current_span(
+            name="validate_interaction",
+            attributes={
+                SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+                SpanAttributes.INPUT_VALUE: query,
+            },
+        ) as span:
+            validation_error = await _arun_guards(tracer, query, api_key)
+            if validation_error:
+                logger.warning(f"Interaction validation failed: {validation_error}")
                 span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
                 span.set_status(Status(StatusCode.ERROR))
-                return "Toxic language is not allowed"
-        # If both validations pass, return None (no error)
-        return None
+        # If all validations pass, return None (no error)
+        return validation_error
 
     except Exception as e:
         # Log the specific validation error
@@ -161,6 +331,150 @@ def process_interaction(
             return None, str(e)
 
 
+async def aprocess_interaction(
+    query_engine: any,
+    classifier: QueryClassifier,
+    tracer: any,
+    query: str,
+    session_id: str,
+) -> Tuple[Optional[Response], Optional[str]]:
+    """Async counterpart of process_interaction for the API backend."""
+    # Guards use the same OpenAI credentials as the classifier
+    api_key = getattr(classifier.openai_client, "api_key", None)
+
+    with tracer.start_as_current_span(
+        name="user_interaction",
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "CHAIN",
+            SpanAttributes.SESSION_ID: session_id,
+            SpanAttributes.INPUT_VALUE: query,
+        },
+    ) as interaction_span:
+        try:
+            validation_error = await avalidate_interaction(query, api_key)
+            if validation_error:
+                return None, validation_error
+            category, confidence = await classifier.aclassify_query(
+                query, interaction_span
+            )
+            interaction_span.set_attribute("query.category", category.value)
+            interaction_span.set_attribute("classification.confidence", confidence)
+
+            response = await classifier.aget_response(query, category, interaction_span)
+
+            interaction_span.set_status(Status(StatusCode.OK))
+            interaction_span.set_attribute(
+                SpanAttributes.OUTPUT_VALUE, str(response.response)
+            )
+            interaction_span.set_attribute(
+                "response_length", len(str(response.response))
+            )
+
+            if (
+                category == QueryCategory.BROADCOM_ETHERNET_NETWORK_ADAPTER_USER_GUIDE
+                and response.source_nodes
+            ):
+                interaction_span.set_attribute(
+                    "source_count", len(response.source_nodes)
+                )
+
+            return response, None
+
+        except Exception as e:
+            logger.error(f"Error processing query in session {session_id}: {str(e)}")
+            interaction_span.set_status(Status(StatusCode.ERROR))
+            interaction_span.record_exception(e)
+            return None, str(e)
+
+
+async def aprocess_interaction_stream(
+    query_engine: any,
+    classifier: QueryClassifier,
+    tracer: any,
+    query: str,
+    session_id: str,
+    parent_context: Optional[otel_context.Context] = None,
+) -> AsyncIterator[Tuple[str, any]]:
+    """
+    Streaming counterpart of aprocess_interaction for the API backend.
+
+    Yields ("token", text) events as the answer is generated, followed by
+    ("done", source_nodes) or ("error", message). The user_interaction span
+    ends when the stream finishes, fails or is closed by the consumer.
+
+    The tracing context is attached only around the awaited pipeline steps,
+    never across a yield, so the generator can be suspended and resumed by
+    the web framework safely.
+    """
+    # Guards use the same OpenAI credentials as the classifier
+    api_key = getattr(classifier.openai_client, "api_key", None)
+
+    interaction_span = tracer.start_span(
+        name="user_interaction",
+        context=parent_context,
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "CHAIN",
+            SpanAttributes.SESSION_ID: session_id,
+            SpanAttributes.INPUT_VALUE: query,
+            "response.streamed": True,
+        },
+    )
+    span_context = trace.set_span_in_context(interaction_span, parent_context)
+    deltas = None
+
+    try:
+        token = otel_context.attach(span_context)
+        try:
+            validation_error = await avalidate_interaction(query, api_key)
+            if not validation_error:
+                category, confidence = await classifier.aclassify_query(
+                    query, interaction_span
+                )
+                interaction_span.set_attribute("query.category", category.value)
+                interaction_span.set_attribute("classification.confidence", confidence)
+
+                nodes, deltas = await classifier.astream_response(
+                    query, category, interaction_span
+                )
+        finally:
+            otel_context.detach(token)
+
+        if validation_error:
+            yield "error", validation_error
+            return
+
+        chunks = []
+        async for text in deltas:
+            chunks.append(text)
+            yield "token", text
+
+        response_text = "".join(chunks)
+        interaction_span.set_status(Status(StatusCode.OK))
+        interaction_span.set_attribute(SpanAttributes.OUTPUT_VALUE, response_text)
+        interaction_span.set_attribute("response_length", len(response_text))
+        if nodes:
+            interaction_span.set_attribute("source_count", len(nodes))
+
+        yield "done", nodes
+
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client went away before the answer was complete
+        logger.info(f"Stream closed by client in session {session_id}")
+        interaction_span.set_attribute("response.cancelled", True)
+        interaction_span.set_status(Status(StatusCode.ERROR, "Client disconnected"))
+        raise
+    except Exception as e:
+        logger.error(f"Error processing query in session {session_id}: {str(e)}")
+        interaction_span.set_status(Status(StatusCode.ERROR))
+        interaction_span.record_exception(e)
+        yield "error", str(e)
+    finally:
+        if deltas is not None:
+            # Closes the OpenAI stream, which ends its LLM span
+            await deltas.aclose()
+        interaction_span.end()
+
+
 def handle_session(query_engine: any, classifier: QueryClassifier, tracer: any) -> bool:
     session_id = str(uuid.uuid4())
     logger.info(f"Starting new session {session_id}")
@@ -203,10 +517,8 @@ def handle_session(query_engine: any, classifier: QueryClassifier, tracer: any)
             print()
 
 
-def init_openai_client():
-    """Initialize the OpenAI client with API key."""
-    from openai import OpenAI
-
+def _openai_client_kwargs():
+    """Build OpenAI client arguments from settings."""
     from src.llamaindex_app.config import Settings
 
     settings = Settings()
@@ -215,8 +527,6 @@ def init_openai_client():
     if not settings.OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY is not set in environment variables")
 
-    logger.info("Initializing OpenAI client")
-
     client_kwargs = {
         "api_key": settings.OPENAI_API_KEY,
     }
@@ -229,6 +539,17 @@ def init_openai_client():
     if settings.OPENAI_BASE_URL:
         client_kwargs["base_url"] = settings.OPENAI_BASE_URL
 
+    return client_kwargs
+
+
+def init_openai_client():
+    """Initialize the OpenAI client with API key."""
+    from openai import OpenAI
+
+    client_kwargs = _openai_client_kwargs()
+
+    logger.info("Initializing OpenAI client")
+
     try:
         client = OpenAI(**client_kwargs)
         return client
@@ -237,6 +558,21 @@ def init_openai_client():
         raise ValueError(f"OpenAI client initialization failed: {str(e)}")
 
 
+def init_async_openai_client():
+    """Initialize the async OpenAI client with API key."""
+    from openai import AsyncOpenAI
+
+    client_kwargs = _openai_client_kwargs()
+
+    logger.info("Initializing async OpenAI client")
+
+    try:
+        return AsyncOpenAI(**client_kwargs)
+    except Exception as e:
+        logger.error(f"Failed to initialize async OpenAI client: {str(e)}")
+        raise ValueError(f"OpenAI client initialization failed: {str(e)}")
+
+
 def main():
     try:
         # Initialize flexible instrumentation
@@ -1,11 +1,15 @@
+import asyncio
+import json
 import logging
 import os
+import threading
 import uuid
-from contextlib import asynccontextmanager
-from typing import Dict, List, Optional
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 # Set Hugging Face cache directory
@@ -21,15 +25,48 @@ from src.llamaindex_app.flexible_instrumentation import (
     get_instrumentation_manager,
     setup_flexible_instrumentation,
 )
-from src.llamaindex_app.index_manager import IndexManager
-from src.llamaindex_app.main import init_openai_client, process_interaction
+from src.llamaindex_app.dedup import node_sources
+from src.llamaindex_app.docstore import DOCSTORE_FILE
+from src.llamaindex_app.index_manager import (
+    IndexManager,
+    get_query_embedding_batcher,
+    get_query_embedding_cache,
+)
+from src.llamaindex_app.manifest import IngestionManifest
+from src.llamaindex_app.main import (
+    aprocess_interaction,
+    aprocess_interaction_stream,
+    get_guard_cache,
+    get_response_cache,
+    init_async_openai_client,
+    init_openai_client,
+)
+from src.llamaindex_app.vector_store import vector_store_files
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize session manager
-session_manager = SessionManager(cache_ttl_minutes=30)
+# Initialize session manager (pool of components keyed by effective configuration)
+session_manager = SessionManager(
+    cache_ttl_minutes=int(os.getenv("COMPONENT_POOL_TTL_MINUTES", "30")),
+    max_entries=int(os.getenv("COMPONENT_POOL_SIZE", "32")),
+)
+
+# Heavy components shared across every pooled configuration
+shared_components: Dict[str, Any] = {
+    "index_manager": None,
+    "query_engine": None,
+    "local_classifier": None,
+    "context_assembler": None,
+}
+_shared_lock = threading.Lock()
+# Held for the duration of /admin/rebuild-index, so rebuilds do not overlap
+_rebuild_lock = threading.Lock()
+
+# Upper bound on chat requests processed concurrently by this worker
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "32"))
+chat_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
 
 
 @asynccontextmanager
@@ -118,67 +155,110 @@ def has_valid_arize_config(
     return has_valid, effective_config
 
 
+def get_shared_components(openai_client=None) -> Dict[str, Any]:
+    """
+    Load the heavy, configuration-independent components once.
+
+    The index (and the embedding model loaded with it) does not depend on the
+    Arize or OpenAI credentials, so every pooled configuration shares it.
+    """
+    with _shared_lock:
+        if shared_components["query_engine"] is None:
+            logger.info("Loading shared index and embedding model")
+            index_manager = IndexManager(openai_client=openai_client)
+            shared_components["index_manager"] = index_manager
+            shared_components["query_engine"] = index_manager.get_query_engine()
+            shared_components["local_classifier"] = index_manager.get_local_classifier()
+            shared_components["context_assembler"] = (
+                index_manager.get_context_assembler()
+            )
+        return shared_components
+
+
+def get_tracer_config(
+    has_valid_config: bool,
+    arize_config: Dict[str, str],
+    env_overrides: Optional[Dict[str, str]] = None,
+) -> TracerConfig:
+    """
+    Build the tracing tenant for the effective Arize configuration.
+
+    Instrumentors are installed once; each tenant gets its own long-lived
+    exporter and spans are routed to it per request, so nothing is shut down
+    or reconfigured when configurations differ between requests.
+    """
+    manager = get_instrumentation_manager()
+    if not manager.is_configured():
+        # Default tenant comes from the environment
+        setup_flexible_instrumentation()
+
+    if has_valid_config:
+        # We have valid Arize configuration (either from overrides or environment)
+        config = TracerConfig(
+            space_id=arize_config["space_id"],
+            api_key=arize_config["api_key"],
+            model_id=arize_config["model_id"],
+            use_env_headers=True,  # Same header format as the environment variable
+        )
+
+        # Determine source of configuration for logging
+        has_overrides = env_overrides and any(
+            key.startswith("ARIZE_") and env_overrides.get(key, "").strip()
+            for key in env_overrides.keys()
+        )
+        source = (
+            "overrides + environment fallback"
+            if has_overrides
+            else "environment variables"
+        )
+        logger.info(
+            f"Using Arize configuration from {source}: model_id={arize_config['model_id']}"
+        )
+        return config
+
+    # No valid Arize configuration available - use local-only instrumentation
+    logger.info("No valid Arize configuration found, using local-only instrumentation")
+    return TracerConfig(model_id=arize_config["model_id"])
+
+
 def initialize_app(env_overrides: Optional[Dict[str, str]] = None):
-    """Initialize the application components with optional environment overrides."""
-    # For now, disable caching to ensure proper instrumentation reconfiguration
-    # TODO: Implement smarter caching that handles instrumentation state properly
-    # cached_components = session_manager.get_cached_components(env_overrides)
-    # if cached_components:
-    #     logger.info("Using cached components for this configuration")
-    #     return cached_components
+    """
+    Get the application components for the effective configuration.
 
+    Components are pooled per effective configuration (Arize credentials and
+    OpenAI API key). The index and embedding model are shared by every entry,
+    so a pool miss only builds the OpenAI client and classifier.
+    """
     try:
-        # Setup flexible instrumentation
-        # Always shutdown any existing instrumentation to ensure clean state
-        manager = get_instrumentation_manager()
-        if manager.is_configured():
-            logger.info("Shutting down existing instrumentation before reconfiguring")
-            manager.shutdown()
-
         has_valid_config, arize_config = has_valid_arize_config(env_overrides)
 
-        if has_valid_config:
-            # We have valid Arize configuration (either from overrides or environment)
-            config = TracerConfig(
-                space_id=arize_config["space_id"],
-                api_key=arize_config["api_key"],
-                model_id=arize_config["model_id"],
-                use_env_headers=True,  # Use environment variable headers for compatibility
-            )
-            tracer_provider = manager.configure(config)
-
-            # Determine source of configuration for logging
-            has_overrides = env_overrides and any(
-                key.startswith("ARIZE_") and env_overrides.get(key, "").strip()
-                for key in env_overrides.keys()
-            )
-            source = (
-                "overrides + environment fallback"
-                if has_overrides
-                else "environment variables"
-            )
-            logger.info(
-                f"Using Arize configuration from {source}: model_id={arize_config['model_id']}"
-            )
-        else:
-            # No valid Arize configuration available - use local-only instrumentation
-            logger.info(
-                "No valid Arize configuration found, using local-only instrumentation"
-            )
-            tracer_provider = setup_flexible_instrumentation()
+        pool_key = {
+            **arize_config,
+            "openai_api_key": os.getenv("OPENAI_API_KEY", ""),
+        }
+        cached_components = session_manager.get_cached_components(pool_key)
+        if cached_components:
+            return cached_components
 
-        tracer = tracer_provider.get_tracer("llamaindex_app")
+        # Tracing tenant for this configuration
+        tracer_config = get_tracer_config(has_valid_config, arize_config, env_overrides)
+        tracer = get_instrumentation_manager().get_tracer("llamaindex_app")
 
-        # Initialize OpenAI client
+        # Initialize OpenAI clients
         openai_client = init_openai_client()
+        async_openai_client = init_async_openai_client()
 
-        # Initialize index manager & query engine
-        index_manager = IndexManager(openai_client=openai_client)
-        query_engine = index_manager.get_query_engine()
+        # Reuse the shared index manager, query engine & local classifier
+        shared = get_shared_components(openai_client)
+        query_engine = shared["query_engine"]
 
         # Initialize classifier
         classifier = QueryClassifier(
-            query_engine=query_engine, openai_client=openai_client
+            query_engine=query_engine,
+            openai_client=openai_client,
+            async_openai_client=async_openai_client,
+            local_classifier=shared["local_classifier"],
+            context_assembler=shared["context_assembler"],
         )
 
         # Create components dictionary
@@ -186,11 +266,11 @@ def initialize_app(env_overrides: Optional[Dict[str, str]] = None):
             "query_engine": query_engine,
             "classifier": classifier,
             "tracer": tracer,
+            "tracer_config": tracer_config,
             "openai_client": openai_client,
         }
 
-        # Cache the components - disabled for now to ensure proper reconfiguration
-        # session_manager.cache_components(env_overrides, components)
+        session_manager.cache_components(pool_key, components)
 
         logger.info(
             f"Application initialized successfully with env_overrides: {list(env_overrides.keys()) if env_overrides else 'default'}"
@@ -209,39 +289,109 @@ async def chat(request: ChatRequest):
     # Validate and filter environment overrides
     env_overrides = validate_env_overrides(request.env_overrides)
 
-    # Use temporary environment variables if provided
+    # Overrides are only applied while resolving components; the pooled
+    # components carry their own credentials, so concurrent requests with
+    # different overrides never see each other's environment
     with EnvironmentManager.temporary_env_vars(env_overrides):
         # Initialize or get cached components for this environment configuration
         components = initialize_app(env_overrides)
 
-        session_id = request.session_id or str(uuid.uuid4())
+    session_id = request.session_id or str(uuid.uuid4())
 
-        try:
-            response, error = process_interaction(
-                components["query_engine"],
-                components["classifier"],
-                components["tracer"],
-                request.message,
-                session_id,
-            )
+    try:
+        async with chat_semaphore:
+            # Route this request's spans to its own tracing tenant
+            with get_instrumentation_manager().use_tenant(components["tracer_config"]):
+                response, error = await aprocess_interaction(
+                    components["query_engine"],
+                    components["classifier"],
+                    components["tracer"],
+                    request.message,
+                    session_id,
+                )
+
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+
+        sources = None
+        if hasattr(response, "source_nodes") and response.source_nodes:
+            sources = [
+                source
+                for node in response.source_nodes
+                for source in node_sources(node.metadata)
+            ]
+
+        return ChatResponse(
+            response=response.response, sources=sources, session_id=session_id
+        )
 
-            if error:
-                raise HTTPException(status_code=400, detail=error)
+    except Exception as e:
+        logger.error(f"Error processing chat request: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-            sources = None
-            if hasattr(response, "source_nodes") and response.source_nodes:
-                sources = [
-                    node.metadata.get("file_name", "Unknown source")
-                    for node in response.source_nodes
-                ]
 
-            return ChatResponse(
-                response=response.response, sources=sources, session_id=session_id
-            )
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        except Exception as e:
-            logger.error(f"Error processing chat request: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process a chat message and stream the response as server-sent events.
+
+    Emits "token" events with response text as it is generated, then a final
+    "done" event with the sources and session_id (or an "error" event).
+    """
+    # Validate and filter environment overrides
+    env_overrides = validate_env_overrides(request.env_overrides)
+
+    with EnvironmentManager.temporary_env_vars(env_overrides):
+        # Initialize or get cached components for this environment configuration
+        components = initialize_app(env_overrides)
+
+    session_id = request.session_id or str(uuid.uuid4())
+
+    # Spans started by the stream belong to this request's tracing tenant
+    tenant_context = get_instrumentation_manager().get_tenant_context(
+        components["tracer_config"]
+    )
+
+    async def event_stream():
+        async with chat_semaphore:
+            async with aclosing(
+                aprocess_interaction_stream(
+                    components["query_engine"],
+                    components["classifier"],
+                    components["tracer"],
+                    request.message,
+                    session_id,
+                    parent_context=tenant_context,
+                )
+            ) as events:
+                async for event, data in events:
+                    if event == "token":
+                        yield _sse_event("token", {"text": data})
+                    elif event == "done":
+                        sources = [
+                            source
+                            for node in data
+                            for source in node_sources(node.metadata)
+                        ]
+                        yield _sse_event(
+                            "done",
+                            {"sources": sources or None, "session_id": session_id},
+                        )
+                    else:
+                        yield _sse_event(
+                            "error", {"detail": data, "session_id": session_id}
+                        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/health")
@@ -261,8 +411,15 @@ async def debug_config():
         manager = get_instrumentation_manager()
         instrumentation_status = {
             "is_configured": manager.is_configured(),
+            "tenant_count": manager.get_tenant_count(),
             "has_valid_arize_config": has_valid_config,
         }
+        component_pool = session_manager.get_stats()
+        guard_cache = get_guard_cache()
+        settings = Settings()
+        embedding_batcher = get_query_embedding_batcher(
+            settings.EMBEDDING_BATCH_WINDOW_MS, settings.EMBEDDING_BATCH_SIZE
+        )
 
         # Safe config info (no sensitive data)
         safe_config = {
@@ -274,6 +431,11 @@ async def debug_config():
         return {
             "instrumentation": instrumentation_status,
             "arize_config": safe_config,
+            "component_pool": component_pool,
+            "guard_cache": guard_cache.get_stats() if guard_cache else None,
+            "embedding_batcher": (
+                embedding_batcher.get_stats() if embedding_batcher else None
+            ),
             "environment_vars": {
                 "ARIZE_SPACE_ID_set": bool(os.getenv("ARIZE_SPACE_ID")),
                 "ARIZE_API_KEY_set": bool(os.getenv("ARIZE_API_KEY")),
@@ -284,9 +446,33 @@ async def debug_config():
         return {"error": str(e), "status": "debug_failed"}
 
 
+@app.get("/admin/cache-stats")
+async def cache_stats():
+    """Admin endpoint with hit/miss counters of the in-process caches."""
+    query_embedding_cache = get_query_embedding_cache(
+        Settings().QUERY_EMBEDDING_CACHE_SIZE
+    )
+    guard_cache = get_guard_cache()
+    response_cache = get_response_cache()
+    return {
+        "query_embedding_cache": (
+            query_embedding_cache.get_stats() if query_embedding_cache else None
+        ),
+        "guard_cache": guard_cache.get_stats() if guard_cache else None,
+        "response_cache": response_cache.get_stats() if response_cache else None,
+    }
+
+
 @app.post("/admin/rebuild-index")
-async def rebuild_index():
-    """Admin endpoint to force rebuild the index."""
+def rebuild_index():
+    """
+    Admin endpoint to force rebuild the index.
+
+    A plain def, so FastAPI runs the blocking ingestion in its threadpool
+    while chats and streams keep being served from the old index.
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Index rebuild already running")
     try:
         # Check if we have initialized components
         if not app_state.get("initialized", False):
@@ -303,6 +489,20 @@ async def rebuild_index():
 
         # Update the components
         query_engine = index_manager.get_query_engine()
+        local_classifier = index_manager.get_local_classifier()
+        context_assembler = index_manager.get_context_assembler()
+
+        # Swap the shared index and drop pooled components built on the old one
+        with _shared_lock:
+            shared_components["index_manager"] = index_manager
+            shared_components["query_engine"] = query_engine
+            shared_components["local_classifier"] = local_classifier
+            shared_components["context_assembler"] = context_assembler
+        session_manager.clear_cache()
+        # Answers generated from the old index must not be served again
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            response_cache.clear()
 
         # Update app state
         app_state["query_engine"] = query_engine
@@ -311,11 +511,15 @@ async def rebuild_index():
 
         return {"status": "success", "message": "Index rebuilt successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error rebuilding index: {str(e)}")
         raise HTTPException(
             status_code=500, detail=f"Failed to rebuild index: {str(e)}"
         )
+    finally:
+        _rebuild_lock.release()
 
 
 @app.get("/admin/index-status")
@@ -334,11 +538,7 @@ async def index_status():
 
         # Check if index files exist and are valid
         index_exists = True
-        required_files = [
-            "default__vector_store.json",
-            "index_store.json",
-            "docstore.json",
-        ]
+        required_files = [*vector_store_files(), "index_store.json", DOCSTORE_FILE]
 
         if not storage_path.exists():
             index_exists = False
@@ -371,8 +571,13 @@ async def index_status():
 
         # Determine if rebuild is needed
         should_rebuild = False
+        changed_files = []
         if not index_exists:
             should_rebuild = True
+        elif IngestionManifest.exists(str(storage_path)):
+            # Changed files are re-indexed incrementally on the next load
+            changed, _ = IngestionManifest.load(str(storage_path)).diff(pdf_files)
+            changed_files = [Path(p).name for p in changed]
         else:
             # Check if any PDF files are newer than index files
             try:
@@ -421,6 +626,7 @@ async def index_status():
         return {
             "index_exists": index_exists,
             "should_rebuild": should_rebuild,
+            "changed_files": changed_files,
             "storage_path": str(storage_path),
             "data_path": str(data_path),
             "pdf_files_found": len(pdf_files),
@@ -443,11 +649,13 @@ async def root():
         "status": "healthy" if app_state.get("initialized", False) else "initializing",
         "endpoints": {
             "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream",
             "health": "/health",
             "debug": "/debug/config",
             "admin": {
                 "rebuild_index": "/admin/rebuild-index",
                 "index_status": "/admin/index-status",
+                "cache_stats": "/admin/cache-stats",
             },
         },
     }
@@ -1,5 +1,7 @@
 import hashlib
 import json
+import threading
+from collections import OrderedDict
 from typing import Dict, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import logging
@@ -8,11 +10,21 @@ logger = logging.getLogger(__name__)
 
 
 class SessionManager:
-    """Manages cached sessions for different environment configurations."""
+    """
+    Manages cached components for different environment configurations.
 
-    def __init__(self, cache_ttl_minutes: int = 30):
-        self._cache: Dict[str, Tuple[Dict[str, Any], datetime]] = {}
+    Entries are kept in least-recently-used order and expire after the TTL.
+    When the pool is full, the least recently used configuration is evicted.
+    """
+
+    def __init__(self, cache_ttl_minutes: int = 30, max_entries: int = 32):
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], datetime]]" = OrderedDict()
         self._cache_ttl = timedelta(minutes=cache_ttl_minutes)
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
 
     def _generate_cache_key(self, env_vars: Optional[Dict[str, str]]) -> str:
         """Generate a unique cache key for the environment configuration."""
@@ -32,30 +44,43 @@ class SessionManager:
         """Retrieve cached components for the given environment configuration."""
         cache_key = self._generate_cache_key(env_vars)
 
-        if cache_key in self._cache:
-            components, timestamp = self._cache[cache_key]
+        with self._lock:
+            if cache_key in self._cache:
+                components, timestamp = self._cache[cache_key]
 
-            # Check if cache is still valid
-            if datetime.now() - timestamp < self._cache_ttl:
-                logger.info(f"Using cached components for key: {cache_key}")
-                return components
-            else:
-                # Cache expired, remove it
-                logger.info(f"Cache expired for key: {cache_key}")
-                del self._cache[cache_key]
+                # Check if cache is still valid
+                if datetime.now() - timestamp < self._cache_ttl:
+                    self._cache.move_to_end(cache_key)
+                    self._hits += 1
+                    logger.info(f"Using cached components for key: {cache_key}")
+                    return components
+                else:
+                    # Cache expired, remove it
+                    logger.info(f"Cache expired for key: {cache_key}")
+                    del self._cache[cache_key]
 
-        return None
+            self._misses += 1
+            return None
 
     def cache_components(
         self, env_vars: Optional[Dict[str, str]], components: Dict[str, Any]
     ):
         """Cache components for the given environment configuration."""
         cache_key = self._generate_cache_key(env_vars)
-        self._cache[cache_key] = (components, datetime.now())
-        logger.info(f"Cached components for key: {cache_key}")
 
-        # Clean up old entries
-        self._cleanup_expired_cache()
+        with self._lock:
+            self._cache[cache_key] = (components, datetime.now())
+            self._cache.move_to_end(cache_key)
+            logger.info(f"Cached components for key: {cache_key}")
+
+            # Clean up old entries
+            self._cleanup_expired_cache()
+
+            # Evict least recently used entries beyond capacity
+            while len(self._cache) > self._max_entries:
+                evicted_key, _ = self._cache.popitem(last=False)
+                self._evictions += 1
+                logger.info(f"Evicted least recently used cache entry: {evicted_key}")
 
     def _cleanup_expired_cache(self):
         """Remove expired cache entries."""
@@ -70,7 +95,20 @@ class SessionManager:
             del self._cache[key]
             logger.info(f"Removed expired cache entry: {key}")
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "max_entries": self._max_entries,
+                "ttl_minutes": self._cache_ttl.total_seconds() / 60,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
     def clear_cache(self):
         """Clear all cached sessions."""
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
         logger.info("Cleared all cached sessions")
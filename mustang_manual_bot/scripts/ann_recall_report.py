@@ -0,0 +1,95 @@
+"""
+Recall@k and latency of the IVF index against exact search.
+
+Builds the index over clustered synthetic vectors (or a persisted store
+with --storage-dir) and sweeps the number of probed lists, so ANN_LISTS
+and ANN_PROBES can be picked for a target recall.
+
+    python scripts/ann_recall_report.py --nodes 50000 --probes 1 4 8 16 32
+    python scripts/ann_recall_report.py --storage-dir ./storage --lists 256
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.llamaindex_app.ann_index import (  # noqa: E402
+    IVFIndex,
+    default_n_lists,
+    recall_at_k,
+)
+from src.llamaindex_app.retrieval import VectorSearchEngine  # noqa: E402
+from src.llamaindex_app.vector_store import (  # noqa: E402
+    MmapVectorStore,
+    normalize_rows,
+)
+
+
+def synthetic_matrix(num_nodes: int, dim: int, rng) -> np.ndarray:
+    # Chunk embeddings are clustered by topic, unlike uniform random vectors
+    centers = rng.normal(size=(max(1, num_nodes // 100), dim))
+    labels = rng.integers(len(centers), size=num_nodes)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(num_nodes, dim))
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def timed_search(engine: VectorSearchEngine, queries: np.ndarray, top_k: int):
+    start = time.perf_counter()
+    hits = [[node_id for node_id, _ in engine.search(q, top_k)] for q in queries]
+    return hits, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)  # BGE-small
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--lists", type=int, default=0, help="0 picks 4 * sqrt(N)")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--storage-dir", help="Report on a persisted store instead")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.storage_dir:
+        store = MmapVectorStore.from_persist_dir(args.storage_dir)
+        matrix, node_ids = store.matrix, store.node_ids
+    else:
+        matrix = synthetic_matrix(args.nodes, args.dim, rng)
+        node_ids = [str(i) for i in range(len(matrix))]
+
+    # Queries near existing chunks, as real questions are near their answers
+    rows = rng.integers(len(matrix), size=args.queries)
+    queries = matrix[rows] + 0.3 * rng.normal(size=(args.queries, matrix.shape[1]))
+    queries = normalize_rows(queries.astype(np.float32))
+
+    n_lists = args.lists or default_n_lists(len(matrix))
+    start = time.perf_counter()
+    ann = IVFIndex.build(matrix, n_lists=n_lists)
+    build_s = time.perf_counter() - start
+
+    exact_engine = VectorSearchEngine(matrix, node_ids)
+    exact, exact_ms = timed_search(exact_engine, queries, args.top_k)
+    print(
+        f"{len(matrix)} vectors, {matrix.shape[1]} dims, {n_lists} lists "
+        f"(built in {build_s:.1f} s), {args.queries} queries, top_k={args.top_k}"
+    )
+    print(f"{'exact':>12}: recall@{args.top_k} 1.000  {exact_ms:.3f} ms/query")
+
+    for n_probe in args.probes:
+        engine = VectorSearchEngine(matrix, node_ids, ann=ann, n_probe=n_probe)
+        approximate, ann_ms = timed_search(engine, queries, args.top_k)
+        print(
+            f"{f'{n_probe} probes':>12}: recall@{args.top_k} "
+            f"{recall_at_k(exact, approximate):.3f}  {ann_ms:.3f} ms/query  "
+            f"({exact_ms / ann_ms:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
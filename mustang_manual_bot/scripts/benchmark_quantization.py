@@ -0,0 +1,102 @@
+"""
+Memory, recall@k and latency of quantized search against exact float32.
+
+Compares scanning the float32 matrix with float16 and int8 copies, with
+and without exact rescoring, on clustered synthetic vectors or on any
+persisted store (e.g. the Mustang or 10-K storage dir) with --storage-dir.
+
+    python scripts/benchmark_quantization.py --nodes 50000
+    python scripts/benchmark_quantization.py --storage-dir ./storage --top-k 3
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.llamaindex_app.ann_index import recall_at_k  # noqa: E402
+from src.llamaindex_app.quantization import QuantizedMatrix  # noqa: E402
+from src.llamaindex_app.retrieval import VectorSearchEngine  # noqa: E402
+from src.llamaindex_app.vector_store import (  # noqa: E402
+    MmapVectorStore,
+    normalize_rows,
+)
+
+
+def synthetic_matrix(num_nodes: int, dim: int, rng) -> np.ndarray:
+    centers = rng.normal(size=(max(1, num_nodes // 100), dim))
+    labels = rng.integers(len(centers), size=num_nodes)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(num_nodes, dim))
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def legacy_json_bytes(matrix: np.ndarray, sample: int = 1000) -> int:
+    # Estimated from a sample: SimpleVectorStore writes float64 lists as JSON
+    rows = np.asarray(matrix[:sample], dtype=np.float64).tolist()
+    return int(len(json.dumps(rows)) * len(matrix) / max(1, len(rows)))
+
+
+def timed_search(engine: VectorSearchEngine, queries: np.ndarray, top_k: int):
+    start = time.perf_counter()
+    hits = [[node_id for node_id, _ in engine.search(q, top_k)] for q in queries]
+    return hits, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)  # BGE-small
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--rescore", type=int, default=4)
+    parser.add_argument("--storage-dir", help="Benchmark a persisted store instead")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.storage_dir:
+        store = MmapVectorStore.from_persist_dir(args.storage_dir)
+        matrix = np.asarray(store.matrix, dtype=np.float32)
+        node_ids = store.node_ids
+    else:
+        matrix = synthetic_matrix(args.nodes, args.dim, rng)
+        node_ids = [str(i) for i in range(len(matrix))]
+
+    rows = rng.integers(len(matrix), size=args.queries)
+    queries = matrix[rows] + 0.3 * rng.normal(size=(args.queries, matrix.shape[1]))
+    queries = normalize_rows(queries.astype(np.float32))
+
+    exact, exact_ms = timed_search(
+        VectorSearchEngine(matrix, node_ids), queries, args.top_k
+    )
+    print(
+        f"{len(matrix)} vectors, {matrix.shape[1]} dims, {args.queries} queries, "
+        f"top_k={args.top_k}"
+    )
+    print(f"{'legacy json':>20}: {legacy_json_bytes(matrix) / 2**20:8.1f} MiB")
+    print(
+        f"{'float32':>20}: {matrix.nbytes / 2**20:8.1f} MiB  "
+        f"recall@{args.top_k} 1.000  {exact_ms:.3f} ms/query"
+    )
+
+    for dtype in ("float16", "int8"):
+        quantized = QuantizedMatrix.quantize(matrix, dtype)
+        for rescore in (0, args.rescore):
+            engine = VectorSearchEngine(
+                matrix, node_ids, quantized=quantized, rescore=rescore
+            )
+            hits, ms = timed_search(engine, queries, args.top_k)
+            name = f"{dtype}" + (f" + rescore x{rescore}" if rescore else "")
+            print(
+                f"{name:>20}: {quantized.nbytes / 2**20:8.1f} MiB  "
+                f"recall@{args.top_k} {recall_at_k(exact, hits):.3f}  "
+                f"{ms:.3f} ms/query"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark: default LlamaIndex retriever vs the NumPy search engine.
+
+Uses random unit vectors (or a persisted index with --storage-dir) and
+precomputed query embeddings, so only the search itself is timed.
+
+    python scripts/benchmark_retrieval.py --nodes 5000 --queries 200
+    python scripts/benchmark_retrieval.py --storage-dir ./storage
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llama_index.core import (  # noqa: E402
+    QueryBundle,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+from llama_index.core.embeddings import MockEmbedding  # noqa: E402
+from llama_index.core.schema import TextNode  # noqa: E402
+
+from src.llamaindex_app.retrieval import EngineRetriever  # noqa: E402
+from src.llamaindex_app.vector_store import MmapVectorStore  # noqa: E402
+
+
+def build_synthetic_index(num_nodes: int, dim: int, rng) -> VectorStoreIndex:
+    vectors = rng.normal(size=(num_nodes, dim)).astype(np.float32)
+    nodes = [
+        TextNode(text=f"node {i}", embedding=vector.tolist())
+        for i, vector in enumerate(vectors)
+    ]
+    return VectorStoreIndex(nodes, embed_model=MockEmbedding(embed_dim=dim))
+
+
+def load_persisted_index(storage_dir: str) -> VectorStoreIndex:
+    kwargs = {"persist_dir": storage_dir}
+    if MmapVectorStore.exists(storage_dir):
+        kwargs["vector_store"] = MmapVectorStore.from_persist_dir(storage_dir)
+    return load_index_from_storage(
+        StorageContext.from_defaults(**kwargs),
+        embed_model=MockEmbedding(embed_dim=1),
+    )
+
+
+def time_calls(fn, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)  # BGE-small
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--storage-dir", help="Benchmark a persisted index instead")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.storage_dir:
+        index = load_persisted_index(args.storage_dir)
+    else:
+        index = build_synthetic_index(args.nodes, args.dim, rng)
+
+    baseline = index.as_retriever(similarity_top_k=args.top_k)
+    engine_retriever = EngineRetriever(index, similarity_top_k=args.top_k)
+    engine = engine_retriever.engine
+    dim = engine.matrix.shape[1]
+    queries = rng.normal(size=(args.queries, dim)).astype(np.float32)
+    bundles = [QueryBundle(query_str="", embedding=q.tolist()) for q in queries]
+
+    print(
+        f"{len(engine)} nodes, {dim} dims, {args.queries} queries, top_k={args.top_k}"
+    )
+
+    # Same results, best first
+    for bundle in bundles[:20]:
+        expected = [n.node.node_id for n in baseline.retrieve(bundle)]
+        actual = [n.node.node_id for n in engine_retriever.retrieve(bundle)]
+        assert expected == actual, (expected, actual)
+
+    results = {
+        "default retriever": time_calls(baseline.retrieve, bundles),
+        "engine retriever": time_calls(engine_retriever.retrieve, bundles),
+        "engine search only": time_calls(
+            lambda q: engine.search(q, args.top_k), queries
+        ),
+    }
+    for name, stats in results.items():
+        print(
+            f"{name:>20}: p50 {stats['p50_ms']:.3f} ms  "
+            f"p99 {stats['p99_ms']:.3f} ms  mean {stats['mean_ms']:.3f} ms"
+        )
+
+    start = time.perf_counter()
+    engine.search_batch(queries, args.top_k)
+    batch_ms = (time.perf_counter() - start) * 1000
+    print(
+        f"{'engine batch search':>20}: {batch_ms:.3f} ms for {args.queries} queries "
+        f"({batch_ms / args.queries:.3f} ms/query)"
+    )
+    speedup = (
+        results["default retriever"]["p50_ms"] / results["engine retriever"]["p50_ms"]
+    )
+    print(f"Speedup at p50: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
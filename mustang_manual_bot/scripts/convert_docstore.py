@@ -0,0 +1,59 @@
+"""
+Convert persisted docstore.json files to the SQLite docstore.
+
+mustang_manual_bot, 10-k-chatbot and assurant-chatbot read
+docstore.sqlite; the other chatbots still load docstore.json, so do not
+convert their storage. The apps also convert their own storage on first
+load; this does it ahead of a deploy. JSON files are left in place.
+
+    python scripts/convert_docstore.py            # ./storage
+    python scripts/convert_docstore.py storage ../10-k-chatbot/backend/storage
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.llamaindex_app.docstore import (  # noqa: E402
+    DOCSTORE_FILE,
+    LEGACY_DOCSTORE_FILE,
+    SQLiteDocumentStore,
+)
+
+
+def convert(storage_dir: Path, force: bool):
+    json_path = storage_dir / LEGACY_DOCSTORE_FILE
+    db_path = storage_dir / DOCSTORE_FILE
+    if not json_path.exists():
+        print(f"{storage_dir}: no {LEGACY_DOCSTORE_FILE}, nothing to convert")
+        return
+    if db_path.exists() and not force:
+        print(f"{storage_dir}: {DOCSTORE_FILE} exists, skipped (use --force)")
+        return
+
+    start = time.perf_counter()
+    SQLiteDocumentStore.from_docstore_json(str(json_path), str(db_path))
+    print(
+        f"{storage_dir}: {json_path.stat().st_size / 2**20:.1f} MiB JSON -> "
+        f"{db_path.stat().st_size / 2**20:.1f} MiB SQLite "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("storage_dirs", nargs="*", default=["storage"])
+    parser.add_argument(
+        "--force", action="store_true", help="Replace an existing docstore.sqlite"
+    )
+    args = parser.parse_args()
+
+    for storage_dir in args.storage_dirs:
+        convert(Path(storage_dir), args.force)
+
+
+if __name__ == "__main__":
+    main()
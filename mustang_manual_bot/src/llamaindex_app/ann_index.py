@@ -0,0 +1,180 @@
+from pathlib import Path
+from typing import List, Optional, Sequence
+import hashlib
+import logging
+import math
+import os
+import numpy as np
+from src.llamaindex_app.vector_store import normalize_rows, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_FILE = "default__vector_store.ivf.npz"
+
+# Rows scored per block while assigning vectors to lists, to bound memory
+_ASSIGN_BLOCK = 8192
+
+
+def default_n_lists(num_vectors: int) -> int:
+    """Rule-of-thumb list count: about 4 * sqrt(N)."""
+    return max(1, min(num_vectors, int(4 * math.sqrt(num_vectors))))
+
+
+def corpus_fingerprint(node_ids: Sequence[str]) -> str:
+    """
+    Identify the corpus an index was built for. Node ids hash their chunk's
+    content (see ingestion.parse_file), so revised text changes it too.
+    """
+    return hashlib.sha256("\0".join(node_ids).encode()).hexdigest()[:16]
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), _ASSIGN_BLOCK):
+        block = np.asarray(matrix[start : start + _ASSIGN_BLOCK], dtype=np.float32)
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, iterations: int = 20, seed: int = 0
+) -> np.ndarray:
+    """K-means on the unit sphere (cosine similarity); returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Sum each cluster's vectors with one reduceat over the sorted rows
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        used = counts > 0
+        sums[used] = np.add.reduceat(vectors[order], starts[used], axis=0)
+
+        # Re-seed empty lists from random vectors so every list is used
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty))]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over a normalized
+    embedding matrix.
+
+    A spherical k-means coarse quantizer splits the vectors into ``n_lists``
+    lists. A query scores the list centroids, then scores exactly only the
+    vectors in its ``n_probe`` best lists. More probes give better recall at
+    higher latency; ``n_probe == n_lists`` is exact search.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        order: np.ndarray,
+        offsets: np.ndarray,
+        fingerprint: str = "",
+    ):
+        self.centroids = centroids
+        self.order = order  # Matrix rows grouped by list
+        self.offsets = offsets  # List l holds order[offsets[l]:offsets[l + 1]]
+        self.fingerprint = fingerprint
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        n_lists: Optional[int] = None,
+        iterations: int = 20,
+        sample_size: int = 100_000,
+        seed: int = 0,
+        fingerprint: str = "",
+    ) -> "IVFIndex":
+        """Train the coarse quantizer on a sample and assign every vector."""
+        num_vectors = len(matrix)
+        n_lists = min(n_lists or default_n_lists(num_vectors), num_vectors)
+
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(
+            rng.choice(num_vectors, min(sample_size, num_vectors), replace=False)
+        )
+        centroids = spherical_kmeans(matrix[sample_rows], n_lists, iterations, seed)
+
+        assignments = _assign(matrix, centroids)
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=offsets[1:])
+
+        logger.info(f"Built IVF index with {n_lists} lists over {num_vectors} vectors")
+        return cls(centroids, order, offsets, fingerprint)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            fingerprint=np.array(self.fingerprint),
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved IVF index to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"],
+                data["order"],
+                data["offsets"],
+                str(data["fingerprint"]),
+            )
+
+    @classmethod
+    def load_or_build(
+        cls,
+        persist_dir: str,
+        matrix: np.ndarray,
+        node_ids: Sequence[str],
+        n_lists: Optional[int] = None,
+    ) -> "IVFIndex":
+        """Load the persisted index if it matches the corpus, else rebuild it."""
+        path = Path(persist_dir) / ANN_INDEX_FILE
+        fingerprint = corpus_fingerprint(node_ids)
+        if path.exists():
+            index = cls.load(str(path))
+            if index.fingerprint == fingerprint and (
+                not n_lists or index.n_lists == n_lists
+            ):
+                logger.info(f"Loaded IVF index with {index.n_lists} lists")
+                return index
+            logger.info("IVF index is stale, rebuilding")
+
+        index = cls.build(matrix, n_lists=n_lists, fingerprint=fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index.save(str(path))
+        return index
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Matrix rows in the n_probe lists closest to a normalized query."""
+        lists = top_k_indices(self.centroids @ query, n_probe)
+        return np.concatenate(
+            [self.order[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+        )
+
+
+def recall_at_k(exact: List[List[str]], approximate: List[List[str]]) -> float:
+    """Fraction of the exact top-k results that the approximate search found."""
+    found = sum(len(set(e) & set(a)) for e, a in zip(exact, approximate))
+    total = sum(len(e) for e in exact)
+    return found / total if total else 1.0
@@ -1,5 +1,7 @@
 from enum import Enum
-from typing import Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Type
+import asyncio
+import contextvars
 import logging
 from llama_index.core import Response
 from pydantic import BaseModel, Field
@@ -7,6 +9,7 @@ from src.llamaindex_app.tools import RiskScoringTools
 from src.llamaindex_app.config import (
     Settings,
     CLASSIFICATION_PROMPT,
+    PRECHECK_PROMPT,
     RAG_PROMPT,
     TEMPLATE_VERSION,
 )
@@ -30,20 +33,53 @@ class QueryType(BaseModel):
     confidence: float = Field(description="Confidence score between 0 and 1")
 
 
+class PrecheckVerdict(QueryType):
+    jailbreak: bool = Field(description="Whether the query attempts a jailbreak")
+    toxic: bool = Field(description="Whether the query contains toxic language")
+
+
 class QueryCategory(str, Enum):
     FORD_MUSTANG = "ford_mustang"
     OUT_OF_SCOPE = "out_of_scope"
 
 
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def _iter_stream_deltas(stream) -> AsyncIterator[str]:
+    """Yield text deltas from an OpenAI stream, closing it when done or abandoned."""
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+        if close:
+            await close()
+
+
 class QueryClassifier:
-    def __init__(self, query_engine, openai_client):
+    def __init__(
+        self,
+        query_engine,
+        openai_client,
+        async_openai_client=None,
+        local_classifier=None,
+        context_assembler=None,
+    ):
         self.query_engine = query_engine
         self.openai_client = openai_client
+        self.async_openai_client = async_openai_client
+        self.local_classifier = local_classifier
+        self.context_assembler = context_assembler
         self.risk_tools = RiskScoringTools.get_all_tools()
         self.settings = Settings()
         self.tracer = trace.get_tracer(__name__)
 
-    def _parse_classification_response(self, response_text: str) -> QueryType:
+    def _parse_classification_response(
+        self, response_text: str, model: Type[QueryType] = QueryType
+    ) -> QueryType:
         try:
             cleaned_text = response_text.strip()
             if "```json" in cleaned_text:
@@ -51,24 +87,32 @@ class QueryClassifier:
             elif "```" in cleaned_text:
                 cleaned_text = cleaned_text.split("```")[1].strip()
 
-            return QueryType(**json.loads(cleaned_text))
+            return model(**json.loads(cleaned_text))
         except Exception as e:
             logger.error(f"Failed to parse classification response: {e}")
             raise
 
-    def _call_openai(self, system_prompt: str, query: str, span=None) -> str:
+    def _completion_kwargs(self, system_prompt: str, query: str, **overrides) -> Dict:
+        return {
+            "model": self.settings.OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": query},
+            ],
+            "temperature": 0,
+            "max_tokens": 4096,
+            **overrides,
+        }
+
+    def _call_openai(
+        self, system_prompt: str, query: str, span=None, **overrides
+    ) -> str:
         try:
             if span:
                 span.set_attribute(SpanAttributes.LLM_PROMPT_TEMPLATE, system_prompt)
 
             response = self.openai_client.chat.completions.create(
-                model=self.settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query},
-                ],
-                temperature=0,
-                max_tokens=4096,
+                **self._completion_kwargs(system_prompt, query, **overrides)
             )
 
             return response.choices[0].message.content
@@ -78,7 +122,92 @@ class QueryClassifier:
                 span.record_exception(e)
             raise OpenAIError(f"OpenAI API error: {str(e)}")
 
+    async def _acall_openai(
+        self, system_prompt: str, query: str, span=None, **overrides
+    ) -> str:
+        if self.async_openai_client is None:
+            return await asyncio.to_thread(
+                self._call_openai, system_prompt, query, span, **overrides
+            )
+
+        try:
+            if span:
+                span.set_attribute(SpanAttributes.LLM_PROMPT_TEMPLATE, system_prompt)
+
+            response = await self.async_openai_client.chat.completions.create(
+                **self._completion_kwargs(system_prompt, query, **overrides)
+            )
+
+            return response.choices[0].message.content
+        except Exception as e:
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise OpenAIError(f"OpenAI API error: {str(e)}")
+
+    async def _astream_openai(
+        self, system_prompt: str, query: str, span=None
+    ) -> AsyncIterator[str]:
+        """Start a streaming completion and return an iterator of text deltas."""
+        if self.async_openai_client is None:
+            response_text = await self._acall_openai(system_prompt, query, span)
+            return _single_chunk(response_text)
+
+        try:
+            if span:
+                span.set_attribute(SpanAttributes.LLM_PROMPT_TEMPLATE, system_prompt)
+
+            stream = await self.async_openai_client.chat.completions.create(
+                **self._completion_kwargs(system_prompt, query),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+        except Exception as e:
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise OpenAIError(f"OpenAI API error: {str(e)}")
+
+        return _iter_stream_deltas(stream)
+
+    def _classify_locally(
+        self, query: str, span=None
+    ) -> Optional[Tuple[QueryCategory, float]]:
+        """
+        Classify with the local embedding classifier. Returns None when it is
+        unavailable or below the confidence threshold, so the LLM decides.
+        """
+        if self.local_classifier is None:
+            return None
+
+        try:
+            category, confidence = self.local_classifier.classify(query)
+            query_category = QueryCategory(category)
+        except Exception as e:
+            logger.warning(f"Local classification failed, using the LLM: {e}")
+            return None
+
+        threshold = self.settings.LOCAL_CLASSIFIER_THRESHOLD
+        confident = confidence >= threshold
+        if span:
+            span.set_attribute("classification.local_category", category)
+            span.set_attribute("classification.local_confidence", confidence)
+            span.set_attribute("classification.local_threshold", threshold)
+            span.set_attribute("classification.method", "local" if confident else "llm")
+
+        if not confident:
+            return None
+
+        if span:
+            span.set_attribute("query.category", category)
+            span.set_attribute("query.confidence", confidence)
+        return query_category, confidence
+
     def classify_query(self, query: str, span=None) -> Tuple[QueryCategory, float]:
+        local_result = self._classify_locally(query, span)
+        if local_result:
+            return local_result
+
         template_vars = {"query": str(query)}
 
         with using_prompt_template(
@@ -96,24 +225,152 @@ class QueryClassifier:
 
         return QueryCategory(classification.category), classification.confidence
 
-    def get_response(self, query: str, category: QueryCategory, span=None) -> Response:
+    async def aclassify_query(
+        self, query: str, span=None
+    ) -> Tuple[QueryCategory, float]:
+        if self.local_classifier is not None:
+            # Embedding the query is CPU-bound, so keep it off the event loop
+            local_result = await asyncio.to_thread(self._classify_locally, query, span)
+            if local_result:
+                return local_result
+
+        template_vars = {"query": str(query)}
+
+        with using_prompt_template(
+            template=CLASSIFICATION_PROMPT,
+            variables=template_vars,
+            version=TEMPLATE_VERSION,
+        ):
+            formatted_prompt = CLASSIFICATION_PROMPT.format(**template_vars)
+            output = await self._acall_openai(formatted_prompt, query, span)
+            classification = self._parse_classification_response(output)
+
+        if span:
+            span.set_attribute("query.category", classification.category)
+            span.set_attribute("query.confidence", classification.confidence)
+
+        return QueryCategory(classification.category), classification.confidence
+
+    def precheck_query(self, query: str) -> PrecheckVerdict:
+        """
+        Answer the jailbreak and toxicity guards and classify the query in one
+        structured-output call. Raises if the output is not a valid verdict.
+        """
+        template_vars = {"query": str(query)}
+
+        with using_prompt_template(
+            template=PRECHECK_PROMPT,
+            variables=template_vars,
+            version=TEMPLATE_VERSION,
+        ):
+            formatted_prompt = PRECHECK_PROMPT.format(**template_vars)
+            output = self._call_openai(
+                formatted_prompt, query, response_format={"type": "json_object"}
+            )
+            verdict = self._parse_classification_response(output, PrecheckVerdict)
+
+        # Reject categories the pipeline does not know about
+        QueryCategory(verdict.category)
+        return verdict
+
+    async def aprecheck_query(self, query: str) -> PrecheckVerdict:
+        template_vars = {"query": str(query)}
+
+        with using_prompt_template(
+            template=PRECHECK_PROMPT,
+            variables=template_vars,
+            version=TEMPLATE_VERSION,
+        ):
+            formatted_prompt = PRECHECK_PROMPT.format(**template_vars)
+            output = await self._acall_openai(
+                formatted_prompt, query, response_format={"type": "json_object"}
+            )
+            verdict = self._parse_classification_response(output, PrecheckVerdict)
+
+        # Reject categories the pipeline does not know about
+        QueryCategory(verdict.category)
+        return verdict
+
+    def _rag_template_vars(self, query: str, nodes: List) -> Dict[str, str]:
+        # Number the retrieved contexts, compressed to the token budget if an
+        # assembler is configured; the retriever decides how many there are
+        if self.context_assembler is not None:
+            contexts = self.context_assembler.assemble(query, nodes)
+        else:
+            contexts = [(node, str(node.text)) for node in nodes]
+
+        blocks = []
+        for i, (node, context) in enumerate(contexts, start=1):
+            # Deduplicated chunks apply to every model year they list
+            years = node.metadata.get("model_years")
+            if years and len(years) > 1:
+                context = f"(Model years: {', '.join(map(str, years))})\n{context}"
+            blocks.append(f"Context {i}: {context}")
+
+        return {"contexts": "\n".join(blocks), "query": str(query)}
+
+    async def _arag_template_vars(self, query: str, nodes: List) -> Dict[str, str]:
+        """
+        _rag_template_vars on the retrieval pool, since assembling contexts
+        embeds sentences and reads the embedding cache.
+        """
+        if self.context_assembler is None:
+            return self._rag_template_vars(query, nodes)
+        loop = asyncio.get_running_loop()
+        # Carry the tracing context into the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            getattr(self.query_engine, "executor", None),
+            ctx.run,
+            self._rag_template_vars,
+            query,
+            nodes,
+        )
+
+    def get_response(
+        self, query: str, category: QueryCategory, span=None, nodes=None
+    ) -> Response:
         try:
             if category == QueryCategory.FORD_MUSTANG:
                 try:
-                    nodes = self.query_engine.retrieve(query)
+                    if nodes is None:
+                        nodes = self.query_engine.retrieve(query)
+                    template_vars = self._rag_template_vars(query, nodes)
+
+                    with using_prompt_template(
+                        template=RAG_PROMPT,
+                        variables=template_vars,
+                        version=TEMPLATE_VERSION,
+                    ):
+                        formatted_prompt = RAG_PROMPT.format(**template_vars)
+                        response_text = self._call_openai(formatted_prompt, query, span)
 
-                    # Create a dictionary of context variables, with empty strings as defaults
-                    template_vars = {
-                        "context_1": "",
-                        "context_2": "",
-                        "context_3": "",
-                        "query": str(query),
-                    }
+                    return Response(response=response_text, source_nodes=nodes)
+                except Exception as e:
+                    logger.error(
+                        f"Error in Mustang Manual response generation: {str(e)}"
+                    )
+                    raise
+            else:
+                return Response(
+                    response="I'm trained to help with questions about Ford's Mustang manuals. How can I assist you with this topic?"
+                )
+        except Exception as e:
+            logger.error(f"Error getting response: {str(e)}")
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise
 
-                    # Fill in available contexts from nodes
-                    for i, node in enumerate(nodes, start=1):
-                        if i <= 3:  # Only use first 3 nodes
-                            template_vars[f"context_{i}"] = str(node.text)
+    async def aget_response(
+        self, query: str, category: QueryCategory, span=None, nodes=None
+    ) -> Response:
+        try:
+            if category == QueryCategory.FORD_MUSTANG:
+                try:
+                    if nodes is None:
+                        nodes = await self.query_engine.aretrieve(query)
+                    template_vars = await self._arag_template_vars(query, nodes)
 
                     with using_prompt_template(
                         template=RAG_PROMPT,
@@ -121,7 +378,9 @@ class QueryClassifier:
                         version=TEMPLATE_VERSION,
                     ):
                         formatted_prompt = RAG_PROMPT.format(**template_vars)
-                        response_text = self._call_openai(formatted_prompt, query, span)
+                        response_text = await self._acall_openai(
+                            formatted_prompt, query, span
+                        )
 
                     return Response(response=response_text, source_nodes=nodes)
                 except Exception as e:
@@ -139,3 +398,44 @@ class QueryClassifier:
                 span.set_status(Status(StatusCode.ERROR))
                 span.record_exception(e)
             raise
+
+    async def astream_response(
+        self, query: str, category: QueryCategory, span=None, nodes=None
+    ) -> Tuple[List, AsyncIterator[str]]:
+        """
+        Like aget_response, but returns the source nodes and an iterator of
+        response text deltas as soon as generation starts.
+        """
+        try:
+            if category == QueryCategory.FORD_MUSTANG:
+                try:
+                    if nodes is None:
+                        nodes = await self.query_engine.aretrieve(query)
+                    template_vars = await self._arag_template_vars(query, nodes)
+
+                    with using_prompt_template(
+                        template=RAG_PROMPT,
+                        variables=template_vars,
+                        version=TEMPLATE_VERSION,
+                    ):
+                        formatted_prompt = RAG_PROMPT.format(**template_vars)
+                        deltas = await self._astream_openai(
+                            formatted_prompt, query, span
+                        )
+
+                    return nodes, deltas
+                except Exception as e:
+                    logger.error(
+                        f"Error in Mustang Manual response generation: {str(e)}"
+                    )
+                    raise
+            else:
+                return [], _single_chunk(
+                    "I'm trained to help with questions about Ford's Mustang manuals. How can I assist you with this topic?"
+                )
+        except Exception as e:
+            logger.error(f"Error getting response: {str(e)}")
+            if span:
+                span.set_status(Status(StatusCode.ERROR))
+                span.record_exception(e)
+            raise
@@ -0,0 +1,137 @@
+from typing import Callable, List, Optional, Sequence, Tuple
+import logging
+import re
+import numpy as np
+from llama_index.core.utils import get_tokenizer
+from opentelemetry import trace
+from src.llamaindex_app.embedding_cache import EmbeddingCache
+from src.llamaindex_app.retrieval import QueryEmbeddingCache
+from src.llamaindex_app.vector_store import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends, and the blank lines between PDF blocks (headings, list
+# items, table rows) that often end without punctuation
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+
+class ContextAssembler:
+    """
+    Fits retrieved nodes into a prompt-token budget.
+
+    Nodes scoring below ``min_score_ratio`` of the best node are dropped;
+    a ratio of 0 keeps every node, for scores that are fused ranks rather
+    than similarities.
+    The remaining nodes are split into sentences, which are embedded with
+    the retrieval model (through the chunk embedding cache, so repeated
+    nodes are only embedded once) and ranked by similarity to the query.
+    The best sentences are kept until the budget is spent, and each
+    context keeps its selected sentences in their original order.
+    """
+
+    def __init__(
+        self,
+        embed_model,
+        token_budget: int,
+        min_score_ratio: float = 0.75,
+        max_contexts: int = 3,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        tokenizer: Optional[Callable[[str], List]] = None,
+    ):
+        self.embed_model = embed_model
+        self.token_budget = token_budget
+        self.min_score_ratio = min_score_ratio
+        self.max_contexts = max_contexts
+        self.embedding_cache = embedding_cache
+        self.query_cache = query_cache
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        if self.query_cache is not None:
+            embedding, _ = self.query_cache.get_query_embedding(self.embed_model, query)
+        else:
+            embedding = self.embed_model.get_query_embedding(query)
+        return normalize_rows(np.array(embedding, dtype=np.float32, ndmin=2))[0]
+
+    def _embed_sentences(self, sentences: List[str]) -> np.ndarray:
+        model_name = self.embed_model.model_name
+        embeddings = (
+            self.embedding_cache.get_many(model_name, sentences)
+            if self.embedding_cache
+            else [None] * len(sentences)
+        )
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            missing_sentences = [sentences[i] for i in missing]
+            computed = self.embed_model.get_text_embedding_batch(missing_sentences)
+            if self.embedding_cache:
+                self.embedding_cache.set_many(model_name, missing_sentences, computed)
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+        return normalize_rows(np.array(embeddings, dtype=np.float32))
+
+    def _relevant_nodes(self, nodes: Sequence) -> List:
+        nodes = list(nodes)[: self.max_contexts]
+        if self.min_score_ratio <= 0:
+            return nodes
+        scores = [node.score for node in nodes if node.score is not None]
+        if not scores or max(scores) <= 0:
+            return nodes
+        floor = max(scores) * self.min_score_ratio
+        return [node for node in nodes if node.score is None or node.score >= floor]
+
+    def assemble(self, query: str, nodes: Sequence) -> List[Tuple[object, str]]:
+        """Return (node, compressed text) pairs, best node first."""
+        original_tokens = sum(
+            self.count_tokens(str(node.text))
+            for node in list(nodes)[: self.max_contexts]
+        )
+        kept = self._relevant_nodes(nodes)
+
+        sentences: List[Tuple[int, int, str, int]] = []  # node, position, text, tokens
+        for node_index, node in enumerate(kept):
+            for position, sentence in enumerate(split_sentences(str(node.text))):
+                sentences.append(
+                    (node_index, position, sentence, self.count_tokens(sentence))
+                )
+
+        selected = set()
+        used_tokens = 0
+        if sentences:
+            similarities = self._embed_sentences([s[2] for s in sentences]) @ (
+                self._embed_query(query)
+            )
+            for i in np.argsort(-similarities, kind="stable"):
+                tokens = sentences[i][3]
+                # Skip sentences that do not fit; a shorter one still might
+                if used_tokens + tokens <= self.token_budget:
+                    selected.add(int(i))
+                    used_tokens += tokens
+
+        contexts = []
+        for node_index, node in enumerate(kept):
+            text = " ".join(
+                sentence
+                for i, (index, _, sentence, _) in enumerate(sentences)
+                if index == node_index and i in selected
+            )
+            if text:
+                contexts.append((node, text))
+
+        span = trace.get_current_span()
+        span.set_attribute("rag.context_tokens", used_tokens)
+        span.set_attribute("rag.context_tokens_original", original_tokens)
+        span.set_attribute("rag.context_tokens_saved", original_tokens - used_tokens)
+        span.set_attribute(
+            "rag.contexts_dropped",
+            min(len(nodes), self.max_contexts) - len(contexts),
+        )
+        return contexts
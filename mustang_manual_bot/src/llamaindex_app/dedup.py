@@ -0,0 +1,182 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import re
+import zlib
+import numpy as np
+from llama_index.core.schema import BaseNode, MetadataMode
+from src.llamaindex_app.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Largest prime below 2**32, so (a * x + b) fits in uint64 for a < 2**31
+_PRIME = np.uint64(4294967291)
+_WORD_PATTERN = re.compile(r"\w+")
+_YEAR_PATTERN = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+_DIGIT_PATTERN = re.compile(r"\d")
+
+# Provenance of a deduplicated node. It changes as later manuals are added,
+# so it is kept out of the embedded text to keep embeddings (and their
+# cache) stable
+_PROVENANCE_KEYS = ("model_years", "source_files", "source_pages")
+
+
+def model_year(file_name: str) -> Optional[int]:
+    """Model year from a manual's file name, e.g. 2018-Ford-Mustang-... -> 2018."""
+    match = _YEAR_PATTERN.search(Path(file_name).name)
+    return int(match.group(1)) if match else None
+
+
+def node_sources(metadata: Dict[str, Any]) -> List[str]:
+    """
+    File names to cite for a node: every manual a deduplicated node's chunk
+    appeared in, else the node's own file.
+    """
+    files = metadata.get("source_files") or [
+        metadata.get("file_name", "Unknown source")
+    ]
+    return list(dict.fromkeys(files))  # A chunk may repeat within a manual
+
+
+def spec_numbers(text: str) -> Tuple[str, ...]:
+    """
+    Sorted word tokens containing a digit (torque and capacity values, part
+    numbers), leaving out model years, which duplicates are labeled with.
+    """
+    words = _WORD_PATTERN.findall(normalize_text(text).lower())
+    return tuple(
+        sorted(
+            word
+            for word in words
+            if _DIGIT_PATTERN.search(word) and not _YEAR_PATTERN.fullmatch(word)
+        )
+    )
+
+
+class NearDuplicateFilter:
+    """
+    Collapses near-duplicate chunks with MinHash and LSH banding.
+
+    Each chunk is reduced to ``num_perm`` minimum hashes of its word
+    shingles; the fraction of equal minimums estimates the Jaccard
+    similarity of two chunks. Signatures are split into ``bands`` bands and
+    only chunks sharing a whole band are compared, so each chunk is checked
+    against a handful of candidates instead of every canonical chunk.
+
+    Chunks that differ only in a spec value (a torque, a capacity, a part
+    number) are still similar enough to match, so a candidate is only a
+    duplicate if its ``spec_numbers`` are equal too.
+
+    The first chunk seen (the earliest manual, in ingestion order) is kept
+    as the canonical node; later duplicates add their model year to its
+    ``model_years`` metadata and their file name and page label to its
+    ``source_files`` and ``source_pages`` (aligned lists), then are dropped.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 0,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2**31, size=(num_perm, 1), dtype=np.uint64)
+        self._signatures: List[np.ndarray] = []
+        self._numbers: List[Tuple[str, ...]] = []
+        self._canonical: List[BaseNode] = []
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.duplicates = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_PATTERN.findall(normalize_text(text).lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {
+            " ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))
+        }
+        hashes = np.array(
+            [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles],
+            dtype=np.uint64,
+        )
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, rows.tobytes())
+            for band, rows in enumerate(np.split(signature, self.bands))
+        ]
+
+    def _find_duplicate(
+        self, signature: np.ndarray, numbers: Tuple[str, ...]
+    ) -> Optional[int]:
+        candidates = {
+            i for key in self._band_keys(signature) for i in self._buckets.get(key, ())
+        }
+        best, best_similarity = None, self.threshold
+        for i in sorted(candidates):
+            if self._numbers[i] != numbers:
+                continue
+            similarity = float(np.mean(self._signatures[i] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = i, similarity
+        return best
+
+    def add(self, nodes: List[BaseNode], year: Optional[int] = None) -> List[BaseNode]:
+        """
+        Return the nodes that are not near-duplicates of a node already
+        added, folding the model year of the others into their canonical
+        node.
+        """
+        kept = []
+        for node in nodes:
+            text = node.get_content(metadata_mode=MetadataMode.NONE)
+            signature = self.signature(text)
+            numbers = spec_numbers(text)
+            duplicate = self._find_duplicate(signature, numbers)
+            if duplicate is not None:
+                canonical = self._canonical[duplicate]
+                years = canonical.metadata["model_years"]
+                if year is not None and year not in years:
+                    years.append(year)
+                    years.sort()
+                self._add_source(canonical, node)
+                self.duplicates += 1
+                continue
+
+            node.metadata["model_years"] = [] if year is None else [year]
+            node.metadata["source_files"] = []
+            node.metadata["source_pages"] = []
+            self._add_source(node, node)
+            for key in _PROVENANCE_KEYS:
+                if key not in node.excluded_embed_metadata_keys:
+                    node.excluded_embed_metadata_keys.append(key)
+            index = len(self._canonical)
+            self._canonical.append(node)
+            self._signatures.append(signature)
+            self._numbers.append(numbers)
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(index)
+            kept.append(node)
+        return kept
+
+    @staticmethod
+    def _add_source(canonical: BaseNode, node: BaseNode):
+        file_name = node.metadata.get("file_name")
+        if file_name is None:
+            return
+        page = str(node.metadata.get("page_label", ""))
+        files = canonical.metadata["source_files"]
+        pages = canonical.metadata["source_pages"]
+        if (file_name, page) not in zip(files, pages):
+            files.append(file_name)
+            pages.append(page)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"canonical": len(self._canonical), "duplicates": self.duplicates}
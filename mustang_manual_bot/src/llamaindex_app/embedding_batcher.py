@@ -0,0 +1,156 @@
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import queue
+import threading
+import time
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.embeddings.huggingface.utils import (
+    get_query_instruct_for_model_name,
+    get_text_instruct_for_model_name,
+)
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+
+def query_prefix(embed_model) -> Optional[str]:
+    """
+    The text that turns a query into the model's query input when it is
+    embedded as a document, or None if the model cannot batch queries.
+
+    HuggingFaceEmbedding prepends its query instruction to queries and its
+    text instruction to documents, so with an empty text instruction a
+    prefixed query embeds exactly as get_query_embedding would embed it.
+    """
+    if not isinstance(embed_model, HuggingFaceEmbedding):
+        return None
+    model_name = embed_model.model_name
+    if embed_model.text_instruction or get_text_instruct_for_model_name(model_name):
+        return None
+    return embed_model.query_instruction or get_query_instruct_for_model_name(
+        model_name
+    )
+
+
+def forward_pass_size(embed_model) -> int:
+    """How many queries embed_queries embeds in one forward pass."""
+    if query_prefix(embed_model) is None:
+        return 1
+    return max(1, embed_model.embed_batch_size)
+
+
+def embed_queries(embed_model, queries: List[str]) -> List[List[float]]:
+    """
+    Embed queries through the model's public embedding API, so embedding
+    callbacks and instrumentation fire. Up to forward_pass_size queries go
+    through get_text_embedding_batch in one forward pass; models that
+    cannot batch queries embed them one at a time.
+    """
+    prefix = query_prefix(embed_model)
+    if prefix is None:
+        return [embed_model.get_query_embedding(query) for query in queries]
+    return embed_model.get_text_embedding_batch([prefix + query for query in queries])
+
+
+class QueryEmbeddingBatcher:
+    """
+    Micro-batches query embeddings across concurrent requests.
+
+    Callers on the retrieval pool enqueue their query and block on a future.
+    A single worker thread takes the first waiting query, collects any that
+    arrive within ``window_ms`` (up to ``max_batch_size``), embeds them in
+    as few forward passes as the model allows and resolves every future.
+    Metrics are counted per forward pass. A larger window gives bigger
+    batches under load at the cost of up to ``window_ms`` of added latency.
+    """
+
+    def __init__(self, window_ms: float = 5.0, max_batch_size: int = 16):
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[Tuple[Any, str, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._largest_batch = 0
+        self._queue_ms = 0.0
+        self._embed_ms = 0.0
+        self._worker = threading.Thread(
+            target=self._run, name="query-embedding-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def get_query_embedding(self, embed_model, query: str) -> List[float]:
+        """Embed a query as part of the next batch, blocking until it is done."""
+        future: Future = Future()
+        self._queue.put((embed_model, query, future, time.perf_counter()))
+        embedding, batch_size, queue_ms = future.result()
+
+        span = trace.get_current_span()
+        span.set_attribute("retrieval.embedding_batch_size", batch_size)
+        span.set_attribute("retrieval.embedding_queue_ms", queue_ms)
+        return embedding
+
+    def _collect(self) -> List[Tuple[Any, str, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+
+            # A rebuilt index brings a new embed model; batch per model
+            by_model: Dict[int, List[Tuple[Any, str, Future, float]]] = {}
+            for item in batch:
+                by_model.setdefault(id(item[0]), []).append(item)
+
+            for items in by_model.values():
+                size = forward_pass_size(items[0][0])
+                for start in range(0, len(items), size):
+                    self._embed(items[start : start + size], started)
+
+    def _embed(self, items: List[Tuple[Any, str, Future, float]], started: float):
+        """Embed one forward pass worth of queries and resolve their futures."""
+        pass_started = time.perf_counter()
+        try:
+            embeddings = embed_queries(items[0][0], [q for _, q, _, _ in items])
+        except Exception as e:
+            for _, _, future, _ in items:
+                future.set_exception(e)
+            return
+        embed_ms = (time.perf_counter() - pass_started) * 1000
+
+        with self._lock:
+            self._batches += 1
+            self._queries += len(items)
+            self._largest_batch = max(self._largest_batch, len(items))
+            self._queue_ms += sum((started - item[3]) * 1000 for item in items)
+            self._embed_ms += embed_ms
+
+        for (_, _, future, enqueued), embedding in zip(items, embeddings):
+            future.set_result((embedding, len(items), (started - enqueued) * 1000))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batching metrics for tuning the window and batch size."""
+        with self._lock:
+            batches, queries = self._batches, self._queries
+            return {
+                "window_ms": self.window_ms,
+                "max_batch_size": self.max_batch_size,
+                "batches": batches,
+                "queries": queries,
+                "mean_batch_size": queries / batches if batches else 0.0,
+                "largest_batch": self._largest_batch,
+                "mean_queue_ms": self._queue_ms / queries if queries else 0.0,
+                "mean_embed_ms": self._embed_ms / batches if batches else 0.0,
+            }
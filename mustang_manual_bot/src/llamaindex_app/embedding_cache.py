@@ -0,0 +1,95 @@
+from typing import Any, Dict, List, Optional, Sequence
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalize chunk text so whitespace-only differences share an embedding."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    SQLite cache of chunk embeddings keyed by model name and text hash.
+
+    Embeddings are stored as float32 blobs, so rebuilding an index from
+    unchanged PDFs only runs the embedding model for new chunk text.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, embedding BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _make_key(model_name: str, text: str) -> str:
+        key_string = "\0".join([model_name, normalize_text(text)])
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def get_many(
+        self, model_name: str, texts: Sequence[str]
+    ) -> List[Optional[List[float]]]:
+        """Return the cached embedding of each text, or None where missing."""
+        keys = [self._make_key(model_name, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start : start + _LOOKUP_BATCH]
+                rows = self._db.execute(
+                    "SELECT key, embedding FROM embeddings WHERE key IN "
+                    f"({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            embeddings = [found.get(key) for key in keys]
+            hits = sum(embedding is not None for embedding in embeddings)
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return embeddings
+
+    def set_many(
+        self, model_name: str, texts: Sequence[str], embeddings: Sequence[List[float]]
+    ):
+        """Cache the embeddings of several texts."""
+        rows = [
+            (
+                self._make_key(model_name, text),
+                model_name,
+                np.asarray(embedding, dtype=np.float32).tobytes(),
+            )
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            return {
+                "path": self._path,
+                "entries": entries,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
@@ -1,11 +1,20 @@
 """
 Flexible OpenTelemetry instrumentation that allows runtime configuration
 without relying on global state.
+
+Instrumentors are installed once on a routing TracerProvider. Each Arize
+tenant (space_id, api_key, model_id) gets its own long-lived exporter, and
+spans are routed to the tenant that was active in the context when they
+started, so concurrent requests for different tenants never reconfigure
+anything.
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Set, Tuple
+from collections import OrderedDict
+from opentelemetry import context as otel_context
+from opentelemetry import trace
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.trace import Tracer
@@ -13,11 +22,22 @@ from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
 from openinference.instrumentation.openai import OpenAIInstrumentor
 import logging
 import os
+import threading
 from dataclasses import dataclass
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+TenantKey = Tuple[str, str, str]
+
+# Context key holding the tenant that spans started in this context belong to
+_TENANT_CONTEXT_KEY = otel_context.create_key("arize_tenant")
+# Context key holding that tenant's configuration, to recreate its pipeline
+_TENANT_CONFIG_CONTEXT_KEY = otel_context.create_key("arize_tenant_config")
+
+# Marker for contexts whose spans should not be exported anywhere
+_LOCAL_ONLY = ("", "", "local_only")
+
 
 @dataclass
 class TracerConfig:
@@ -61,6 +81,101 @@ class TracerConfig:
         """Check if configuration has valid credentials"""
         return bool(self.space_id and self.api_key)
 
+    def tenant_key(self) -> TenantKey:
+        """Key identifying the tenant this configuration exports to"""
+        if not self.is_valid():
+            return _LOCAL_ONLY
+        return (self.space_id, self.api_key, self.model_id or "default_model")
+
+
+@dataclass
+class _TenantPipeline:
+    """Long-lived export pipeline for a single tenant"""
+
+    resource: Resource
+    tracer_provider: TracerProvider
+    span_processor: BatchSpanProcessor
+
+
+class RoutingSpanProcessor(SpanProcessor):
+    """
+    Span processor that forwards every span to the export pipeline of the
+    tenant that was active when the span started.
+
+    The tenant is read from the span's parent context. Spans started in a
+    context without a tenant inherit the tenant of their parent span, and
+    fall back to the default tenant otherwise. A tenant evicted after its
+    context was built is registered again when one of its spans starts.
+    """
+
+    def __init__(self, manager: "FlexibleInstrumentation"):
+        self._manager = manager
+        self._span_tenants: Dict[int, Tuple[TenantKey, Optional[TracerConfig]]] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None) -> None:
+        tenant_key = otel_context.get_value(_TENANT_CONTEXT_KEY, parent_context)
+        config = otel_context.get_value(_TENANT_CONFIG_CONTEXT_KEY, parent_context)
+        if tenant_key is None:
+            parent_span_id = (
+                trace.get_current_span(parent_context).get_span_context().span_id
+            )
+            with self._lock:
+                tenant_key, config = self._span_tenants.get(
+                    parent_span_id, (None, None)
+                )
+        if tenant_key is None:
+            tenant_key, config = self._manager._default_tenant, None
+
+        # Recorded first, so the tenant counts as active and is not evicted
+        # again between the check below and the end of the span
+        with self._lock:
+            self._span_tenants[span.get_span_context().span_id] = (tenant_key, config)
+        self._manager._ensure_pipeline(tenant_key, config)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        with self._lock:
+            tenant_key, _ = self._span_tenants.pop(span.context.span_id, (None, None))
+
+        pipeline = self._manager._get_pipeline(tenant_key)
+        if pipeline is None:
+            if tenant_key != _LOCAL_ONLY:
+                logger.warning(
+                    f"Dropping span {span.name!r}: no export pipeline for its "
+                    "tracing tenant"
+                )
+            return
+
+        # Re-stamp the span with the tenant's resource (model_id) before export
+        pipeline.span_processor.on_end(
+            ReadableSpan(
+                name=span.name,
+                context=span.context,
+                parent=span.parent,
+                resource=pipeline.resource,
+                attributes=span.attributes,
+                events=span.events,
+                links=span.links,
+                kind=span.kind,
+                status=span.status,
+                start_time=span.start_time,
+                end_time=span.end_time,
+                instrumentation_scope=span.instrumentation_scope,
+            )
+        )
+
+    def active_tenants(self) -> Set[TenantKey]:
+        """Tenants with spans that have started but not yet ended"""
+        with self._lock:
+            return {tenant_key for tenant_key, _ in self._span_tenants.values()}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._span_tenants.clear()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._manager.force_flush(timeout_millis)
+
 
 class FlexibleInstrumentation:
     """
@@ -68,41 +183,29 @@ class FlexibleInstrumentation:
     without relying on global state.
     """
 
-    def __init__(self):
+    def __init__(self, max_tenants: int = 64):
         self._tracer_provider: Optional[TracerProvider] = None
-        self._span_processors: List[BatchSpanProcessor] = []
+        self._router: Optional[RoutingSpanProcessor] = None
         self._llama_index_instrumentor: Optional[LlamaIndexInstrumentor] = None
         self._openai_instrumentor: Optional[OpenAIInstrumentor] = None
+        self._tenants: "OrderedDict[TenantKey, _TenantPipeline]" = OrderedDict()
+        self._default_tenant: TenantKey = _LOCAL_ONLY
+        self._max_tenants = max(1, max_tenants)
+        self._lock = threading.RLock()
         self._is_configured = False
-        self._env_var_key: Optional[str] = None  # Track environment variable we set
 
-    def configure(self, config: TracerConfig) -> TracerProvider:
-        """
-        Configure or reconfigure the instrumentation with new settings.
+    def _ensure_instrumented(self):
+        """Install the routing provider and instrumentors once"""
+        with self._lock:
+            if self._tracer_provider is not None:
+                return
 
-        Args:
-            config: TracerConfig object with configuration settings
-
-        Returns:
-            The configured TracerProvider
-        """
-        # Shutdown existing configuration if any
-        if self._is_configured:
-            self.shutdown()
-
-        # Check if we have valid credentials
-        if not config.is_valid():
-            logger.warning(
-                "Invalid or missing Arize credentials. Setting up local-only instrumentation."
-            )
-            # Create a basic tracer provider without remote export
             self._tracer_provider = TracerProvider(
-                resource=Resource(
-                    attributes={"model_id": config.model_id or "default_model"}
-                )
+                resource=Resource(attributes={"model_id": "default_model"})
             )
+            self._router = RoutingSpanProcessor(self)
+            self._tracer_provider.add_span_processor(self._router)
 
-            # Set up instrumentors with the local tracer provider
             self._llama_index_instrumentor = LlamaIndexInstrumentor()
             self._llama_index_instrumentor.instrument(
                 tracer_provider=self._tracer_provider, propagate_context=True
@@ -110,30 +213,21 @@ class FlexibleInstrumentation:
 
             self._openai_instrumentor = OpenAIInstrumentor()
             self._openai_instrumentor.instrument(tracer_provider=self._tracer_provider)
+            logger.info("Instrumentors installed with routing tracer provider")
 
-            self._is_configured = True
-            logger.info("Local-only instrumentation configured successfully")
-            return self._tracer_provider
-
-        # We have valid credentials, set up remote export
-        # Set headers for authentication
+    def _create_pipeline(self, config: TracerConfig) -> _TenantPipeline:
+        """Create the exporter and provider for a tenant"""
         if config.use_env_headers:
-            # Use environment variable approach (like original implementation)
-            headers_str = f"space_id={config.space_id},api_key={config.api_key}"
-            os.environ["OTEL_EXPORTER_OTLP_TRACES_HEADERS"] = headers_str
-            logger.info("Set OTEL_EXPORTER_OTLP_TRACES_HEADERS environment variable")
-            # Store the env var key so we can clean it up later
-            self._env_var_key = "OTEL_EXPORTER_OTLP_TRACES_HEADERS"
-            # Don't pass headers directly when using env var
-            span_exporter = OTLPSpanExporter(endpoint=config.endpoint)
+            # Same header string the OTEL_EXPORTER_OTLP_TRACES_HEADERS variable
+            # would hold, passed per exporter instead of through the environment
+            headers = f"space_id={config.space_id},api_key={config.api_key}"
         else:
             # Pass headers directly as tuple of tuples for gRPC
             headers = (
                 ("space_id", config.space_id),
                 ("api_key", config.api_key),
             )
-            logger.info("Passing headers directly to exporter")
-            span_exporter = OTLPSpanExporter(endpoint=config.endpoint, headers=headers)
+        span_exporter = OTLPSpanExporter(endpoint=config.endpoint, headers=headers)
 
         # Create trace attributes
         trace_attributes = {
@@ -141,31 +235,139 @@ class FlexibleInstrumentation:
         }
         if config.additional_attributes:
             trace_attributes.update(config.additional_attributes)
+        resource = Resource(attributes=trace_attributes)
+
         span_processor = BatchSpanProcessor(span_exporter)
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(span_processor)
 
-        # Create tracer provider
-        self._tracer_provider = TracerProvider(
-            resource=Resource(attributes=trace_attributes)
+        return _TenantPipeline(
+            resource=resource,
+            tracer_provider=tracer_provider,
+            span_processor=span_processor,
         )
-        self._tracer_provider.add_span_processor(span_processor)
-        self._span_processors.append(span_processor)
 
-        # Initialize instrumentors with the specific tracer provider
-        self._llama_index_instrumentor = LlamaIndexInstrumentor()
-        self._llama_index_instrumentor.instrument(
-            tracer_provider=self._tracer_provider, propagate_context=True
-        )
+    def _get_pipeline(self, tenant_key: Optional[TenantKey]):
+        with self._lock:
+            return self._tenants.get(tenant_key)
+
+    def _ensure_pipeline(self, tenant_key: TenantKey, config: Optional[TracerConfig]):
+        """Register a tenant again if it was evicted after its context was built"""
+        if tenant_key == _LOCAL_ONLY or config is None:
+            return
+        with self._lock:
+            if tenant_key in self._tenants:
+                return
+        logger.info(f"Re-registering evicted tracing tenant: model_id={tenant_key[2]}")
+        self.register_tenant(config)
+
+    def register_tenant(self, config: TracerConfig) -> TenantKey:
+        """
+        Make sure an export pipeline exists for the configuration's tenant.
 
-        self._openai_instrumentor = OpenAIInstrumentor()
-        self._openai_instrumentor.instrument(tracer_provider=self._tracer_provider)
+        Args:
+            config: TracerConfig identifying the tenant
 
-        self._is_configured = True
-        logger.info("Remote instrumentation configured successfully")
-        logger.info(f"Endpoint: {config.endpoint}")
-        logger.info(f"Model ID: {config.model_id}")
-        logger.info(
-            f"Using {'environment variable' if config.use_env_headers else 'direct'} headers"
-        )
+        Returns:
+            The tenant key to activate with use_tenant()
+        """
+        tenant_key = config.tenant_key()
+        if tenant_key == _LOCAL_ONLY:
+            return tenant_key
+
+        evicted = []
+        with self._lock:
+            if tenant_key in self._tenants:
+                self._tenants.move_to_end(tenant_key)
+                return tenant_key
+
+            self._tenants[tenant_key] = self._create_pipeline(config)
+            logger.info(
+                f"Registered tracing tenant: model_id={config.model_id}, "
+                f"endpoint={config.endpoint}"
+            )
+
+            # Evict least recently used idle tenants. A tenant with spans in
+            # flight keeps its pipeline until a later registration finds it
+            # idle, so the limit can be exceeded briefly.
+            active = self._router.active_tenants() if self._router else set()
+            for key in list(self._tenants):
+                if len(self._tenants) <= self._max_tenants:
+                    break
+                if key in (self._default_tenant, tenant_key) or key in active:
+                    continue
+                evicted.append((key, self._tenants.pop(key)))
+
+        # Export outside the lock so other requests are not blocked on it
+        for key, pipeline in evicted:
+            pipeline.tracer_provider.force_flush()
+            pipeline.tracer_provider.shutdown()
+            logger.info(f"Evicted tracing tenant: model_id={key[2]}")
+
+        return tenant_key
+
+    @contextmanager
+    def use_tenant(self, config: TracerConfig):
+        """
+        Context manager that routes spans started inside it to the tenant
+        described by config. Safe to use concurrently for different tenants.
+
+        Args:
+            config: TracerConfig identifying the tenant
+        """
+        token = otel_context.attach(self.get_tenant_context(config))
+        try:
+            yield otel_context.get_value(_TENANT_CONTEXT_KEY)
+        finally:
+            otel_context.detach(token)
+
+    def get_tenant_context(
+        self, config: TracerConfig, parent: Optional[otel_context.Context] = None
+    ) -> otel_context.Context:
+        """
+        Build a context whose spans are routed to the tenant described by
+        config, without attaching it. Useful for code that cannot hold an
+        attached context across suspension points, such as streaming
+        generators.
+
+        Args:
+            config: TracerConfig identifying the tenant
+            parent: Context to extend, defaults to the current context
+        """
+        self._ensure_instrumented()
+        tenant_key = self.register_tenant(config)
+        context = otel_context.set_value(_TENANT_CONTEXT_KEY, tenant_key, parent)
+        return otel_context.set_value(_TENANT_CONFIG_CONTEXT_KEY, config, context)
+
+    def configure(self, config: TracerConfig) -> TracerProvider:
+        """
+        Configure the default tenant. Instrumentors are only installed on the
+        first call; later calls switch the default tenant without tearing
+        anything down.
+
+        Args:
+            config: TracerConfig object with configuration settings
+
+        Returns:
+            The routing TracerProvider
+        """
+        self._ensure_instrumented()
+
+        with self._lock:
+            self._default_tenant = self.register_tenant(config)
+            self._is_configured = True
+
+        if config.is_valid():
+            logger.info("Remote instrumentation configured successfully")
+            logger.info(f"Endpoint: {config.endpoint}")
+            logger.info(f"Model ID: {config.model_id}")
+            logger.info(
+                f"Using {'environment variable' if config.use_env_headers else 'direct'} headers"
+            )
+        else:
+            logger.warning(
+                "Invalid or missing Arize credentials. Setting up local-only instrumentation."
+            )
 
         return self._tracer_provider
 
@@ -187,20 +389,36 @@ class FlexibleInstrumentation:
     def reconfigure(self, config: TracerConfig) -> TracerProvider:
         """
         Reconfigure the instrumentation with new settings.
-        This will shutdown the existing configuration and create a new one.
+        This switches the default tenant; existing tenants keep exporting.
 
         Args:
             config: New TracerConfig object
 
         Returns:
-            The newly configured TracerProvider
+            The routing TracerProvider
         """
         logger.info("Reconfiguring instrumentation...")
         return self.configure(config)
 
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """Flush pending spans for every tenant"""
+        with self._lock:
+            pipelines = list(self._tenants.values())
+        return all(
+            pipeline.span_processor.force_flush(timeout_millis)
+            for pipeline in pipelines
+        )
+
+    def get_tenant_count(self) -> int:
+        """Number of tenants with a live export pipeline"""
+        with self._lock:
+            return len(self._tenants)
+
     def shutdown(self):
         """Shutdown the instrumentation and clean up resources"""
-        if self._is_configured:
+        with self._lock:
+            if self._tracer_provider is None:
+                return
             try:
                 # Uninstrument the instrumentors
                 if self._llama_index_instrumentor:
@@ -208,22 +426,18 @@ class FlexibleInstrumentation:
                 if self._openai_instrumentor:
                     self._openai_instrumentor.uninstrument()
 
-                # Shutdown span processors
-                for processor in self._span_processors:
-                    processor.shutdown()
-
-                # Clean up environment variable if we set one
-                if self._env_var_key and self._env_var_key in os.environ:
-                    del os.environ[self._env_var_key]
-                    logger.info(f"Cleaned up environment variable: {self._env_var_key}")
+                # Flush and shutdown every tenant pipeline
+                self._tracer_provider.shutdown()
+                for pipeline in self._tenants.values():
+                    pipeline.tracer_provider.shutdown()
 
                 # Clear references
                 self._tracer_provider = None
-                self._span_processors.clear()
+                self._tenants.clear()
+                self._default_tenant = _LOCAL_ONLY
                 self._llama_index_instrumentor = None
                 self._openai_instrumentor = None
                 self._is_configured = False
-                self._env_var_key = None
 
                 logger.info("Instrumentation shutdown complete")
             except Exception as e:
@@ -238,25 +452,14 @@ class FlexibleInstrumentation:
         """
         Context manager for temporary instrumentation configuration.
         Useful for testing or specific operations with different settings.
+        Spans started inside the block go to the temporary configuration;
+        the previous configuration is untouched.
 
         Args:
             config: Temporary TracerConfig to use
         """
-        # Save current state
-        was_configured = self._is_configured
-        old_provider = self._tracer_provider
-
-        try:
-            # Apply new configuration
-            self.configure(config)
+        with self.use_tenant(config):
             yield self._tracer_provider
-        finally:
-            # Restore previous state
-            self.shutdown()
-            if was_configured and old_provider:
-                # Note: We can't perfectly restore the old state, but we can
-                # indicate that reconfiguration is needed
-                logger.warning("Temporary configuration ended. Reconfiguration needed.")
 
 
 # Global instance (but not globally configured)
@@ -0,0 +1,31 @@
+from typing import Optional
+from src.llamaindex_app.ttl_cache import PersistentTTLCache, normalize_query
+
+
+class GuardVerdictCache(PersistentTTLCache):
+    """
+    Bounded LRU + TTL cache of guard verdicts keyed by normalized query.
+
+    Keys include the guard template version, so changing a guard template
+    or model invalidates every cached verdict. With a SQLite path, verdicts
+    also persist across restarts.
+    """
+
+    def __init__(
+        self,
+        template_version: str,
+        max_entries: int = 1024,
+        ttl_minutes: int = 60,
+        path: Optional[str] = None,
+    ):
+        super().__init__(
+            "guard_verdicts", template_version, max_entries, ttl_minutes, path
+        )
+
+    def get(self, guard_name: str, query: str) -> Optional[bool]:
+        """Return the cached verdict (True if the query passed), or None."""
+        return self._lookup(self._make_key(guard_name, normalize_query(query)))
+
+    def set(self, guard_name: str, query: str, passed: bool):
+        """Cache a guard verdict."""
+        self._store(self._make_key(guard_name, normalize_query(query)), passed)
@@ -1,34 +1,173 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import asyncio
+import contextvars
+import hashlib
+import json
 import logging
+import time
 from llama_index.core import (
-    SimpleDirectoryReader,
     VectorStoreIndex,
     StorageContext,
     load_index_from_storage,
     Settings as LlamaSettings,
 )
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import SimpleVectorStore
 from llama_index.llms.openai import OpenAI as LlamaOpenAI
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from phoenix.trace import suppress_tracing
 from tenacity import retry, stop_after_attempt, wait_exponential
+from src.llamaindex_app.ann_index import ANN_INDEX_FILE, IVFIndex, corpus_fingerprint
 from src.llamaindex_app.config import Settings
+from src.llamaindex_app.context_assembly import ContextAssembler
+from src.llamaindex_app.dedup import NearDuplicateFilter, model_year
+from src.llamaindex_app.docstore import (
+    DOCSTORE_FILE,
+    LEGACY_DOCSTORE_FILE,
+    SQLiteDocumentStore,
+)
+from src.llamaindex_app.embedding_batcher import QueryEmbeddingBatcher
+from src.llamaindex_app.embedding_cache import EmbeddingCache
+from src.llamaindex_app.ingestion import embed_nodes, iter_parsed_files
+from src.llamaindex_app.local_classifier import (
+    LocalQueryClassifier,
+    load_labeled_examples,
+)
+from src.llamaindex_app.lexical_index import BM25_INDEX_FILE, BM25Index
+from src.llamaindex_app.manifest import IngestionManifest, replace_file_nodes
+from src.llamaindex_app.metadata_index import METADATA_INDEX_FILE, MetadataIndex
+from src.llamaindex_app.quantization import (
+    QUANTIZATION_DTYPES,
+    QuantizedMatrix,
+    quantized_files,
+)
+from src.llamaindex_app.retrieval import (
+    EngineRetriever,
+    QueryEmbeddingCache,
+    VectorSearchEngine,
+    node_metadata,
+    node_texts,
+)
+from src.llamaindex_app.vector_store import (
+    LEGACY_VECTOR_STORE_FILE,
+    MmapVectorStore,
+    vector_store_files,
+)
 
 logger = logging.getLogger(__name__)
 
+# Settings that change which contexts a question gets, and so its answer
+_ANSWER_SETTINGS = (
+    "CHUNK_SIZE",
+    "CHUNK_OVERLAP",
+    "VECTOR_STORE_DTYPE",
+    "DEDUP_CHUNKS",
+    "DEDUP_THRESHOLD",
+    "ANN_INDEX",
+    "ANN_MIN_NODES",
+    "ANN_LISTS",
+    "ANN_PROBES",
+    "SEARCH_QUANTIZATION",
+    "SEARCH_RESCORE",
+    "HYBRID_SEARCH",
+    "HYBRID_CANDIDATES",
+    "HYBRID_RRF_K",
+    "METADATA_FILTERS",
+    "CONTEXT_TOKEN_BUDGET",
+    "CONTEXT_MIN_SCORE_RATIO",
+    "ADAPTIVE_TOP_K",
+    "TOP_K_MIN",
+    "TOP_K_MAX",
+    "TOP_K_SCORE_DROP",
+    "TOP_K_SCORE_GAP",
+)
+
+
+# Bounded pool for the CPU-bound query embedding + vector search step
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_retrieval_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Get the process-wide retrieval thread pool, creating it on first use."""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="retrieval"
+        )
+    return _retrieval_executor
+
+
+# Shared across index rebuilds, since query embeddings do not depend on the index
+_query_embedding_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache(max_entries: int) -> Optional[QueryEmbeddingCache]:
+    """Get the process-wide query embedding cache, or None if it is disabled."""
+    global _query_embedding_cache
+    if max_entries <= 0:
+        return None
+    if _query_embedding_cache is None:
+        _query_embedding_cache = QueryEmbeddingCache(max_entries)
+    return _query_embedding_cache
+
+
+_query_embedding_batcher: Optional[QueryEmbeddingBatcher] = None
+
+
+def get_query_embedding_batcher(
+    window_ms: float, max_batch_size: int
+) -> Optional[QueryEmbeddingBatcher]:
+    """Get the process-wide query embedding batcher, or None if it is disabled."""
+    global _query_embedding_batcher
+    if window_ms <= 0:
+        return None
+    if _query_embedding_batcher is None:
+        _query_embedding_batcher = QueryEmbeddingBatcher(window_ms, max_batch_size)
+    return _query_embedding_batcher
+
 
 class QueryEngine:
-    def __init__(self, retriever):
+    def __init__(
+        self,
+        retriever,
+        executor: Optional[ThreadPoolExecutor] = None,
+        index_version: Optional[str] = None,
+    ):
         self.retriever = retriever
+        self.executor = executor
+        # Identifies the indexed content and retrieval settings answers
+        # were generated from, for the response cache
+        self.index_version = index_version
 
     def retrieve(self, query: str):
         return self.retriever.retrieve(query)
 
+    def retrieve_batch(self, queries: List[str]):
+        """Retrieve for several queries, scored together when supported."""
+        if hasattr(self.retriever, "retrieve_batch"):
+            return self.retriever.retrieve_batch(queries)
+        return [self.retriever.retrieve(query) for query in queries]
+
+    async def aretrieve(self, query: str):
+        """Retrieve on the bounded retrieval pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry the tracing context into the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, ctx.run, self.retriever.retrieve, query
+        )
+
 
 class IndexManager:
     def __init__(self, openai_client=None, force_rebuild=False):
         self.settings = Settings()
         self.openai_client = openai_client
         self.force_rebuild = force_rebuild
+        self._local_classifier = None
+        self._context_assembler = None
+        self._embedding_cache = None
         with suppress_tracing():
             self._configure_llama_settings()
             self.storage_path = Path(self.settings.STORAGE_DIR)
@@ -69,9 +208,9 @@ class IndexManager:
         ).parent.parent.parent  # Go up from src/llamaindex_app to the project root
         return project_root / "data"
 
-    def _get_pdf_files(self):
-        """Get the list of PDF files to index."""
-        filenames = [
+    def _get_pdf_filenames(self) -> List[str]:
+        """Get the names of the PDF files to index."""
+        return [
             "2016-Mustang-Owners-Manual-version-2_om_EN-US_11_2015.pdf",
             "2017-Ford-Mustang-Owners-Manual-version-2_om_EN-US_EN-CA_12_2016.pdf",
             "2018-Ford-Mustang-Owners-Manual-version-3_om_EN-US_03_2018.pdf",
@@ -84,8 +223,10 @@ class IndexManager:
             "2025_MustangS650_OM_ENG_version1.pdf",
         ]
 
+    def _get_pdf_files(self):
+        """Get the list of PDF files to index."""
         pdf_files = []
-        for filename in filenames:
+        for filename in self._get_pdf_filenames():
             file_path = self.data_path / filename
             if file_path.exists():
                 pdf_files.append(str(file_path))
@@ -94,6 +235,52 @@ class IndexManager:
 
         return pdf_files
 
+    def _index_files(self):
+        """
+        Files of a persisted index. Stores persisted in the legacy JSON
+        formats are converted on load.
+        """
+        persist_dir = str(self.storage_path)
+        vector_files = (
+            vector_store_files()
+            if MmapVectorStore.exists(persist_dir)
+            else [LEGACY_VECTOR_STORE_FILE]
+        )
+        docstore_file = (
+            DOCSTORE_FILE
+            if SQLiteDocumentStore.exists(persist_dir)
+            else LEGACY_DOCSTORE_FILE
+        )
+        return [*vector_files, "index_store.json", docstore_file]
+
+    def _load_vector_store(self) -> MmapVectorStore:
+        """Memory-map the binary vector store, converting a legacy JSON one."""
+        persist_dir = str(self.storage_path)
+        if MmapVectorStore.exists(persist_dir):
+            return MmapVectorStore.from_persist_dir(persist_dir)
+
+        logger.info(f"Converting {LEGACY_VECTOR_STORE_FILE} to the binary format")
+        vector_store = MmapVectorStore.from_simple_vector_store(
+            SimpleVectorStore.from_persist_path(
+                str(self.storage_path / LEGACY_VECTOR_STORE_FILE)
+            ),
+            dtype=self.settings.VECTOR_STORE_DTYPE,
+        )
+        vector_store.persist(str(self.storage_path / LEGACY_VECTOR_STORE_FILE))
+        return MmapVectorStore.from_persist_dir(persist_dir)
+
+    def _load_docstore(self) -> SQLiteDocumentStore:
+        """Open the SQLite docstore, converting a legacy docstore.json."""
+        persist_dir = str(self.storage_path)
+        if SQLiteDocumentStore.exists(persist_dir):
+            return SQLiteDocumentStore.from_persist_dir(persist_dir)
+
+        logger.info(f"Converting {LEGACY_DOCSTORE_FILE} to SQLite")
+        return SQLiteDocumentStore.from_docstore_json(
+            str(self.storage_path / LEGACY_DOCSTORE_FILE),
+            str(self.storage_path / DOCSTORE_FILE),
+        )
+
     def _index_exists_and_valid(self):
         """Check if a valid index exists in storage."""
         if not self.storage_path.exists():
@@ -101,11 +288,7 @@ class IndexManager:
             return False
 
         # Check for required index files
-        required_files = [
-            "default__vector_store.json",
-            "index_store.json",
-            "docstore.json",
-        ]
+        required_files = self._index_files()
         for file_name in required_files:
             file_path = self.storage_path / file_name
             if not file_path.exists():
@@ -128,14 +311,14 @@ class IndexManager:
             logger.info("Index does not exist or is invalid, rebuild required")
             return True
 
+        if IngestionManifest.exists(str(self.storage_path)):
+            # Changed files are re-indexed incrementally after loading
+            return False
+
         # Check if any source files are newer than the index
         try:
             # Get the oldest modification time of index files
-            index_files = [
-                "default__vector_store.json",
-                "index_store.json",
-                "docstore.json",
-            ]
+            index_files = self._index_files()
             oldest_index_time = None
 
             for file_name in index_files:
@@ -181,11 +364,13 @@ class IndexManager:
             try:
                 logger.info("Loading existing index from storage...")
                 storage_context = StorageContext.from_defaults(
-                    persist_dir=str(self.storage_path)
+                    persist_dir=str(self.storage_path),
+                    vector_store=self._load_vector_store(),
+                    docstore=self._load_docstore(),
                 )
                 index = load_index_from_storage(storage_context)
                 logger.info("Successfully loaded existing index")
-                return index
+                return self._update_index(index)
             except Exception as e:
                 logger.warning(f"Failed to load existing index: {e}")
                 logger.info("Will create new index instead")
@@ -214,14 +399,34 @@ class IndexManager:
             for pdf_file in pdf_files:
                 logger.info(f"  - {Path(pdf_file).name}")
 
-            # Load documents
-            documents = SimpleDirectoryReader(input_files=pdf_files).load_data()
+            nodes_by_file = self._parse_files(pdf_files)
+
+            logger.info("Creating index...")
+            # Build the docstore in a new file that persist() swaps into
+            # place, so a running index keeps reading the old one meanwhile
+            building_path = self.storage_path / f"{DOCSTORE_FILE}.building"
+            building_path.unlink(missing_ok=True)
+            storage_context = StorageContext.from_defaults(
+                vector_store=MmapVectorStore(dtype=self.settings.VECTOR_STORE_DTYPE),
+                docstore=SQLiteDocumentStore(str(building_path)),
+            )
+            index = VectorStoreIndex(
+                [node for nodes in nodes_by_file.values() for node in nodes],
+                storage_context=storage_context,
+            )
 
-            logger.info(f"Loaded {len(documents)} documents, creating index...")
-            index = VectorStoreIndex.from_documents(documents, settings=LlamaSettings)
+            manifest = IngestionManifest()
+            for pdf_file, nodes in nodes_by_file.items():
+                manifest.record(pdf_file, [node.node_id for node in nodes])
 
             logger.info("Persisting index to storage...")
             index.storage_context.persist(persist_dir=str(self.storage_path))
+            manifest.save(str(self.storage_path))
+            self._remove_derived_indexes()
+            if self.settings.HYBRID_SEARCH:
+                self._load_lexical_index(index)
+            if self.settings.METADATA_FILTERS:
+                self._load_metadata_index(index)
 
             logger.info("Index created and persisted successfully")
             return index
@@ -230,9 +435,276 @@ class IndexManager:
             logger.error(f"Error creating index: {str(e)}")
             raise
 
+    def _remove_derived_indexes(self):
+        """
+        Delete the ANN, quantized, BM25 and metadata indexes so they are
+        rebuilt from the new corpus. Their fingerprints follow the node ids,
+        which a full rebuild can keep while relabeling a deduplicated
+        chunk's model years.
+        """
+        derived_files = [ANN_INDEX_FILE, BM25_INDEX_FILE, METADATA_INDEX_FILE]
+        for dtype in QUANTIZATION_DTYPES:
+            derived_files.extend(quantized_files(dtype))
+        for file_name in derived_files:
+            (self.storage_path / file_name).unlink(missing_ok=True)
+
+    def _parse_files(self, pdf_files: List[str]) -> Dict[str, List[BaseNode]]:
+        """
+        Parse and chunk PDF files on the ingestion process pool, embedding
+        each file's nodes as soon as it is parsed. Nodes are grouped by file
+        in input order.
+        """
+        cache = self.get_embedding_cache()
+        dedup = (
+            NearDuplicateFilter(self.settings.DEDUP_THRESHOLD)
+            if self.settings.DEDUP_CHUNKS
+            else None
+        )
+        nodes_by_file: Dict[str, List[BaseNode]] = {}
+        for pdf_file, nodes in iter_parsed_files(
+            pdf_files,
+            chunk_size=self.settings.CHUNK_SIZE,
+            chunk_overlap=self.settings.CHUNK_OVERLAP,
+            max_workers=self.settings.INGEST_WORKERS,
+        ):
+            if dedup:
+                # Before embedding, so duplicates are never embedded
+                nodes = dedup.add(nodes, model_year(pdf_file))
+            nodes_by_file[pdf_file] = embed_nodes(
+                nodes, LlamaSettings.embed_model, cache
+            )
+        if dedup:
+            logger.info(f"Chunk deduplication: {dedup.get_stats()}")
+        if cache:
+            logger.info(f"Embedding cache: {cache.get_stats()}")
+        return nodes_by_file
+
+    def get_embedding_cache(self) -> Optional[EmbeddingCache]:
+        """Get the chunk embedding cache, or None if it is disabled."""
+        path = self.settings.EMBEDDING_CACHE_PATH
+        if path == "":
+            return None
+        if self._embedding_cache is None:
+            if path is None:
+                self.storage_path.mkdir(parents=True, exist_ok=True)
+                path = str(self.storage_path / "embedding_cache.sqlite")
+            self._embedding_cache = EmbeddingCache(path)
+        return self._embedding_cache
+
+    def _bootstrap_manifest(self, index) -> IngestionManifest:
+        """Build the manifest of an up-to-date index persisted without one."""
+        node_ids: Dict[str, List[str]] = {}
+        for ref_doc_info in index.docstore.get_all_ref_doc_info().values():
+            file_name = ref_doc_info.metadata.get("file_name")
+            if file_name:
+                node_ids.setdefault(file_name, []).extend(ref_doc_info.node_ids)
+
+        manifest = IngestionManifest()
+        for file_name, ids in node_ids.items():
+            manifest.record(str(self.data_path / file_name), ids)
+        logger.info(f"Created ingestion manifest for {len(node_ids)} indexed files")
+        return manifest
+
+    def _update_index(self, index):
+        """
+        Re-index only the source files that changed since the manifest was
+        written: delete the nodes of changed and removed files, then parse,
+        embed and insert the changed files and persist.
+
+        Deduplicated nodes are shared between files, so with DEDUP_CHUNKS
+        any change rebuilds the index instead (unchanged chunks still come
+        from the embedding cache).
+        """
+        storage_dir = str(self.storage_path)
+        if not IngestionManifest.exists(storage_dir):
+            self._bootstrap_manifest(index).save(storage_dir)
+            return index
+
+        start = time.perf_counter()
+        manifest = IngestionManifest.load(storage_dir)
+        changed, removed = manifest.diff(self._get_pdf_files())
+        # Keep the nodes of listed files that are only missing on disk
+        removed = [name for name in removed if name not in self._get_pdf_filenames()]
+        if not changed and not removed:
+            manifest.save(storage_dir)
+            logger.info("Index is up to date, no re-indexing required")
+            return index
+
+        if self.settings.DEDUP_CHUNKS:
+            logger.info("Source files changed, rebuilding the deduplicated index")
+            return self._create_new_index()
+
+        logger.info(
+            f"Re-indexing {len(changed)} changed and removing {len(removed)} "
+            "deleted files"
+        )
+        nodes_by_file = self._parse_files(changed) if changed else {}
+        replace_file_nodes(index, manifest, nodes_by_file, removed)
+
+        index.storage_context.persist(persist_dir=storage_dir)
+        manifest.save(storage_dir)
+        if self.settings.HYBRID_SEARCH:
+            self._load_lexical_index(index)
+        if self.settings.METADATA_FILTERS:
+            self._load_metadata_index(index)
+        logger.info(
+            f"Incremental re-index finished in {time.perf_counter() - start:.1f}s"
+        )
+        return index
+
+    def _load_lexical_index(
+        self, index, node_ids: Optional[List[str]] = None
+    ) -> BM25Index:
+        """Load the persisted BM25 index, rebuilding it if the corpus changed."""
+        if node_ids is None:
+            node_ids = VectorSearchEngine.from_vector_store(index.vector_store).node_ids
+        return BM25Index.load_or_build(
+            str(self.storage_path),
+            node_ids,
+            lambda ids: node_texts(index, ids),
+        )
+
+    def _load_metadata_index(
+        self, index, node_ids: Optional[List[str]] = None
+    ) -> MetadataIndex:
+        """Load the persisted metadata index, rebuilding it if the corpus changed."""
+        if node_ids is None:
+            node_ids = VectorSearchEngine.from_vector_store(index.vector_store).node_ids
+        return MetadataIndex.load_or_build(
+            str(self.storage_path),
+            node_ids,
+            lambda ids: node_metadata(index, ids),
+        )
+
+    def _build_search_engine(self) -> VectorSearchEngine:
+        """Build the search engine with the configured ANN index and quantization."""
+        engine = VectorSearchEngine.from_vector_store(self.index.vector_store)
+        if self.settings.ANN_INDEX and len(engine) >= self.settings.ANN_MIN_NODES:
+            engine.ann = IVFIndex.load_or_build(
+                str(self.storage_path),
+                engine.matrix,
+                engine.node_ids,
+                n_lists=self.settings.ANN_LISTS or None,
+            )
+            engine.n_probe = self.settings.ANN_PROBES
+            logger.info(
+                f"Using IVF search with {engine.ann.n_lists} lists, "
+                f"{engine.n_probe} probes"
+            )
+        if self.settings.SEARCH_QUANTIZATION and len(engine):
+            engine.quantized = QuantizedMatrix.load_or_build(
+                str(self.storage_path),
+                engine.matrix,
+                engine.node_ids,
+                self.settings.SEARCH_QUANTIZATION,
+            )
+            engine.rescore = self.settings.SEARCH_RESCORE
+            logger.info(
+                f"Scanning {engine.quantized.dtype} vectors "
+                f"({engine.quantized.nbytes / 2**20:.1f} MiB), "
+                f"rescoring top_k * {engine.rescore}"
+            )
+        return engine
+
+    def get_index_version(self) -> str:
+        """
+        Hash of the indexed files, the indexed nodes and the settings that
+        shape retrieval, so answers cached for one index are not served
+        from another.
+        """
+        storage_dir = str(self.storage_path)
+        files = (
+            IngestionManifest.load(storage_dir).files
+            if IngestionManifest.exists(storage_dir)
+            else {}
+        )
+        version = {
+            "files": {name: entry["hash"] for name, entry in files.items()},
+            "nodes": corpus_fingerprint(sorted(self.index.index_struct.nodes_dict)),
+            "settings": {
+                name: getattr(self.settings, name) for name in _ANSWER_SETTINGS
+            },
+        }
+        return hashlib.sha256(json.dumps(version, sort_keys=True).encode()).hexdigest()[
+            :16
+        ]
+
     def get_query_engine(self):
-        retriever = self.index.as_retriever(similarity_top_k=3)
-        return QueryEngine(retriever=retriever)
+        engine = self._build_search_engine()
+        lexical = None
+        if self.settings.HYBRID_SEARCH:
+            lexical = self._load_lexical_index(self.index, engine.node_ids)
+        metadata_index = None
+        if self.settings.METADATA_FILTERS:
+            metadata_index = self._load_metadata_index(self.index, engine.node_ids)
+        retriever = EngineRetriever(
+            self.index,
+            similarity_top_k=3,
+            engine=engine,
+            embedding_cache=get_query_embedding_cache(
+                self.settings.QUERY_EMBEDDING_CACHE_SIZE
+            ),
+            embedding_batcher=get_query_embedding_batcher(
+                self.settings.EMBEDDING_BATCH_WINDOW_MS,
+                self.settings.EMBEDDING_BATCH_SIZE,
+            ),
+            lexical=lexical,
+            hybrid_candidates=self.settings.HYBRID_CANDIDATES,
+            rrf_k=self.settings.HYBRID_RRF_K,
+            metadata_index=metadata_index,
+            min_top_k=self.settings.TOP_K_MIN,
+            max_top_k=self.settings.TOP_K_MAX if self.settings.ADAPTIVE_TOP_K else None,
+            max_score_drop=self.settings.TOP_K_SCORE_DROP,
+            max_score_gap=self.settings.TOP_K_SCORE_GAP,
+        )
+        executor = get_retrieval_executor(self.settings.RETRIEVAL_WORKERS)
+        return QueryEngine(
+            retriever=retriever,
+            executor=executor,
+            index_version=self.get_index_version(),
+        )
+
+    def get_local_classifier(self) -> Optional[LocalQueryClassifier]:
+        """Get the local embedding classifier, or None if it is disabled."""
+        if not self.settings.LOCAL_CLASSIFIER:
+            return None
+        if self._local_classifier is None:
+            examples = load_labeled_examples(
+                self.settings.LOCAL_CLASSIFIER_EXAMPLES_PATH
+            )
+            with suppress_tracing():
+                # Reuses the BGE model already loaded for retrieval
+                self._local_classifier = LocalQueryClassifier(
+                    LlamaSettings.embed_model, examples
+                )
+        return self._local_classifier
+
+    def get_context_assembler(self) -> Optional[ContextAssembler]:
+        """Get the token-budgeted context assembler, or None if it is disabled."""
+        if self.settings.CONTEXT_TOKEN_BUDGET <= 0:
+            return None
+        if self._context_assembler is None:
+            # Reuses the BGE model, the chunk embedding cache for sentences
+            # and the query embedding LRU the retriever just filled
+            self._context_assembler = ContextAssembler(
+                LlamaSettings.embed_model,
+                self.settings.CONTEXT_TOKEN_BUDGET,
+                # Hybrid scores are reciprocal ranks, where a ratio to the
+                # best score says nothing about relevance
+                min_score_ratio=(
+                    0.0
+                    if self.settings.HYBRID_SEARCH
+                    else self.settings.CONTEXT_MIN_SCORE_RATIO
+                ),
+                max_contexts=(
+                    self.settings.TOP_K_MAX if self.settings.ADAPTIVE_TOP_K else 3
+                ),
+                embedding_cache=self.get_embedding_cache(),
+                query_cache=get_query_embedding_cache(
+                    self.settings.QUERY_EMBEDDING_CACHE_SIZE
+                ),
+            )
+        return self._context_assembler
 
     def rebuild_index(self):
         """Force rebuild the index."""
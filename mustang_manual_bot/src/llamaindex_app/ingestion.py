@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import multiprocessing
+import uuid
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode, Document, MetadataMode, NodeRelationship
+from src.llamaindex_app.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+def _node_id(i: int, doc: Document) -> str:
+    # Stable across runs, unlike the splitter's default uuid4
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc.doc_id}:{i}"))
+
+
+def _content_addressed(nodes: List[BaseNode]) -> List[BaseNode]:
+    """
+    Fold a hash of each node's embedded content into its id. Ids stay
+    stable across runs, but a revised chunk gets a new id even when its
+    file splits into the same number of chunks, so the corpus fingerprint
+    of the ANN, quantized, BM25 and metadata indexes changes with it.
+    """
+    ids: Dict[str, str] = {}
+    for node in nodes:
+        digest = hashlib.sha256(
+            node.get_content(metadata_mode=MetadataMode.EMBED).encode("utf-8")
+        ).hexdigest()
+        ids[node.node_id] = str(
+            uuid.uuid5(uuid.NAMESPACE_URL, f"{node.node_id}:{digest}")
+        )
+
+    for node in nodes:
+        node.id_ = ids[node.node_id]
+        for relationship in (NodeRelationship.PREVIOUS, NodeRelationship.NEXT):
+            related = node.relationships.get(relationship)
+            if related is not None and related.node_id in ids:
+                related.node_id = ids[related.node_id]
+    return nodes
+
+
+def parse_file(file_path: str, chunk_size: int, chunk_overlap: int) -> List[BaseNode]:
+    """Load one file and split it into nodes with content-addressed ids."""
+    documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
+    file_name = Path(file_path).name
+    for i, document in enumerate(documents):
+        document.id_ = f"{file_name}_part_{i}"
+
+    splitter = SentenceSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, id_func=_node_id
+    )
+    return _content_addressed(splitter.get_nodes_from_documents(documents))
+
+
+def iter_parsed_files(
+    file_paths: Sequence[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    max_workers: int = 4,
+) -> Iterator[Tuple[str, List[BaseNode]]]:
+    """
+    Parse and chunk files across a process pool.
+
+    Yields (file_path, nodes) in input order as soon as each file and every
+    file before it are done, so the caller can embed early files while later
+    ones are still parsing and the merged node order is reproducible.
+    """
+    workers = min(max_workers, len(file_paths))
+    if workers <= 1:
+        for file_path in file_paths:
+            yield file_path, parse_file(file_path, chunk_size, chunk_overlap)
+        return
+
+    # Spawned workers do not inherit the embedding model's threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(parse_file, file_path, chunk_size, chunk_overlap)
+            for file_path in file_paths
+        ]
+        for file_path, future in zip(file_paths, futures):
+            nodes = future.result()
+            logger.info(f"Parsed {Path(file_path).name} into {len(nodes)} nodes")
+            yield file_path, nodes
+
+
+def embed_nodes(
+    nodes: List[BaseNode], embed_model, cache: Optional[EmbeddingCache] = None
+) -> List[BaseNode]:
+    """
+    Embed nodes in place with the same text the index would embed, reusing
+    cached embeddings and only running the model for the rest.
+    """
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    embeddings = (
+        cache.get_many(embed_model.model_name, texts) if cache else [None] * len(texts)
+    )
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        computed = embed_model.get_text_embedding_batch(missing_texts)
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+        if cache:
+            cache.set_many(embed_model.model_name, missing_texts, computed)
+
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    return nodes
@@ -0,0 +1,196 @@
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import os
+import re
+import numpy as np
+from src.llamaindex_app.ann_index import corpus_fingerprint
+from src.llamaindex_app.vector_store import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_FILE = "default__vector_store.bm25.npz"
+
+# Keeps numbers and identifiers whole: "1915.12", "fr-500", "10-k", "2024"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it of on or that the this "
+    "to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and number tokens, without stopwords or stemming."""
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in _STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a precomputed inverted index.
+
+    Postings are stored CSR-style: the documents of term ``t`` are
+    ``doc_rows[indptr[t]:indptr[t + 1]]`` with their full BM25 term weights
+    (idf and length normalization included) in ``weights``. Scoring a query
+    is then one ``bincount`` over the postings of its terms.
+
+    Document rows follow the vector store's node order, so lexical and
+    vector hits can be fused by node id.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        indptr: np.ndarray,
+        doc_rows: np.ndarray,
+        weights: np.ndarray,
+        node_ids: Sequence[str],
+        fingerprint: str = "",
+    ):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_rows = doc_rows
+        self.weights = weights
+        self.node_ids = list(node_ids)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(
+        cls,
+        texts: Iterable[str],
+        node_ids: Sequence[str],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        rows, term_ids, lengths = [], [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokens]
+            rows.append(np.full(len(ids), row, dtype=np.int64))
+            term_ids.append(np.array(ids, dtype=np.int64))
+            lengths.append(len(tokens))
+        if len(lengths) != len(node_ids):
+            raise ValueError("Texts and node ids have different lengths")
+        num_docs = len(lengths)
+
+        # Count (term, row) pairs; sorting by term then row lays the counts
+        # out as postings lists
+        num_rows = max(num_docs, 1)
+        pairs, tf = np.unique(
+            np.concatenate(term_ids or [np.zeros(0, dtype=np.int64)]) * num_rows
+            + np.concatenate(rows or [np.zeros(0, dtype=np.int64)]),
+            return_counts=True,
+        )
+        pair_terms, doc_rows = np.divmod(pairs, num_rows)
+        df = np.bincount(pair_terms, minlength=len(vocabulary))
+        indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        lengths = np.array(lengths, dtype=np.float32)
+        average_length = max(float(lengths.mean()) if num_docs else 0.0, 1e-9)
+        idf = np.log(1 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        tf = tf.astype(np.float32)
+        norm = k1 * (1 - b + b * lengths[doc_rows] / average_length)
+        weights = idf[pair_terms] * tf * (k1 + 1) / (tf + norm)
+
+        logger.info(f"Built BM25 index: {num_docs} nodes, {len(vocabulary)} terms")
+        return cls(
+            vocabulary,
+            indptr,
+            doc_rows.astype(np.int32),
+            weights.astype(np.float32),
+            node_ids,
+            corpus_fingerprint(node_ids),
+        )
+
+    def save(self, persist_dir: str):
+        path = Path(persist_dir) / BM25_INDEX_FILE
+        tmp_path = f"{path}.tmp.npz"
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(
+            tmp_path,
+            terms=np.array(terms, dtype=str),
+            indptr=self.indptr,
+            doc_rows=self.doc_rows,
+            weights=self.weights,
+            node_ids=np.array(self.node_ids, dtype=str),
+            fingerprint=np.array(self.fingerprint),
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved BM25 index to {path}")
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "BM25Index":
+        with np.load(Path(persist_dir) / BM25_INDEX_FILE) as data:
+            return cls(
+                {str(term): i for i, term in enumerate(data["terms"])},
+                data["indptr"],
+                data["doc_rows"],
+                data["weights"],
+                [str(node_id) for node_id in data["node_ids"]],
+                str(data["fingerprint"]),
+            )
+
+    @classmethod
+    def load_or_build(
+        cls,
+        persist_dir: str,
+        node_ids: Sequence[str],
+        load_texts: Callable[[Sequence[str]], Iterable[str]],
+    ) -> "BM25Index":
+        """
+        Load the persisted index if it matches the corpus, else rebuild it
+        from ``load_texts(node_ids)`` and persist it.
+        """
+        fingerprint = corpus_fingerprint(node_ids)
+        if (Path(persist_dir) / BM25_INDEX_FILE).exists():
+            index = cls.load(persist_dir)
+            if index.fingerprint == fingerprint:
+                logger.info(f"Loaded BM25 index with {len(index.vocabulary)} terms")
+                return index
+            logger.info("BM25 index is stale, rebuilding")
+
+        index = cls.build(load_texts(node_ids), node_ids)
+        Path(persist_dir).mkdir(parents=True, exist_ok=True)
+        index.save(persist_dir)
+        return index
+
+    def search(
+        self, query: str, top_k: int, rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the top_k (node_id, BM25 score) pairs with any query term,
+        among the given sorted rows only if ``rows`` is set.
+        """
+        term_ids = [
+            self.vocabulary[t] for t in set(tokenize(query)) if t in self.vocabulary
+        ]
+        if not term_ids:
+            return []
+
+        spans = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        posting_rows = np.concatenate([self.doc_rows[s] for s in spans])
+        scores = np.bincount(
+            posting_rows,
+            weights=np.concatenate([self.weights[s] for s in spans]),
+            minlength=len(self.node_ids),
+        )
+        matched = np.unique(posting_rows)
+        if rows is not None:
+            matched = np.intersect1d(matched, rows, assume_unique=True)
+        top = top_k_indices(scores[matched], top_k)
+        return [(self.node_ids[matched[i]], float(scores[matched[i]])) for i in top]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[str, float]]], top_k: int, k: int = 60
+) -> List[Tuple[str, float]]:
+    """Fuse ranked (node_id, score) lists by summing 1 / (k + rank)."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (node_id, _) in enumerate(ranking, start=1):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
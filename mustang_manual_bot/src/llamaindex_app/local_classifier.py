@@ -0,0 +1,84 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import numpy as np
+from src.llamaindex_app.config import CLASSIFICATION_EXAMPLES
+
+logger = logging.getLogger(__name__)
+
+
+def load_labeled_examples(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Load labeled example queries grouped by category.
+
+    Starts from CLASSIFICATION_EXAMPLES and adds the rows of an optional
+    JSONL file with "query" and "category" fields.
+    """
+    examples = {
+        category: list(queries) for category, queries in CLASSIFICATION_EXAMPLES.items()
+    }
+    if not path:
+        return examples
+
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            examples.setdefault(row["category"], []).append(row["query"])
+
+    logger.info(f"Loaded labeled classification examples from {path}")
+    return examples
+
+
+class LocalQueryClassifier:
+    """
+    Nearest-centroid query classifier over the BGE query embeddings.
+
+    Each category is represented by the normalized mean embedding of its
+    labeled examples. A query's confidence is the softmax of its cosine
+    similarity to every centroid.
+    """
+
+    def __init__(
+        self,
+        embed_model,
+        examples: Dict[str, List[str]],
+        temperature: float = 0.05,
+    ):
+        self.embed_model = embed_model
+        self.temperature = temperature
+        self.categories = [c for c, queries in examples.items() if queries]
+        if len(self.categories) < 2:
+            raise ValueError(
+                "Local classifier needs examples for at least two categories"
+            )
+
+        centroids = []
+        for category in self.categories:
+            # Examples are embedded as queries so they match what we classify
+            vectors = np.array(
+                [embed_model.get_query_embedding(q) for q in examples[category]],
+                dtype=np.float32,
+            )
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self.centroids = np.stack(centroids)
+
+        logger.info(
+            f"Local classifier ready with {len(self.categories)} categories: {self.categories}"
+        )
+
+    def classify(self, query: str) -> Tuple[str, float]:
+        """Return the closest category and its confidence between 0 and 1."""
+        embedding = np.asarray(
+            self.embed_model.get_query_embedding(query), dtype=np.float32
+        )
+        similarities = self.centroids @ (embedding / np.linalg.norm(embedding))
+
+        scores = np.exp((similarities - similarities.max()) / self.temperature)
+        probabilities = scores / scores.sum()
+        best = int(np.argmax(probabilities))
+        return self.categories[best], float(probabilities[best])
@@ -1,22 +1,33 @@
+import asyncio
+import contextvars
 import logging
 import sys
+import threading
 import uuid
-from typing import Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from llama_index.core import Response
 from openinference.semconv.trace import SpanAttributes
+from opentelemetry import context as otel_context
+from opentelemetry import trace
 from opentelemetry.trace.status import Status, StatusCode
 
 from src.llamaindex_app.classifier import QueryCategory, QueryClassifier
 from src.llamaindex_app.config import (
+    GUARD_TEMPLATE_VERSION,
+    TEMPLATE_VERSION,
     validate_query_for_jailbreak,
     validate_query_for_toxic_language,
 )
+from src.llamaindex_app.dedup import node_sources
 from src.llamaindex_app.flexible_instrumentation import (
     get_instrumentation_manager,
     setup_flexible_instrumentation,
 )
+from src.llamaindex_app.guard_cache import GuardVerdictCache
 from src.llamaindex_app.index_manager import IndexManager
+from src.llamaindex_app.response_cache import ResponseCache
 
 # guards
 
@@ -28,6 +39,300 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Guard classifications are blocking LLM calls, so they get their own pool
+_guard_executor: Optional[ThreadPoolExecutor] = None
+
+# Verdicts for repeated queries, shared by every guard check
+_guard_cache: Optional[GuardVerdictCache] = None
+_guard_cache_lock = threading.Lock()
+
+# Answers to repeated questions over the same index
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+# Guards run concurrently; the first failing guard short-circuits validation.
+# Each entry is (span name, guard function, error message on failure).
+GUARDS: List[Tuple[str, Callable[..., bool], str]] = [
+    (
+        "Jailbreak Check",
+        validate_query_for_jailbreak,
+        "Potential jailbreak attempt detected",
+    ),
+    (
+        "Toxic Check",
+        validate_query_for_toxic_language,
+        "Toxic language is not allowed",
+    ),
+]
+
+# Guards answered by a field of the fused precheck verdict (FUSED_PRECHECK)
+FUSED_GUARD_FIELDS: Dict[str, str] = {
+    "Jailbreak Check": "jailbreak",
+    "Toxic Check": "toxic",
+}
+
+
+def _get_guard_executor() -> ThreadPoolExecutor:
+    """Return the shared guard pool, creating it on first use."""
+    global _guard_executor
+    if _guard_executor is None:
+        from src.llamaindex_app.config import Settings
+
+        _guard_executor = ThreadPoolExecutor(
+            max_workers=Settings().GUARD_WORKERS, thread_name_prefix="guard"
+        )
+    return _guard_executor
+
+
+def get_guard_cache() -> Optional[GuardVerdictCache]:
+    """Return the shared guard verdict cache, or None if it is disabled."""
+    global _guard_cache
+    with _guard_cache_lock:
+        if _guard_cache is None:
+            from src.llamaindex_app.config import Settings
+
+            settings = Settings()
+            if settings.GUARD_CACHE_SIZE <= 0:
+                return None
+            _guard_cache = GuardVerdictCache(
+                template_version=GUARD_TEMPLATE_VERSION,
+                max_entries=settings.GUARD_CACHE_SIZE,
+                ttl_minutes=settings.GUARD_CACHE_TTL_MINUTES,
+                path=settings.GUARD_CACHE_PATH,
+            )
+        return _guard_cache
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the shared response cache, or None if it is disabled."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            from src.llamaindex_app.config import Settings
+
+            settings = Settings()
+            if settings.RESPONSE_CACHE_SIZE <= 0:
+                return None
+            _response_cache = ResponseCache(
+                template_version=TEMPLATE_VERSION,
+                max_entries=settings.RESPONSE_CACHE_SIZE,
+                ttl_minutes=settings.RESPONSE_CACHE_TTL_MINUTES,
+                path=settings.RESPONSE_CACHE_PATH,
+            )
+        return _response_cache
+
+
+def _response_cache_key(
+    classifier: QueryClassifier, category: QueryCategory
+) -> Optional[Tuple[str, str, str]]:
+    """(category, index version, model) of a cacheable answer, or None."""
+    index_version = getattr(classifier.query_engine, "index_version", None)
+    if index_version is None:
+        return None
+    return category.value, index_version, classifier.settings.OPENAI_MODEL
+
+
+def _get_cached_response(
+    classifier: QueryClassifier, query: str, category: QueryCategory, span=None
+) -> Optional[Response]:
+    """Look up a cached answer, tagging the interaction span with the outcome."""
+    cache = get_response_cache()
+    key = _response_cache_key(classifier, category)
+    if cache is None or key is None:
+        return None
+    response = cache.get(query, *key)
+    if span:
+        span.set_attribute("response_cache.hit", response is not None)
+    return response
+
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    """Stream a cached answer as a single delta."""
+    yield text
+
+
+def _cache_response(
+    classifier: QueryClassifier, query: str, category: QueryCategory, response
+):
+    cache = get_response_cache()
+    key = _response_cache_key(classifier, category)
+    if cache is not None and key is not None:
+        cache.set(query, *key, response)
+
+
+def _run_cached_guard(
+    name: str, guard: Callable[..., bool], query: str, api_key: Optional[str]
+) -> Tuple[bool, bool]:
+    """
+    Run a guard unless its verdict is cached. Returns (passed, cache_hit).
+
+    A guard that errors (timeout, rate limit, bad key, unparsable label)
+    fails closed for this request only; the error is not cached as a
+    verdict, so it cannot block the query for later requests or tenants.
+    """
+    cache = get_guard_cache()
+    if cache is not None:
+        passed = cache.get(name, query)
+        if passed is not None:
+            return passed, True
+
+    try:
+        passed = guard(query, api_key)
+    except Exception as e:
+        logger.warning(f"{name} failed, rejecting the query: {e}")
+        return False, False
+    if cache is not None:
+        cache.set(name, query, passed)
+    return passed, False
+
+
+async def _run_guard(
+    name: str, guard: Callable[..., bool], query: str, api_key: Optional[str]
+) -> Tuple[bool, bool]:
+    """Run a blocking guard check on the guard pool with the current context."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _get_guard_executor(), ctx.run, _run_cached_guard, name, guard, query, api_key
+    )
+
+
+def _guard_span(tracer: any, name: str, query: str):
+    """Start a GUARDRAIL span for a single guard check."""
+    return tracer.start_as_current_span(
+        name,
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+            SpanAttributes.INPUT_VALUE: query,
+        },
+        record_exception=False,
+        set_status_on_exception=False,
+    )
+
+
+def _check_guard(
+    tracer: any,
+    name: str,
+    guard: Callable[..., bool],
+    query: str,
+    api_key: Optional[str],
+) -> bool:
+    """Run one guard, recording a child span when a tracer is available."""
+    if not tracer:
+        return _run_cached_guard(name, guard, query, api_key)[0]
+
+    with _guard_span(tracer, name, query) as guard_span:
+        passed, cache_hit = _run_cached_guard(name, guard, query, api_key)
+        guard_span.set_attribute("guard.cache_hit", cache_hit)
+        guard_span.set_attribute(
+            SpanAttributes.OUTPUT_VALUE, "Pass" if passed else "Fail"
+        )
+        guard_span.set_status(Status(StatusCode.OK))
+        return passed
+
+
+async def _acheck_guard(
+    tracer: any,
+    name: str,
+    guard: Callable[..., bool],
+    query: str,
+    api_key: Optional[str],
+) -> bool:
+    """Async counterpart of _check_guard that records cancellation."""
+    if not tracer:
+        return (await _run_guard(name, guard, query, api_key))[0]
+
+    with _guard_span(tracer, name, query) as guard_span:
+        try:
+            passed, cache_hit = await _run_guard(name, guard, query, api_key)
+        except asyncio.CancelledError:
+            # Another guard already failed, so this verdict is not needed
+            guard_span.set_attribute(SpanAttributes.OUTPUT_VALUE, "Cancelled")
+            guard_span.set_attribute("guard.cancelled", True)
+            raise
+        guard_span.set_attribute("guard.cache_hit", cache_hit)
+        guard_span.set_attribute(
+            SpanAttributes.OUTPUT_VALUE, "Pass" if passed else "Fail"
+        )
+        guard_span.set_status(Status(StatusCode.OK))
+        return passed
+
+
+def _run_guards(
+    tracer: any,
+    query: str,
+    api_key: Optional[str] = None,
+    guards: Optional[List[Tuple[str, Callable[..., bool], str]]] = None,
+):
+    """
+    Run the guards (all of GUARDS by default) concurrently on the guard pool
+
+    Returns the error message of the first guard to fail, without waiting
+    for the others, or None if every guard passes. Guards that have not
+    started yet are cancelled; running guards finish in the background.
+    """
+    guards = GUARDS if guards is None else guards
+    executor = _get_guard_executor()
+    futures = {}
+    for name, guard, message in guards:
+        # Each worker needs its own copy so guard spans parent correctly
+        ctx = contextvars.copy_context()
+        future = executor.submit(
+            ctx.run, _check_guard, tracer, name, guard, query, api_key
+        )
+        futures[future] = message
+
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Check in GUARDS order so simultaneous failures are deterministic
+            for future, message in futures.items():
+                if future in done and not future.result():
+                    return message
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def _arun_guards(
+    tracer: any,
+    query: str,
+    api_key: Optional[str] = None,
+    guards: Optional[List[Tuple[str, Callable[..., bool], str]]] = None,
+):
+    """
+    Async counterpart of _run_guards
+
+    Each guard runs as its own task, so guard spans are parented to the
+    current span. Outstanding guards are cancelled on the first failure.
+    """
+    guards = GUARDS if guards is None else guards
+    tasks = {
+        asyncio.create_task(_acheck_guard(tracer, name, guard, query, api_key)): (
+            message
+        )
+        for name, guard, message in guards
+    }
+
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Check in GUARDS order so simultaneous failures are deterministic
+            for task, message in tasks.items():
+                if task in done and not task.result():
+                    return message
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
 
 def validate_interaction(query: str) -> Optional[str]:
     """
@@ -44,14 +349,7 @@ def validate_interaction(query: str) -> Optional[str]:
         if not tracer:
             logger.warning("Tracer not available, skipping telemetry for validation")
             # Still perform validation without telemetry
-            jailbreak_check = validate_query_for_jailbreak(query)
-            toxic_check = validate_query_for_toxic_language(query)
-
-            if not jailbreak_check:
-                return "Potential jailbreak attempt detected"
-            if not toxic_check:
-                return "Toxic language is not allowed"
-            return None
+            return _run_guards(None, query)
 
         with tracer.start_as_current_span(
             name="validate_interaction",
@@ -60,47 +358,57 @@ def validate_interaction(query: str) -> Optional[str]:
                 SpanAttributes.INPUT_VALUE: query,
             },
         ) as span:
-            with tracer.start_as_current_span(
-                "Jailbreak Check",
-                attributes={
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
-                    SpanAttributes.INPUT_VALUE: query,
-                },
-            ) as jb_span:
-                jailbreak_check = validate_query_for_jailbreak(query)
-                jb_span.set_attribute(
-                    SpanAttributes.OUTPUT_VALUE, "Pass" if jailbreak_check else "Fail"
-                )
-                jb_span.set_status(Status(StatusCode.OK))
-            with tracer.start_as_current_span(
-                "Toxic Check",
-                attributes={
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
-                    SpanAttributes.INPUT_VALUE: query,
-                },
-            ) as toxic_span:
-                toxic_check = validate_query_for_toxic_language(query)
-                toxic_span.set_attribute(
-                    SpanAttributes.OUTPUT_VALUE, "Pass" if toxic_check else "Fail"
-                )
-                toxic_span.set_status(Status(StatusCode.OK))
-
-            if not jailbreak_check:
-                logger.warning(
-                    "Interaction validation failed: Potential jailbreak attempt detected"
-                )
+            validation_error = _run_guards(tracer, query)
+            if validation_error:
+                logger.warning(f"Interaction validation failed: {validation_error}")
                 span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
                 span.set_status(Status(StatusCode.ERROR))
-                return "Potential jailbreak attempt detected"
-            if not toxic_check:
-                logger.warning(
-                    "Interaction validation failed: Toxic language is not allowed"
-                )
+        # If all validations pass, return None (no error)
+        return validation_error
+
+    except Exception as e:
+        # Log the specific validation error
+        logger.warning(f"Interaction validation failed: {str(e)}")
+        return "Input validation failed"
+
+
+async def avalidate_interaction(
+    query: str, api_key: Optional[str] = None
+) -> Optional[str]:
+    """
+    Validate the user query without blocking the event loop
+
+    The guard classifications are synchronous LLM calls, so they run
+    concurrently in worker threads with the current tracing context.
+
+    :param query: Input query to validate
+    :param api_key: OpenAI API key for the guard models
+    :return: Error message if validation fails, None if query is valid
+    """
+    try:
+        # Get instrumentation manager and tracer
+        instrumentation_manager = get_instrumentation_manager()
+        tracer = instrumentation_manager.get_tracer("llamaindex_app")
+
+        if not tracer:
+            logger.warning("Tracer not available, skipping telemetry for validation")
+            # Still perform validation without telemetry
+            return await _arun_guards(None, query, api_key)
+
+        with tracer.start_as_current_span(
+            name="validate_interaction",
+            attributes={
+                SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+                SpanAttributes.INPUT_VALUE: query,
+            },
+        ) as span:
+            validation_error = await _arun_guards(tracer, query, api_key)
+            if validation_error:
+                logger.warning(f"Interaction validation failed: {validation_error}")
                 span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
                 span.set_status(Status(StatusCode.ERROR))
-                return "Toxic language is not allowed"
-        # If both validations pass, return None (no error)
-        return None
+        # If all validations pass, return None (no error)
+        return validation_error
 
     except Exception as e:
         # Log the specific validation error
@@ -108,6 +416,199 @@ def validate_interaction(query: str) -> Optional[str]:
         return "Input validation failed"
 
 
+def _record_fused_verdict(tracer: any, query: str, verdict) -> Optional[str]:
+    """Emit the per-guard spans for a fused precheck verdict."""
+    validation_error = None
+    for name, _, message in GUARDS:
+        field = FUSED_GUARD_FIELDS.get(name)
+        if field is None:
+            continue
+        passed = not getattr(verdict, field)
+        if tracer:
+            with _guard_span(tracer, name, query) as guard_span:
+                guard_span.set_attribute("guard.fused", True)
+                guard_span.set_attribute(
+                    SpanAttributes.OUTPUT_VALUE, "Pass" if passed else "Fail"
+                )
+                guard_span.set_status(Status(StatusCode.OK))
+        if not passed and validation_error is None:
+            validation_error = message
+    return validation_error
+
+
+def _fused_prepare(classifier: QueryClassifier, query: str, span=None):
+    """
+    Run the guards and classification as a single fused LLM call
+
+    Guards without a field in the fused verdict still run separately.
+    Returns None if the fused call fails, so the caller can fall back.
+    """
+    try:
+        verdict = classifier.precheck_query(query)
+    except Exception as e:
+        logger.warning(f"Fused precheck failed, using separate calls: {str(e)}")
+        if span:
+            span.set_attribute("precheck.fallback", True)
+        return None
+
+    tracer = get_instrumentation_manager().get_tracer("llamaindex_app")
+    other_guards = [g for g in GUARDS if g[0] not in FUSED_GUARD_FIELDS]
+    if not tracer:
+        validation_error = _record_fused_verdict(None, query, verdict)
+        if not validation_error and other_guards:
+            validation_error = _run_guards(None, query, guards=other_guards)
+    else:
+        with tracer.start_as_current_span(
+            name="validate_interaction",
+            attributes={
+                SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+                SpanAttributes.INPUT_VALUE: query,
+                "guard.fused": True,
+            },
+        ) as validation_span:
+            validation_error = _record_fused_verdict(tracer, query, verdict)
+            if not validation_error and other_guards:
+                validation_error = _run_guards(tracer, query, guards=other_guards)
+            if validation_error:
+                validation_span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
+                validation_span.set_status(Status(StatusCode.ERROR))
+
+    if validation_error:
+        logger.warning(f"Interaction validation failed: {validation_error}")
+        return validation_error, None, None
+    return None, (QueryCategory(verdict.category), verdict.confidence), None
+
+
+async def _afused_prepare(
+    classifier: QueryClassifier, query: str, api_key: Optional[str], span=None
+):
+    """Async counterpart of _fused_prepare."""
+    try:
+        verdict = await classifier.aprecheck_query(query)
+    except Exception as e:
+        logger.warning(f"Fused precheck failed, using separate calls: {str(e)}")
+        if span:
+            span.set_attribute("precheck.fallback", True)
+        return None
+
+    tracer = get_instrumentation_manager().get_tracer("llamaindex_app")
+    other_guards = [g for g in GUARDS if g[0] not in FUSED_GUARD_FIELDS]
+    if not tracer:
+        validation_error = _record_fused_verdict(None, query, verdict)
+        if not validation_error and other_guards:
+            validation_error = await _arun_guards(
+                None, query, api_key, guards=other_guards
+            )
+    else:
+        with tracer.start_as_current_span(
+            name="validate_interaction",
+            attributes={
+                SpanAttributes.OPENINFERENCE_SPAN_KIND: "GUARDRAIL",
+                SpanAttributes.INPUT_VALUE: query,
+                "guard.fused": True,
+            },
+        ) as validation_span:
+            validation_error = _record_fused_verdict(tracer, query, verdict)
+            if not validation_error and other_guards:
+                validation_error = await _arun_guards(
+                    tracer, query, api_key, guards=other_guards
+                )
+            if validation_error:
+                validation_span.set_attribute(SpanAttributes.OUTPUT_VALUE, "FAIL")
+                validation_span.set_status(Status(StatusCode.ERROR))
+
+    if validation_error:
+        logger.warning(f"Interaction validation failed: {validation_error}")
+        return validation_error, None, None
+    return None, (QueryCategory(verdict.category), verdict.confidence), None
+
+
+def _prepare_interaction(
+    classifier: QueryClassifier, query: str, span=None
+) -> Tuple[Optional[str], Optional[Tuple[QueryCategory, float]], Optional[List]]:
+    """
+    Run the guards and classify the query
+
+    In fused mode, one LLM call answers the guards and classification, with
+    the separate calls as the fallback. In speculative mode, classification
+    and retrieval start at the same time as the guards and are discarded if
+    a guard fails.
+
+    :return: (validation error, (category, confidence), prefetched nodes)
+    """
+    if classifier.settings.FUSED_PRECHECK:
+        prepared = _fused_prepare(classifier, query, span)
+        if prepared is not None:
+            return prepared
+
+    if not classifier.settings.SPECULATIVE_EXECUTION:
+        validation_error = validate_interaction(query)
+        if validation_error:
+            return validation_error, None, None
+        return None, classifier.classify_query(query, span), None
+
+    # Classification is a blocking LLM call like the guards; retrieval runs
+    # on the bounded retrieval pool, as aretrieve does
+    classify_future = _get_guard_executor().submit(
+        contextvars.copy_context().run, classifier.classify_query, query, span
+    )
+    retrieval_executor = (
+        getattr(classifier.query_engine, "executor", None) or _get_guard_executor()
+    )
+    retrieve_future = retrieval_executor.submit(
+        contextvars.copy_context().run, classifier.query_engine.retrieve, query
+    )
+    try:
+        validation_error = validate_interaction(query)
+        if validation_error:
+            if span:
+                span.set_attribute("speculative.discarded", True)
+            return validation_error, None, None
+
+        category, confidence = classify_future.result()
+        if category != QueryCategory.FORD_MUSTANG:
+            return None, (category, confidence), None
+        return None, (category, confidence), retrieve_future.result()
+    finally:
+        # Work that is still running finishes in the background
+        for future in (classify_future, retrieve_future):
+            future.cancel()
+
+
+async def _aprepare_interaction(
+    classifier: QueryClassifier, query: str, api_key: Optional[str], span=None
+) -> Tuple[Optional[str], Optional[Tuple[QueryCategory, float]], Optional[List]]:
+    """Async counterpart of _prepare_interaction that cancels discarded work."""
+    if classifier.settings.FUSED_PRECHECK:
+        prepared = await _afused_prepare(classifier, query, api_key, span)
+        if prepared is not None:
+            return prepared
+
+    if not classifier.settings.SPECULATIVE_EXECUTION:
+        validation_error = await avalidate_interaction(query, api_key)
+        if validation_error:
+            return validation_error, None, None
+        return None, await classifier.aclassify_query(query, span), None
+
+    classify_task = asyncio.create_task(classifier.aclassify_query(query, span))
+    retrieve_task = asyncio.create_task(classifier.query_engine.aretrieve(query))
+    try:
+        validation_error = await avalidate_interaction(query, api_key)
+        if validation_error:
+            if span:
+                span.set_attribute("speculative.discarded", True)
+            return validation_error, None, None
+
+        category, confidence = await classify_task
+        if category != QueryCategory.FORD_MUSTANG:
+            return None, (category, confidence), None
+        return None, (category, confidence), await retrieve_task
+    finally:
+        for task in (classify_task, retrieve_task):
+            task.cancel()
+        await asyncio.gather(classify_task, retrieve_task, return_exceptions=True)
+
+
 def process_interaction(
     query_engine: any,
     classifier: QueryClassifier,
@@ -127,14 +628,23 @@ def process_interaction(
         },
     ) as interaction_span:
         try:
-            validation_error = validate_interaction(query)
+            validation_error, classification, nodes = _prepare_interaction(
+                classifier, query, interaction_span
+            )
             if validation_error:
                 return None, validation_error
-            category, confidence = classifier.classify_query(query, interaction_span)
+            category, confidence = classification
             interaction_span.set_attribute("query.category", category.value)
             interaction_span.set_attribute("classification.confidence", confidence)
 
-            response = classifier.get_response(query, category, interaction_span)
+            response = _get_cached_response(
+                classifier, query, category, interaction_span
+            )
+            if response is None:
+                response = classifier.get_response(
+                    query, category, interaction_span, nodes=nodes
+                )
+                _cache_response(classifier, query, category, response)
 
             interaction_span.set_status(Status(StatusCode.OK))
             interaction_span.set_attribute(
@@ -158,6 +668,170 @@ def process_interaction(
             return None, str(e)
 
 
+async def aprocess_interaction(
+    query_engine: any,
+    classifier: QueryClassifier,
+    tracer: any,
+    query: str,
+    session_id: str,
+) -> Tuple[Optional[Response], Optional[str]]:
+    """Async counterpart of process_interaction for the API backend."""
+    # Guards use the same OpenAI credentials as the classifier
+    api_key = getattr(classifier.openai_client, "api_key", None)
+
+    with tracer.start_as_current_span(
+        name="user_interaction",
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "CHAIN",
+            SpanAttributes.SESSION_ID: session_id,
+            SpanAttributes.INPUT_VALUE: query,
+        },
+    ) as interaction_span:
+        try:
+            validation_error, classification, nodes = await _aprepare_interaction(
+                classifier, query, api_key, interaction_span
+            )
+            if validation_error:
+                return None, validation_error
+            category, confidence = classification
+            interaction_span.set_attribute("query.category", category.value)
+            interaction_span.set_attribute("classification.confidence", confidence)
+
+            response = _get_cached_response(
+                classifier, query, category, interaction_span
+            )
+            if response is None:
+                response = await classifier.aget_response(
+                    query, category, interaction_span, nodes=nodes
+                )
+                _cache_response(classifier, query, category, response)
+
+            interaction_span.set_status(Status(StatusCode.OK))
+            interaction_span.set_attribute(
+                SpanAttributes.OUTPUT_VALUE, str(response.response)
+            )
+            interaction_span.set_attribute(
+                "response_length", len(str(response.response))
+            )
+
+            if category == QueryCategory.FORD_MUSTANG and response.source_nodes:
+                interaction_span.set_attribute(
+                    "source_count", len(response.source_nodes)
+                )
+
+            return response, None
+
+        except Exception as e:
+            logger.error(f"Error processing query in session {session_id}: {str(e)}")
+            interaction_span.set_status(Status(StatusCode.ERROR))
+            interaction_span.record_exception(e)
+            return None, str(e)
+
+
+async def aprocess_interaction_stream(
+    query_engine: any,
+    classifier: QueryClassifier,
+    tracer: any,
+    query: str,
+    session_id: str,
+    parent_context: Optional[otel_context.Context] = None,
+) -> AsyncIterator[Tuple[str, any]]:
+    """
+    Streaming counterpart of aprocess_interaction for the API backend.
+
+    Yields ("token", text) events as the answer is generated, followed by
+    ("done", source_nodes) or ("error", message). The user_interaction span
+    ends when the stream finishes, fails or is closed by the consumer.
+
+    The tracing context is attached only around the awaited pipeline steps,
+    never across a yield, so the generator can be suspended and resumed by
+    the web framework safely.
+    """
+    # Guards use the same OpenAI credentials as the classifier
+    api_key = getattr(classifier.openai_client, "api_key", None)
+
+    interaction_span = tracer.start_span(
+        name="user_interaction",
+        context=parent_context,
+        attributes={
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: "CHAIN",
+            SpanAttributes.SESSION_ID: session_id,
+            SpanAttributes.INPUT_VALUE: query,
+            "response.streamed": True,
+        },
+    )
+    span_context = trace.set_span_in_context(interaction_span, parent_context)
+    deltas = None
+    cached = None
+
+    try:
+        token = otel_context.attach(span_context)
+        try:
+            validation_error, classification, nodes = await _aprepare_interaction(
+                classifier, query, api_key, interaction_span
+            )
+            if not validation_error:
+                category, confidence = classification
+                interaction_span.set_attribute("query.category", category.value)
+                interaction_span.set_attribute("classification.confidence", confidence)
+
+                cached = _get_cached_response(
+                    classifier, query, category, interaction_span
+                )
+                if cached is not None:
+                    nodes = cached.source_nodes
+                    deltas = _replay(str(cached.response))
+                else:
+                    nodes, deltas = await classifier.astream_response(
+                        query, category, interaction_span, nodes=nodes
+                    )
+        finally:
+            otel_context.detach(token)
+
+        if validation_error:
+            yield "error", validation_error
+            return
+
+        chunks = []
+        async for text in deltas:
+            chunks.append(text)
+            yield "token", text
+
+        response_text = "".join(chunks)
+        if cached is None:
+            # Only complete answers are cached
+            _cache_response(
+                classifier,
+                query,
+                category,
+                Response(response=response_text, source_nodes=nodes),
+            )
+        interaction_span.set_status(Status(StatusCode.OK))
+        interaction_span.set_attribute(SpanAttributes.OUTPUT_VALUE, response_text)
+        interaction_span.set_attribute("response_length", len(response_text))
+        if nodes:
+            interaction_span.set_attribute("source_count", len(nodes))
+
+        yield "done", nodes
+
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client went away before the answer was complete
+        logger.info(f"Stream closed by client in session {session_id}")
+        interaction_span.set_attribute("response.cancelled", True)
+        interaction_span.set_status(Status(StatusCode.ERROR, "Client disconnected"))
+        raise
+    except Exception as e:
+        logger.error(f"Error processing query in session {session_id}: {str(e)}")
+        interaction_span.set_status(Status(StatusCode.ERROR))
+        interaction_span.record_exception(e)
+        yield "error", str(e)
+    finally:
+        if deltas is not None:
+            # Closes the OpenAI stream, which ends its LLM span
+            await deltas.aclose()
+        interaction_span.end()
+
+
 def handle_session(query_engine: any, classifier: QueryClassifier, tracer: any) -> bool:
     session_id = str(uuid.uuid4())
     logger.info(f"Starting new session {session_id}")
@@ -194,14 +868,13 @@ def handle_session(query_engine: any, classifier: QueryClassifier, tracer: any)
             if getattr(response, "source_nodes", None):
                 print("\nSources:")
                 for node in response.source_nodes:
-                    print(f"- {node.metadata.get('file_name', 'Unknown source')}")
+                    for source in node_sources(node.metadata):
+                        print(f"- {source}")
             print()
 
 
-def init_openai_client():
-    """Initialize the OpenAI client with API key."""
-    from openai import OpenAI
-
+def _openai_client_kwargs():
+    """Build OpenAI client arguments from settings."""
     from src.llamaindex_app.config import Settings
 
     settings = Settings()
@@ -210,8 +883,6 @@ def init_openai_client():
     if not settings.OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY is not set in environment variables")
 
-    logger.info("Initializing OpenAI client")
-
     client_kwargs = {
         "api_key": settings.OPENAI_API_KEY,
     }
@@ -224,6 +895,17 @@ def init_openai_client():
     if settings.OPENAI_BASE_URL:
         client_kwargs["base_url"] = settings.OPENAI_BASE_URL
 
+    return client_kwargs
+
+
+def init_openai_client():
+    """Initialize the OpenAI client with API key."""
+    from openai import OpenAI
+
+    client_kwargs = _openai_client_kwargs()
+
+    logger.info("Initializing OpenAI client")
+
     try:
         client = OpenAI(**client_kwargs)
         return client
@@ -232,6 +914,21 @@ def init_openai_client():
         raise ValueError(f"OpenAI client initialization failed: {str(e)}")
 
 
+def init_async_openai_client():
+    """Initialize the async OpenAI client with API key."""
+    from openai import AsyncOpenAI
+
+    client_kwargs = _openai_client_kwargs()
+
+    logger.info("Initializing async OpenAI client")
+
+    try:
+        return AsyncOpenAI(**client_kwargs)
+    except Exception as e:
+        logger.error(f"Failed to initialize async OpenAI client: {str(e)}")
+        raise ValueError(f"OpenAI client initialization failed: {str(e)}")
+
+
 def main():
     try:
         # Initialize flexible instrumentation
@@ -249,7 +946,10 @@ def main():
 
         # Initialize classifier with OpenAI client
         classifier = QueryClassifier(
-            query_engine=query_engine, openai_client=openai_client
+            query_engine=query_engine,
+            openai_client=openai_client,
+            local_classifier=index_manager.get_local_classifier(),
+            context_assembler=index_manager.get_context_assembler(),
         )
 
         print("\nWelcome to the Mustang Manual Expert!")
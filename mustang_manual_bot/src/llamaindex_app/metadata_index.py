@@ -0,0 +1,144 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import json
+import logging
+import os
+import re
+import numpy as np
+from src.llamaindex_app.ann_index import corpus_fingerprint
+from src.llamaindex_app.dedup import model_year
+
+logger = logging.getLogger(__name__)
+
+METADATA_INDEX_FILE = "default__vector_store.metadata.json"
+
+# Values of each field a query can name
+_QUERY_PATTERNS = {
+    "model_year": re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)"),
+}
+
+
+def node_filter_values(metadata: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Filterable values of a node. Deduplicated nodes list every model year
+    they apply to; others get the year of their manual's file name.
+    """
+    years = metadata.get("model_years")
+    if not years:
+        year = model_year(metadata.get("file_name", ""))
+        years = [] if year is None else [year]
+    return {"model_year": [str(year) for year in years]}
+
+
+class MetadataIndex:
+    """
+    Posting lists of vector store rows per metadata value, e.g. the rows of
+    every model_year=2019 node, so a query scoped to a value only searches
+    that partition.
+    """
+
+    def __init__(
+        self,
+        postings: Dict[str, Dict[str, np.ndarray]],
+        fingerprint: str = "",
+    ):
+        self.postings = postings
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(
+        cls, metadata: Iterable[Dict[str, Any]], node_ids: Sequence[str]
+    ) -> "MetadataIndex":
+        rows: Dict[str, Dict[str, List[int]]] = {}
+        for row, node_metadata in enumerate(metadata):
+            for field, values in node_filter_values(node_metadata).items():
+                for value in values:
+                    rows.setdefault(field, {}).setdefault(value, []).append(row)
+        postings = {
+            field: {
+                value: np.array(value_rows, dtype=np.int64)
+                for value, value_rows in sorted(values.items())
+            }
+            for field, values in rows.items()
+        }
+        logger.info(
+            "Built metadata index: "
+            + ", ".join(f"{len(values)} {field}s" for field, values in rows.items())
+        )
+        return cls(postings, corpus_fingerprint(node_ids))
+
+    def save(self, persist_dir: str):
+        path = Path(persist_dir) / METADATA_INDEX_FILE
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "postings": {
+                        field: {value: rows.tolist() for value, rows in values.items()}
+                        for field, values in self.postings.items()
+                    },
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved metadata index to {path}")
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "MetadataIndex":
+        with (Path(persist_dir) / METADATA_INDEX_FILE).open(encoding="utf-8") as f:
+            data = json.load(f)
+        postings = {
+            field: {
+                value: np.array(rows, dtype=np.int64) for value, rows in values.items()
+            }
+            for field, values in data["postings"].items()
+        }
+        return cls(postings, data["fingerprint"])
+
+    @classmethod
+    def load_or_build(
+        cls,
+        persist_dir: str,
+        node_ids: Sequence[str],
+        load_metadata: Callable[[Sequence[str]], Iterable[Dict[str, Any]]],
+    ) -> "MetadataIndex":
+        """
+        Load the persisted index if it matches the corpus, else rebuild it
+        from ``load_metadata(node_ids)`` and persist it.
+        """
+        fingerprint = corpus_fingerprint(node_ids)
+        if (Path(persist_dir) / METADATA_INDEX_FILE).exists():
+            index = cls.load(persist_dir)
+            if index.fingerprint == fingerprint:
+                logger.info("Loaded metadata index")
+                return index
+            logger.info("Metadata index is stale, rebuilding")
+
+        index = cls.build(load_metadata(node_ids), node_ids)
+        Path(persist_dir).mkdir(parents=True, exist_ok=True)
+        index.save(persist_dir)
+        return index
+
+    def parse_query(self, query: str) -> Dict[str, List[str]]:
+        """Indexed values named in the query, e.g. {"model_year": ["2019"]}."""
+        filters = {}
+        for field, pattern in _QUERY_PATTERNS.items():
+            values = self.postings.get(field, {})
+            matched = sorted({v for v in pattern.findall(query) if v in values})
+            if matched:
+                filters[field] = matched
+        return filters
+
+    def rows(self, filters: Dict[str, List[str]]) -> Optional[np.ndarray]:
+        """
+        Sorted rows matching any value of every filtered field, or None
+        without filters.
+        """
+        rows = None
+        for field, values in filters.items():
+            field_rows = np.unique(
+                np.concatenate([self.postings[field][value] for value in values])
+            )
+            rows = field_rows if rows is None else np.intersect1d(rows, field_rows)
+        return rows
@@ -0,0 +1,144 @@
+from pathlib import Path
+from typing import Optional, Sequence
+import json
+import logging
+import os
+import numpy as np
+from src.llamaindex_app.ann_index import corpus_fingerprint
+from src.llamaindex_app.vector_store import VECTOR_STORE_NAME
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_DTYPES = ("float16", "int8")
+
+# Rows converted to float32 at a time while scanning, to bound memory
+_SCAN_BLOCK = 4096
+
+
+def quantized_files(dtype: str, namespace: str = VECTOR_STORE_NAME):
+    """File names of a persisted QuantizedMatrix: codes and metadata."""
+    return f"{namespace}.{dtype}.npy", f"{namespace}.{dtype}.json"
+
+
+class QuantizedMatrix:
+    """
+    Compact copy of a normalized embedding matrix used to scan for
+    candidates.
+
+    float16 halves the matrix. int8 quarters it with symmetric scalar
+    quantization: each dimension has its own scale (its largest absolute
+    value / 127), and since ``x . q ~= codes . (scales * q)`` the query is
+    scaled once instead of dequantizing the matrix.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        fingerprint: str = "",
+    ):
+        self.codes = codes
+        self.scales = scales
+        self.fingerprint = fingerprint
+
+    @property
+    def dtype(self) -> str:
+        return str(self.codes.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    @classmethod
+    def quantize(
+        cls, matrix: np.ndarray, dtype: str, fingerprint: str = ""
+    ) -> "QuantizedMatrix":
+        if dtype not in QUANTIZATION_DTYPES:
+            raise ValueError(
+                f"Unsupported quantization {dtype!r}, use {QUANTIZATION_DTYPES}"
+            )
+        if dtype == "float16":
+            return cls(np.asarray(matrix, dtype=np.float16), None, fingerprint)
+
+        max_abs = np.zeros(matrix.shape[1], dtype=np.float32)
+        for start in range(0, len(matrix), _SCAN_BLOCK):
+            block = np.abs(np.asarray(matrix[start : start + _SCAN_BLOCK]))
+            np.maximum(max_abs, block.max(axis=0), out=max_abs)
+        scales = np.where(max_abs > 0, max_abs / 127, 1.0).astype(np.float32)
+
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, len(matrix), _SCAN_BLOCK):
+            block = np.asarray(matrix[start : start + _SCAN_BLOCK], dtype=np.float32)
+            codes[start : start + len(block)] = np.clip(
+                np.rint(block / scales), -127, 127
+            )
+        return cls(codes, scales, fingerprint)
+
+    def save(self, persist_dir: str):
+        codes_path, meta_path = (
+            Path(persist_dir) / name for name in quantized_files(self.dtype)
+        )
+        codes_tmp = codes_path.with_suffix(".tmp.npy")
+        meta_tmp = meta_path.with_suffix(".tmp")
+        np.save(codes_tmp, self.codes)
+        with meta_tmp.open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "scales": None if self.scales is None else self.scales.tolist(),
+                },
+                f,
+            )
+        os.replace(codes_tmp, codes_path)
+        os.replace(meta_tmp, meta_path)
+        logger.info(f"Saved {self.dtype} search matrix to {codes_path}")
+
+    @classmethod
+    def load(cls, persist_dir: str, dtype: str) -> Optional["QuantizedMatrix"]:
+        codes_path, meta_path = (
+            Path(persist_dir) / name for name in quantized_files(dtype)
+        )
+        if not (codes_path.exists() and meta_path.exists()):
+            return None
+        with meta_path.open(encoding="utf-8") as f:
+            meta = json.load(f)
+        scales = meta["scales"]
+        return cls(
+            np.load(codes_path, mmap_mode="r"),
+            None if scales is None else np.array(scales, dtype=np.float32),
+            meta["fingerprint"],
+        )
+
+    @classmethod
+    def load_or_build(
+        cls,
+        persist_dir: str,
+        matrix: np.ndarray,
+        node_ids: Sequence[str],
+        dtype: str,
+    ) -> "QuantizedMatrix":
+        """Memory-map the persisted codes if they match the corpus, else rebuild."""
+        fingerprint = corpus_fingerprint(node_ids)
+        quantized = cls.load(persist_dir, dtype)
+        if quantized is not None and quantized.fingerprint == fingerprint:
+            logger.info(f"Memory-mapped {dtype} search matrix")
+            return quantized
+
+        quantized = cls.quantize(matrix, dtype, fingerprint)
+        Path(persist_dir).mkdir(parents=True, exist_ok=True)
+        quantized.save(persist_dir)
+        # Reload so every process shares the codes through the page cache
+        return cls.load(persist_dir, dtype)
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None):
+        """Approximate similarities of a normalized query to all or some rows."""
+        if self.scales is not None:
+            query = query * self.scales
+        if rows is not None:
+            return self.codes[rows].astype(np.float32) @ query
+
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), _SCAN_BLOCK):
+            block = self.codes[start : start + _SCAN_BLOCK].astype(np.float32)
+            scores[start : start + len(block)] = block @ query
+        return scores
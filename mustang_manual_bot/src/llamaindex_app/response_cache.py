@@ -0,0 +1,75 @@
+from typing import Any, Dict, List, Optional
+from llama_index.core import Response
+from llama_index.core.schema import NodeWithScore, TextNode
+from src.llamaindex_app.ttl_cache import PersistentTTLCache, normalize_query
+
+
+def _serialize_sources(source_nodes: List[NodeWithScore]) -> List[Dict[str, Any]]:
+    return [
+        {"node_id": node.node_id, "metadata": node.metadata, "score": node.score}
+        for node in source_nodes or []
+    ]
+
+
+def _deserialize_sources(sources: List[Dict[str, Any]]) -> List[NodeWithScore]:
+    # Only what the callers read back (file names, scores); the text stays
+    # in the docstore
+    return [
+        NodeWithScore(
+            node=TextNode(id_=source["node_id"], text="", metadata=source["metadata"]),
+            score=source["score"],
+        )
+        for source in sources
+    ]
+
+
+class ResponseCache(PersistentTTLCache):
+    """
+    Bounded LRU + TTL cache of final answers keyed by normalized query,
+    query category, index version and model.
+
+    Answers are generated at temperature 0, so the same question over the
+    same index, prompt templates and model gets the same answer. Keys
+    include the prompt template version, and with a SQLite path answers
+    also persist across restarts.
+    """
+
+    def __init__(
+        self,
+        template_version: str,
+        max_entries: int = 1024,
+        ttl_minutes: int = 60,
+        path: Optional[str] = None,
+    ):
+        super().__init__("responses", template_version, max_entries, ttl_minutes, path)
+
+    def get(
+        self, query: str, category: str, index_version: str, model: str
+    ) -> Optional[Response]:
+        """Return the cached answer with its source nodes, or None."""
+        cached = self._lookup(
+            self._make_key(model, index_version, category, normalize_query(query))
+        )
+        if cached is None:
+            return None
+        return Response(
+            response=cached["response"],
+            source_nodes=_deserialize_sources(cached["sources"]),
+        )
+
+    def set(
+        self,
+        query: str,
+        category: str,
+        index_version: str,
+        model: str,
+        response: Response,
+    ):
+        """Cache an answer and its source nodes."""
+        self._store(
+            self._make_key(model, index_version, category, normalize_query(query)),
+            {
+                "response": str(response.response),
+                "sources": _serialize_sources(response.source_nodes),
+            },
+        )
@@ -0,0 +1,446 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+import threading
+import time
+import numpy as np
+from llama_index.core import QueryBundle
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.vector_stores import SimpleVectorStore
+from opentelemetry import trace
+from src.llamaindex_app.ann_index import IVFIndex
+from src.llamaindex_app.embedding_batcher import QueryEmbeddingBatcher
+from src.llamaindex_app.lexical_index import BM25Index, reciprocal_rank_fusion
+from src.llamaindex_app.metadata_index import MetadataIndex
+from src.llamaindex_app.quantization import QuantizedMatrix
+from src.llamaindex_app.vector_store import (
+    MmapVectorStore,
+    matrix_scores,
+    normalize_rows,
+    top_k_indices,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class VectorSearchEngine:
+    """
+    Exact cosine top-k search over a contiguous normalized embedding matrix.
+
+    A query is scored against every node with one matrix-vector product and
+    the best k are selected with argpartition. Several queries can be
+    scored together with one matrix-matrix product.
+
+    With an IVFIndex attached, a query only scores the vectors in its
+    ``n_probe`` closest lists instead of the whole matrix. With a
+    QuantizedMatrix attached, candidates are scored on the compact codes
+    and, if ``rescore`` > 0, the best ``top_k * rescore`` are re-ranked
+    with the exact vectors.
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        node_ids: Sequence[str],
+        ann: Optional[IVFIndex] = None,
+        n_probe: int = 8,
+        quantized: Optional[QuantizedMatrix] = None,
+        rescore: int = 4,
+    ):
+        if len(node_ids) != len(matrix):
+            raise ValueError("Embedding matrix and node ids have different lengths")
+        self.matrix = matrix
+        self.node_ids = list(node_ids)
+        self.ann = ann
+        self.n_probe = n_probe
+        self.quantized = quantized
+        self.rescore = rescore
+
+    @classmethod
+    def from_vector_store(cls, vector_store) -> "VectorSearchEngine":
+        """Build an engine over a MmapVectorStore or SimpleVectorStore."""
+        if isinstance(vector_store, MmapVectorStore):
+            # Already normalized and contiguous (possibly memory-mapped)
+            return cls(vector_store.matrix, vector_store.node_ids)
+
+        if isinstance(vector_store, SimpleVectorStore):
+            embedding_dict = vector_store.data.embedding_dict
+            node_ids = list(embedding_dict.keys())
+            matrix = np.array([embedding_dict[i] for i in node_ids], dtype=np.float32)
+            return cls(np.ascontiguousarray(normalize_rows(matrix)), node_ids)
+
+        raise TypeError(f"Unsupported vector store: {type(vector_store).__name__}")
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @staticmethod
+    def _normalize_queries(query_embeddings) -> np.ndarray:
+        queries = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+        return normalize_rows(queries)
+
+    def search(
+        self, query_embedding, top_k: int, rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the top_k (node_id, similarity) pairs for one query, among
+        the given sorted rows only if ``rows`` is set.
+        """
+        if not len(self.node_ids) or (rows is not None and not len(rows)):
+            return []
+        query = self._normalize_queries(query_embedding)[0]
+        if rows is None and self.ann is None and self.quantized is None:
+            scores = matrix_scores(self.matrix, query)
+            return [
+                (self.node_ids[i], float(scores[i]))
+                for i in top_k_indices(scores, top_k)
+            ]
+
+        # Sorted rows keep reads of memory-mapped matrices sequential. A
+        # filtered partition is scanned exactly rather than through the
+        # IVF lists, which may not cover it.
+        if rows is None and self.ann is not None:
+            rows = np.sort(self.ann.candidates(query, self.n_probe))
+
+        if self.quantized is not None:
+            scores = self.quantized.scores(query, rows)
+            if self.rescore > 0:
+                top = top_k_indices(scores, top_k * self.rescore)
+                rows = np.sort(top if rows is None else rows[top])
+                scores = matrix_scores(self.matrix[rows], query)
+        else:
+            scores = matrix_scores(self.matrix[rows], query)
+
+        top = top_k_indices(scores, top_k)
+        if rows is not None:
+            top, scores = rows[top], scores[top]
+        else:
+            scores = scores[top]
+        return [(self.node_ids[i], float(score)) for i, score in zip(top, scores)]
+
+    def search_batch(
+        self, query_embeddings, top_k: int
+    ) -> List[List[Tuple[str, float]]]:
+        """Score several queries with one matrix product."""
+        queries = self._normalize_queries(query_embeddings)
+        if not len(self.node_ids):
+            return [[] for _ in queries]
+        if self.ann is not None or self.quantized is not None:
+            # Each query probes its own lists and rescoring candidates
+            return [self.search(query, top_k) for query in queries]
+
+        scores = matrix_scores(self.matrix, queries.T)  # (nodes, queries)
+        k = min(top_k, len(self.node_ids))
+        if k < len(self.node_ids):
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        else:
+            top = np.tile(np.arange(len(self.node_ids))[:, None], (1, len(queries)))
+
+        results = []
+        for column in range(len(queries)):
+            rows = top[:, column]
+            column_scores = scores[rows, column]
+            order = np.argsort(-column_scores, kind="stable")
+            results.append(
+                [(self.node_ids[rows[i]], float(column_scores[i])) for i in order]
+            )
+        return results
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings, keyed by embedding model and
+    query text, so repeated questions skip the embedding model.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self._max_entries = max(1, max_entries)
+        self._cache: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_query_embedding(
+        self, embed_model, query: str, embed: Optional[Callable] = None
+    ) -> Tuple[List[float], bool]:
+        """
+        Return (embedding, cache_hit), embedding the query on a miss with
+        ``embed`` (default: the model's get_query_embedding).
+        """
+        key = (embed_model.model_name, query)
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return embedding, True
+            self._misses += 1
+
+        # Embed outside the lock so concurrent misses do not serialize
+        embedding = (embed or embed_model.get_query_embedding)(query)
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return embedding, False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self._max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def adaptive_cutoff(
+    scores: Sequence[float],
+    min_k: int,
+    max_k: int,
+    max_drop: float = 0.15,
+    max_gap: float = 0.05,
+) -> int:
+    """
+    Number of best-first hits to keep: at least min_k, at most max_k, and
+    none past a score more than ``max_drop`` below the best score or
+    ``max_gap`` below the previous one (both as fractions of the best).
+    """
+    if not len(scores) or scores[0] <= 0:
+        return min(min_k, len(scores))
+    best = scores[0]
+    k = 1
+    while k < min(max_k, len(scores)):
+        score = scores[k]
+        if k >= min_k and (
+            score < best * (1 - max_drop) or scores[k - 1] - score > best * max_gap
+        ):
+            break
+        k += 1
+    return k
+
+
+def _load_nodes(index, vector_ids: Sequence[str]):
+    nodes_dict = index.index_struct.nodes_dict
+    return index.docstore.get_nodes(
+        [nodes_dict.get(vector_id, vector_id) for vector_id in vector_ids]
+    )
+
+
+def node_texts(index, vector_ids: Sequence[str]) -> List[str]:
+    """Texts of the nodes behind vector store ids, as they were embedded."""
+    return [
+        node.get_content(metadata_mode=MetadataMode.EMBED)
+        for node in _load_nodes(index, vector_ids)
+    ]
+
+
+def node_metadata(index, vector_ids: Sequence[str]) -> List[Dict[str, Any]]:
+    """Metadata of the nodes behind vector store ids."""
+    return [node.metadata for node in _load_nodes(index, vector_ids)]
+
+
+class EngineRetriever(BaseRetriever):
+    """
+    Retriever that answers from a VectorSearchEngine instead of the vector
+    store's query path, then loads the matching nodes from the docstore.
+
+    With a BM25Index attached, the best ``hybrid_candidates`` vector and
+    keyword hits are fused by reciprocal rank, and node scores are the
+    fused scores.
+
+    With a MetadataIndex attached, a query naming an indexed value (e.g.
+    a model year) only searches the nodes with that value.
+
+    With ``max_top_k`` set, up to ``max_top_k`` hits are fetched and cut
+    by ``adaptive_cutoff`` of the vector similarities instead of always
+    returning similarity_top_k: one dominant hit is returned alone, while
+    close scores return more. Under hybrid search, keyword hits fused
+    above a kept vector hit are returned with it.
+    """
+
+    def __init__(
+        self,
+        index,
+        similarity_top_k: int = 3,
+        embed_model=None,
+        engine: Optional[VectorSearchEngine] = None,
+        embedding_cache: Optional[QueryEmbeddingCache] = None,
+        embedding_batcher: Optional[QueryEmbeddingBatcher] = None,
+        lexical: Optional[BM25Index] = None,
+        hybrid_candidates: int = 20,
+        rrf_k: int = 60,
+        metadata_index: Optional[MetadataIndex] = None,
+        min_top_k: int = 1,
+        max_top_k: Optional[int] = None,
+        max_score_drop: float = 0.15,
+        max_score_gap: float = 0.05,
+        **kwargs: Any,
+    ):
+        self._index = index
+        self._docstore = index.docstore
+        self._embed_model = embed_model or index._embed_model
+        self.similarity_top_k = similarity_top_k
+        self.engine = engine or VectorSearchEngine.from_vector_store(index.vector_store)
+        self.embedding_cache = embedding_cache
+        self.embedding_batcher = embedding_batcher
+        self.lexical = lexical
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.metadata_index = metadata_index
+        self.min_top_k = min_top_k
+        self.max_top_k = max_top_k
+        self.max_score_drop = max_score_drop
+        self.max_score_gap = max_score_gap
+        super().__init__(**kwargs)
+
+    def _to_nodes(self, hits: List[Tuple[str, float]]) -> List[NodeWithScore]:
+        nodes_dict = self._index.index_struct.nodes_dict
+        node_ids = [nodes_dict.get(vector_id, vector_id) for vector_id, _ in hits]
+        nodes = self._docstore.get_nodes(node_ids)
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, (_, score) in zip(nodes, hits)
+        ]
+
+    def _embed_query(self, query: str) -> List[float]:
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.get_query_embedding(self._embed_model, query)
+        return self._embed_model.get_query_embedding(query)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        if self.embedding_cache is None:
+            return self._embed_query(query)
+
+        embedding, cache_hit = self.embedding_cache.get_query_embedding(
+            self._embed_model, query, self._embed_query
+        )
+        stats = self.embedding_cache.get_stats()
+        span = trace.get_current_span()
+        span.set_attribute("retrieval.embedding_cache_hit", cache_hit)
+        span.set_attribute("retrieval.embedding_cache_hits", stats["hits"])
+        span.set_attribute("retrieval.embedding_cache_misses", stats["misses"])
+        return embedding
+
+    @property
+    def _result_top_k(self) -> int:
+        return self.similarity_top_k if self.max_top_k is None else self.max_top_k
+
+    @property
+    def _vector_top_k(self) -> int:
+        if self.lexical is None:
+            return self._result_top_k
+        return max(self._result_top_k, self.hybrid_candidates)
+
+    def _cut(
+        self, hits: List[Tuple[str, float]], vector_hits: List[Tuple[str, float]]
+    ) -> List[Tuple[str, float]]:
+        """
+        Keep the result hits. With ``max_top_k`` set, adaptive_cutoff picks
+        how many vector hits to keep from the similarities, since fused
+        scores are reciprocal ranks with no meaningful drops or gaps. The
+        kept vector hits are returned in fused order, along with the keyword
+        hits fused above them while there is room under ``max_top_k``.
+        """
+        if self.max_top_k is None:
+            return hits[: self._result_top_k]
+
+        vector_hits = vector_hits[: self._result_top_k]
+        if not vector_hits:
+            hits = hits[: self.min_top_k]
+        else:
+            k = adaptive_cutoff(
+                [score for _, score in vector_hits],
+                self.min_top_k,
+                self.max_top_k,
+                self.max_score_drop,
+                self.max_score_gap,
+            )
+            remaining = {node_id for node_id, _ in vector_hits[:k]}
+            kept = []
+            for node_id, score in hits:
+                if not remaining:
+                    break
+                if node_id in remaining:
+                    remaining.discard(node_id)
+                    kept.append((node_id, score))
+                elif len(kept) + len(remaining) < self._result_top_k:
+                    kept.append((node_id, score))
+            hits = kept
+        trace.get_current_span().set_attribute("retrieval.top_k", len(hits))
+        return hits
+
+    def _filter_rows(self, query: str) -> Optional[np.ndarray]:
+        if self.metadata_index is None:
+            return None
+        filters = self.metadata_index.parse_query(query)
+        if not filters:
+            return None
+
+        rows = self.metadata_index.rows(filters)
+        span = trace.get_current_span()
+        span.set_attribute(
+            "retrieval.filter",
+            "; ".join(f"{field}={','.join(v)}" for field, v in filters.items()),
+        )
+        span.set_attribute("retrieval.filter_candidates", len(rows))
+        return rows
+
+    def _fuse(
+        self,
+        query: str,
+        vector_hits: List[Tuple[str, float]],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        if self.lexical is None:
+            return vector_hits
+
+        start = time.perf_counter()
+        lexical_hits = self.lexical.search(query, self.hybrid_candidates, rows)
+        span = trace.get_current_span()
+        span.set_attribute("retrieval.lexical_ms", (time.perf_counter() - start) * 1000)
+        span.set_attribute("retrieval.lexical_hits", len(lexical_hits))
+        # Not truncated: _cut needs every kept vector hit in fused order
+        return reciprocal_rank_fusion(
+            [vector_hits, lexical_hits],
+            len(vector_hits) + len(lexical_hits),
+            self.rrf_k,
+        )
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query_embedding = query_bundle.embedding
+        if query_embedding is None:
+            query_embedding = self._get_query_embedding(query_bundle.query_str)
+        rows = self._filter_rows(query_bundle.query_str)
+        hits = self.engine.search(query_embedding, self._vector_top_k, rows)
+        return self._to_nodes(
+            self._cut(self._fuse(query_bundle.query_str, hits, rows), hits)
+        )
+
+    def retrieve_batch(self, queries: Sequence[str]) -> List[List[NodeWithScore]]:
+        """Retrieve for several queries, scoring them together."""
+        query_embeddings = [self._get_query_embedding(q) for q in queries]
+        rows = [self._filter_rows(q) for q in queries]
+        if all(query_rows is None for query_rows in rows):
+            hits = self.engine.search_batch(query_embeddings, self._vector_top_k)
+        else:
+            # Filtered queries search different partitions
+            hits = [
+                self.engine.search(embedding, self._vector_top_k, query_rows)
+                for embedding, query_rows in zip(query_embeddings, rows)
+            ]
+        return [
+            self._to_nodes(
+                self._cut(self._fuse(query, query_hits, query_rows), query_hits)
+            )
+            for query, query_hits, query_rows in zip(queries, hits, rows)
+        ]
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different messages share an entry."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class PersistentTTLCache:
+    """
+    Bounded LRU + TTL cache of JSON-serializable values, optionally
+    persisted to a SQLite table.
+
+    Keys hash the template version with the caller's key parts, so a new
+    template version invalidates every entry. With a SQLite path, entries
+    also persist across restarts; rows from other template versions or
+    past their TTL are dropped when the database is opened. Subclasses
+    build keys with ``_make_key`` and read and write through ``_lookup``
+    and ``_store``.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        template_version: str,
+        max_entries: int = 1024,
+        ttl_minutes: int = 60,
+        path: Optional[str] = None,
+    ):
+        self._table = table
+        self._template_version = template_version
+        self._max_entries = max(1, max_entries)
+        self._ttl_seconds = ttl_minutes * 60
+        self._cache: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._db = self._open_db(path) if path else None
+
+    def _open_db(self, path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} ("
+            "key TEXT PRIMARY KEY, template_version TEXT NOT NULL, "
+            "value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        removed = db.execute(
+            f"DELETE FROM {self._table} WHERE template_version != ? OR created_at < ?",
+            (self._template_version, time.time() - self._ttl_seconds),
+        ).rowcount
+        db.commit()
+        logger.info(
+            f"Opened {self._table} cache at {path}, removed {removed} stale rows"
+        )
+        return db
+
+    def _make_key(self, *parts: str) -> str:
+        key_string = "\0".join([self._template_version, *parts])
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, created_at FROM {self._table} WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._cache[key] = entry
+
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self._ttl_seconds:
+                    self._cache.move_to_end(key)
+                    self._evict()
+                    self._hits += 1
+                    return value
+                self._delete(key)
+
+            self._misses += 1
+            return None
+
+    def _store(self, key: str, value: Any):
+        created_at = time.time()
+
+        with self._lock:
+            self._cache[key] = (value, created_at)
+            self._cache.move_to_end(key)
+            self._evict()
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self._table} VALUES (?, ?, ?, ?)",
+                    (key, self._template_version, json.dumps(value), created_at),
+                )
+                self._db.commit()
+
+    def _delete(self, key: str):
+        self._cache.pop(key, None)
+        if self._db is not None:
+            self._db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict(self):
+        # Only the in-memory LRU is bounded; SQLite rows expire by TTL
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "max_entries": self._max_entries,
+                "ttl_minutes": self._ttl_seconds / 60,
+                "persistent": self._db is not None,
+                "template_version": self._template_version,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def clear(self):
+        """Drop every entry, including persisted ones."""
+        with self._lock:
+            self._cache.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self._table}")
+                self._db.commit()
+        logger.info(f"Cleared {self._table} cache")
@@ -0,0 +1,328 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import logging
+import os
+import uuid
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import (
+    SimpleVectorStore,
+    _build_metadata_filter_fn,
+)
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_NAME = "default__vector_store"
+LEGACY_VECTOR_STORE_FILE = f"{VECTOR_STORE_NAME}.json"
+SUPPORTED_DTYPES = ("float32", "float16")
+SCAN_BLOCK_ROWS = 65536
+
+
+def vector_store_files(namespace: str = VECTOR_STORE_NAME) -> List[str]:
+    """
+    File names that make up a persisted MmapVectorStore. The id table
+    names the matrix file it belongs to, so it is the only fixed name.
+    """
+    return [f"{namespace}.ids.json"]
+
+
+def _matrix_file(namespace: str, table: Dict[str, Any]) -> str:
+    # Stores persisted before the id table named its matrix use a fixed name
+    return table.get("matrix_file", f"{namespace}.npy")
+
+
+def matrix_scores(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    ``matrix @ queries`` for float32 queries. A matrix stored at lower
+    precision is upcast one block of rows at a time rather than whole.
+    """
+    if matrix.dtype == queries.dtype:
+        return matrix @ queries
+    scores = np.empty((len(matrix),) + queries.shape[1:], dtype=queries.dtype)
+    for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+        block = matrix[start : start + SCAN_BLOCK_ROWS]
+        scores[start : start + len(block)] = block.astype(queries.dtype) @ queries
+    return scores
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length, leaving all-zero rows unchanged."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store persisted as a binary embedding matrix.
+
+    Embeddings are L2-normalized and saved as a float32 or float16 ``.npy``
+    matrix next to a JSON table of node ids, ref doc ids and metadata. On
+    load the matrix is memory-mapped read-only, so startup does not parse
+    any floats and every worker process shares the same page cache.
+    Cosine similarity is then a single matrix-vector product.
+
+    Adding or deleting nodes copies the matrix into memory; persisting
+    writes a new matrix file and then atomically replaces the id table,
+    which names the matrix it belongs to.
+    """
+
+    stores_text: bool = False
+    flat_metadata: bool = False
+    dtype: str = "float32"
+
+    _matrix: np.ndarray = PrivateAttr()
+    _node_ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[str] = PrivateAttr()
+    _metadata: List[Dict[str, Any]] = PrivateAttr()
+    _positions: Dict[str, int] = PrivateAttr()
+
+    def __init__(
+        self,
+        dtype: str = "float32",
+        matrix: Optional[np.ndarray] = None,
+        node_ids: Optional[List[str]] = None,
+        ref_doc_ids: Optional[List[str]] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> None:
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(
+                f"Unsupported vector dtype {dtype!r}, use {SUPPORTED_DTYPES}"
+            )
+        super().__init__(dtype=dtype, **kwargs)
+        self._matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=dtype)
+        self._node_ids = list(node_ids or [])
+        self._ref_doc_ids = list(ref_doc_ids or [])
+        self._metadata = list(metadata or [{} for _ in self._node_ids])
+        self._positions = {node_id: i for i, node_id in enumerate(self._node_ids)}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The normalized embedding matrix, one row per node."""
+        return self._matrix
+
+    @property
+    def node_ids(self) -> List[str]:
+        return self._node_ids
+
+    @classmethod
+    def exists(cls, persist_dir: str, namespace: str = VECTOR_STORE_NAME) -> bool:
+        ids_path = Path(persist_dir) / vector_store_files(namespace)[0]
+        if not ids_path.exists():
+            return False
+        with ids_path.open(encoding="utf-8") as f:
+            table = json.load(f)
+        return (Path(persist_dir) / _matrix_file(namespace, table)).exists()
+
+    @classmethod
+    def from_persist_dir(
+        cls, persist_dir: str, namespace: str = VECTOR_STORE_NAME
+    ) -> "MmapVectorStore":
+        """Memory-map a persisted store."""
+        ids_path = Path(persist_dir) / vector_store_files(namespace)[0]
+        with ids_path.open(encoding="utf-8") as f:
+            table = json.load(f)
+        matrix_path = Path(persist_dir) / _matrix_file(namespace, table)
+        matrix = np.load(matrix_path, mmap_mode="r")
+        logger.info(
+            f"Memory-mapped {matrix.shape[0]} {matrix.dtype} vectors from {matrix_path}"
+        )
+        return cls(
+            dtype=str(matrix.dtype),
+            matrix=matrix,
+            node_ids=table["node_ids"],
+            ref_doc_ids=table["ref_doc_ids"],
+            metadata=table["metadata"],
+        )
+
+    @classmethod
+    def from_simple_vector_store(
+        cls, simple_store: SimpleVectorStore, dtype: str = "float32"
+    ) -> "MmapVectorStore":
+        """Convert a JSON-persisted SimpleVectorStore."""
+        data = simple_store.data
+        node_ids = list(data.embedding_dict.keys())
+        matrix = (
+            normalize_rows(
+                np.array([data.embedding_dict[i] for i in node_ids], dtype=np.float32)
+            ).astype(dtype)
+            if node_ids
+            else None
+        )
+        return cls(
+            dtype=dtype,
+            matrix=matrix,
+            node_ids=node_ids,
+            ref_doc_ids=[data.text_id_to_ref_doc_id.get(i, "None") for i in node_ids],
+            metadata=[(data.metadata_dict or {}).get(i, {}) for i in node_ids],
+        )
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Persist next to ``persist_path``.
+
+        The storage context passes the legacy ``default__vector_store.json``
+        path; the matrix and id table are written beside it instead.
+        """
+        persist_dir = Path(persist_path).parent
+        namespace = Path(persist_path).name.removesuffix(".json")
+        persist_dir.mkdir(parents=True, exist_ok=True)
+        ids_path = persist_dir / vector_store_files(namespace)[0]
+        previous = None
+        if ids_path.exists():
+            with ids_path.open(encoding="utf-8") as f:
+                previous = _matrix_file(namespace, json.load(f))
+
+        # The matrix goes to a new file and the id table naming it is
+        # swapped in with one rename, so a process loading concurrently
+        # sees either the old pair or the new one, never a mix
+        matrix_file = f"{namespace}.matrix-{uuid.uuid4().hex}.npy"
+        np.save(
+            persist_dir / matrix_file,
+            np.ascontiguousarray(self._matrix, dtype=self.dtype),
+        )
+        ids_tmp = ids_path.with_suffix(".tmp")
+        with ids_tmp.open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "matrix_file": matrix_file,
+                    "node_ids": self._node_ids,
+                    "ref_doc_ids": self._ref_doc_ids,
+                    "metadata": self._metadata,
+                },
+                f,
+            )
+        os.replace(ids_tmp, ids_path)
+
+        # Keep the previous matrix for processes that read the old id table
+        # just before the swap; processes that have a matrix mapped keep
+        # reading it after it is unlinked
+        stale = [*persist_dir.glob(f"{namespace}.matrix-*.npy")]
+        stale.append(persist_dir / f"{namespace}.npy")
+        for path in stale:
+            if path.name not in (matrix_file, previous) and path.exists():
+                path.unlink()
+        logger.info(f"Persisted {len(self._node_ids)} vectors to {matrix_file}")
+
+    def get(self, text_id: str) -> List[float]:
+        """Get the (normalized) embedding of a node."""
+        return self._matrix[self._positions[text_id]].astype(np.float32).tolist()
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes to the store."""
+        if not nodes:
+            return []
+
+        new_rows = normalize_rows(
+            np.array([node.get_embedding() for node in nodes], dtype=np.float32)
+        ).astype(self.dtype)
+        if self._matrix.size:
+            self._matrix = np.concatenate([self._matrix, new_rows])
+        else:
+            self._matrix = new_rows
+
+        for node in nodes:
+            metadata = node_to_metadata_dict(
+                node, remove_text=True, flat_metadata=False
+            )
+            metadata.pop("_node_content", None)
+            self._positions[node.node_id] = len(self._node_ids)
+            self._node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id or "None")
+            self._metadata.append(metadata)
+        return [node.node_id for node in nodes]
+
+    def _keep_rows(self, keep: np.ndarray) -> None:
+        self._matrix = np.asarray(self._matrix[keep])
+        self._node_ids = [i for i, k in zip(self._node_ids, keep) if k]
+        self._ref_doc_ids = [r for r, k in zip(self._ref_doc_ids, keep) if k]
+        self._metadata = [m for m, k in zip(self._metadata, keep) if k]
+        self._positions = {node_id: i for i, node_id in enumerate(self._node_ids)}
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete all nodes of a document."""
+        keep = np.array([r != ref_doc_id for r in self._ref_doc_ids], dtype=bool)
+        if not keep.all():
+            self._keep_rows(keep)
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        """Delete nodes by id and/or metadata filters."""
+        candidates = self._candidate_mask(node_ids, filters)
+        if candidates.any():
+            self._keep_rows(~candidates)
+
+    def clear(self) -> None:
+        self._keep_rows(np.zeros(len(self._node_ids), dtype=bool))
+
+    def _candidate_mask(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+    ) -> np.ndarray:
+        mask = np.ones(len(self._node_ids), dtype=bool)
+        if node_ids is not None:
+            allowed = set(node_ids)
+            mask &= np.array([i in allowed for i in self._node_ids], dtype=bool)
+        if filters is not None:
+            filter_fn = _build_metadata_filter_fn(
+                lambda node_id: self._metadata[self._positions[node_id]], filters
+            )
+            mask &= np.array([filter_fn(i) for i in self._node_ids], dtype=bool)
+        return mask
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Return the most similar nodes by cosine similarity."""
+        if not self._node_ids or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        query_vector = np.array(query.query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        similarities = matrix_scores(self._matrix, query_vector)
+
+        candidates = None
+        if query.node_ids is not None or query.filters is not None:
+            candidates = np.flatnonzero(
+                self._candidate_mask(query.node_ids, query.filters)
+            )
+            similarities = similarities[candidates]
+
+        top = top_k_indices(similarities, query.similarity_top_k)
+        rows = top if candidates is None else candidates[top]
+
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(similarities[i]) for i in top],
+            ids=[self._node_ids[row] for row in rows],
+        )
@@ -0,0 +1,47 @@
+import numpy as np
+from src.llamaindex_app.ann_index import IVFIndex, recall_at_k
+from src.llamaindex_app.retrieval import VectorSearchEngine
+from src.llamaindex_app.vector_store import normalize_rows
+
+TOP_K = 10
+
+
+def _fixture(seed=0, num_nodes=4000, dim=32, num_queries=100):
+    # Clustered like chunk embeddings, with queries near existing chunks
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_nodes // 100, dim))
+    labels = rng.integers(len(centers), size=num_nodes)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(num_nodes, dim))
+    matrix = normalize_rows(vectors.astype(np.float32))
+    rows = rng.integers(num_nodes, size=num_queries)
+    queries = matrix[rows] + 0.3 * rng.normal(size=(num_queries, dim))
+    return matrix, [str(i) for i in range(num_nodes)], queries.astype(np.float32)
+
+
+def _search(engine, queries):
+    return [[node_id for node_id, _ in engine.search(q, TOP_K)] for q in queries]
+
+
+def test_recall_at_k():
+    assert recall_at_k([["a", "b"], ["c", "d"]], [["b", "a"], ["c", "x"]]) == 0.75
+    assert recall_at_k([], []) == 1.0
+
+
+def test_ivf_recall_grows_with_probes():
+    matrix, node_ids, queries = _fixture()
+    ann = IVFIndex.build(matrix, n_lists=32)
+    assert ann.offsets[-1] == len(matrix)
+    assert sorted(ann.order) == list(range(len(matrix)))
+
+    exact = _search(VectorSearchEngine(matrix, node_ids), queries)
+    recalls = [
+        recall_at_k(
+            exact,
+            _search(VectorSearchEngine(matrix, node_ids, ann, n_probe), queries),
+        )
+        for n_probe in (1, 4, 8, 32)
+    ]
+    assert recalls == sorted(recalls)
+    assert recalls[2] >= 0.95
+    # Probing every list is exact search
+    assert recalls[-1] == 1.0
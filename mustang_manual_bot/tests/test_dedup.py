@@ -0,0 +1,84 @@
+import numpy as np
+from llama_index.core.schema import MetadataMode, TextNode
+from src.llamaindex_app.dedup import NearDuplicateFilter, node_sources, spec_numbers
+from src.llamaindex_app.metadata_index import node_filter_values
+
+WHEEL_CHANGE = (
+    "To change a flat tire, park on a level surface, switch on the hazard "
+    "flashers and apply the parking brake. Remove the spare tire, the jack "
+    "and the lug wrench from the luggage compartment. Loosen each wheel lug "
+    "nut half a turn counterclockwise before raising the vehicle. Place the "
+    "jack at the jacking point nearest the flat tire and raise the vehicle "
+    "until the tire clears the ground. Remove the lug nuts and the wheel, "
+    "install the spare and hand tighten the lug nuts. Lower the vehicle, "
+    "remove the jack and fully tighten the lug nuts in a crisscross "
+    "sequence to {torque} lb-ft. Have the wheel lug nut torque checked "
+    "again after the first fifty miles, and stow the flat tire, the jack "
+    "and the lug wrench securely before driving."
+)
+
+
+def _node(torque, file_name=None, page=None):
+    metadata = {}
+    if file_name:
+        metadata = {"file_name": file_name, "page_label": page}
+    return TextNode(text=WHEEL_CHANGE.format(torque=torque), metadata=metadata)
+
+
+def test_identical_chunks_are_merged_across_years():
+    dedup = NearDuplicateFilter()
+    kept = dedup.add([_node(150)], year=2018)
+    assert dedup.add([_node(150)], year=2019) == []
+    assert kept[0].metadata["model_years"] == [2018, 2019]
+
+
+def test_chunks_differing_only_by_a_spec_value_are_kept():
+    dedup = NearDuplicateFilter()
+    first, second = _node(150), _node(165)
+    # Similar enough to be merged on MinHash alone
+    similarity = np.mean(
+        dedup.signature(first.text) == dedup.signature(second.text)
+    )
+    assert similarity >= dedup.threshold
+
+    dedup.add([first], year=2018)
+    assert dedup.add([second], year=2019) == [second]
+    assert first.metadata["model_years"] == [2018]
+    assert second.metadata["model_years"] == [2019]
+
+
+def test_spec_numbers_ignore_model_years():
+    assert spec_numbers("2019 Mustang: 5W-20 oil, 8.0 quarts") == (
+        "0",
+        "20",
+        "5w",
+        "8",
+    )
+
+
+def test_canonical_node_keeps_every_source():
+    dedup = NearDuplicateFilter()
+    (canonical,) = dedup.add([_node(150, "2018-Mustang.pdf", "212")], year=2018)
+    dedup.add([_node(150, "2019-Mustang.pdf", "230")], year=2019)
+    dedup.add([_node(150, "2019-Mustang.pdf", "230")], year=2019)
+
+    assert canonical.metadata["file_name"] == "2018-Mustang.pdf"
+    assert canonical.metadata["source_files"] == [
+        "2018-Mustang.pdf",
+        "2019-Mustang.pdf",
+    ]
+    assert canonical.metadata["source_pages"] == ["212", "230"]
+    assert node_sources(canonical.metadata) == [
+        "2018-Mustang.pdf",
+        "2019-Mustang.pdf",
+    ]
+    assert node_filter_values(canonical.metadata) == {"model_year": ["2018", "2019"]}
+
+    embedded = canonical.get_content(metadata_mode=MetadataMode.EMBED)
+    assert "2019-Mustang.pdf" not in embedded
+    assert "230" not in embedded
+
+
+def test_node_sources_of_a_plain_node():
+    assert node_sources({"file_name": "2020-Mustang.pdf"}) == ["2020-Mustang.pdf"]
+    assert node_sources({}) == ["Unknown source"]
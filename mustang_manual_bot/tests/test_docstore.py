@@ -0,0 +1,59 @@
+import json
+from llama_index.core.schema import TextNode
+from src.llamaindex_app.docstore import SQLiteDocumentStore, SQLiteKVStore
+
+
+def test_put_get_delete(tmp_path):
+    kvstore = SQLiteKVStore(str(tmp_path / "kv.sqlite"))
+    kvstore.put("a", {"text": "one"})
+    kvstore.put("a", {"text": "two"}, collection="other")
+
+    assert kvstore.get("a") == {"text": "one"}
+    assert kvstore.get("a", collection="other") == {"text": "two"}
+    assert kvstore.get_all() == {"a": {"text": "one"}}
+    assert kvstore.delete("a")
+    assert not kvstore.delete("a")
+    assert kvstore.get("a") is None
+    assert kvstore.get("a", collection="other") == {"text": "two"}
+
+
+def test_cache_is_bounded_and_invalidated_by_writes(tmp_path):
+    kvstore = SQLiteKVStore(str(tmp_path / "kv.sqlite"), cache_size=2)
+    kvstore.put_all([(key, {"key": key}) for key in "abc"])
+    for key in "abca":
+        kvstore.get(key)
+    # "b" is the least recently read key and was evicted
+    assert [key for _, key in kvstore._cache] == ["c", "a"]
+
+    kvstore.get("a")["key"] = "mutated"
+    assert kvstore.get("a") == {"key": "a"}
+    kvstore.put("a", {"key": "new"})
+    assert kvstore.get("a") == {"key": "new"}
+
+
+def test_move_reopens_the_database(tmp_path):
+    kvstore = SQLiteKVStore(str(tmp_path / "building.sqlite"))
+    kvstore.put("a", {"text": "one"})
+    kvstore.move(str(tmp_path / "docstore.sqlite"))
+
+    assert not (tmp_path / "building.sqlite").exists()
+    assert kvstore.get("a") == {"text": "one"}
+    kvstore.put("b", {"text": "two"})
+    assert SQLiteKVStore(str(tmp_path / "docstore.sqlite")).get("b") == {"text": "two"}
+
+
+def test_from_docstore_json(tmp_path):
+    node = TextNode(id_="node-1", text="Check the oil level.")
+    json_path = tmp_path / "docstore.json"
+    json_path.write_text(
+        json.dumps(
+            {"docstore/data": {"node-1": {"__data__": node.to_dict(), "__type__": "1"}}}
+        )
+    )
+
+    docstore = SQLiteDocumentStore.from_docstore_json(
+        str(json_path), str(tmp_path / "docstore.sqlite")
+    )
+    assert SQLiteDocumentStore.exists(str(tmp_path))
+    assert not (tmp_path / "docstore.sqlite.tmp").exists()
+    assert docstore.get_node("node-1").get_content() == "Check the oil level."
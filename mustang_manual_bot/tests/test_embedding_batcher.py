@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import numpy as np
+import pytest
+import llama_index.embeddings.huggingface.base as huggingface_base
+from llama_index.core.callbacks import CallbackManager, CBEventType, LlamaDebugHandler
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from src.llamaindex_app.embedding_batcher import QueryEmbeddingBatcher, embed_queries
+
+QUERIES = [f"how do I check the oil level {i}" for i in range(12)]
+
+
+class _SentenceTransformer:
+    """Records each forward pass; the embedding encodes the prompted text."""
+
+    def __init__(self, model_name, prompts=None, **kwargs):
+        self.prompts = prompts or {}
+        self.max_seq_length = 512
+        self.forward_passes = []
+        self._lock = threading.Lock()
+
+    def encode(self, inputs, prompt_name=None, **kwargs):
+        texts = [self.prompts.get(prompt_name, "") + text for text in inputs]
+        with self._lock:
+            self.forward_passes.append(texts)
+        return np.array([[len(text), sum(map(ord, text))] for text in texts], float)
+
+
+@pytest.fixture
+def embed_model(monkeypatch):
+    monkeypatch.setattr(huggingface_base, "SentenceTransformer", _SentenceTransformer)
+    return HuggingFaceEmbedding(
+        model_name="BAAI/bge-small-en-v1.5",
+        embed_batch_size=8,
+        callback_manager=CallbackManager([LlamaDebugHandler()]),
+    )
+
+
+def test_embed_queries_matches_query_embeddings(embed_model):
+    expected = [embed_model.get_query_embedding(query) for query in QUERIES[:3]]
+    embed_model._model.forward_passes.clear()
+
+    assert embed_queries(embed_model, QUERIES[:3]) == expected
+    assert len(embed_model._model.forward_passes) == 1
+    # The batch goes through the public API, so embedding callbacks fire
+    handler = embed_model.callback_manager.handlers[0]
+    assert len(handler.get_event_pairs(CBEventType.EMBEDDING)) == 4
+
+
+def test_concurrent_queries_are_batched(embed_model):
+    expected = {query: embed_model.get_query_embedding(query) for query in QUERIES}
+    embed_model._model.forward_passes.clear()
+    batcher = QueryEmbeddingBatcher(window_ms=200, max_batch_size=16)
+
+    start = threading.Barrier(len(QUERIES))
+
+    def embed(query):
+        start.wait()
+        return batcher.get_query_embedding(embed_model, query)
+
+    with ThreadPoolExecutor(max_workers=len(QUERIES)) as pool:
+        embeddings = list(pool.map(embed, QUERIES))
+
+    assert embeddings == [expected[query] for query in QUERIES]
+    forward_passes = embed_model._model.forward_passes
+    # Twelve queries fit in two passes of at most embed_batch_size
+    assert len(forward_passes) < len(QUERIES)
+    assert max(len(texts) for texts in forward_passes) <= embed_model.embed_batch_size
+    stats = batcher.get_stats()
+    assert stats["batches"] == len(forward_passes)
+    assert stats["queries"] == len(QUERIES)
+    assert stats["largest_batch"] == max(len(texts) for texts in forward_passes)
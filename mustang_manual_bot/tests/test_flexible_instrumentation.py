@@ -0,0 +1,118 @@
+import logging
+import pytest
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from src.llamaindex_app import flexible_instrumentation
+from src.llamaindex_app.flexible_instrumentation import (
+    FlexibleInstrumentation,
+    TracerConfig,
+    _TenantPipeline,
+)
+
+TENANT_A = TracerConfig(space_id="space", api_key="key", model_id="model-a")
+TENANT_B = TracerConfig(space_id="space", api_key="key", model_id="model-b")
+
+
+class _Instrumentor:
+    def instrument(self, **kwargs):
+        pass
+
+    def uninstrument(self):
+        pass
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    # Routing is under test, not the LlamaIndex and OpenAI instrumentation
+    for name in ("LlamaIndexInstrumentor", "OpenAIInstrumentor"):
+        monkeypatch.setattr(flexible_instrumentation, name, _Instrumentor)
+
+    manager = FlexibleInstrumentation(max_tenants=1)
+    manager.exporters = {}  # model_id -> exporters, one per pipeline created
+
+    def create_pipeline(config):
+        exporter = InMemorySpanExporter()
+        manager.exporters.setdefault(config.model_id, []).append(exporter)
+        resource = Resource(attributes={"model_id": config.model_id})
+        tracer_provider = TracerProvider(resource=resource)
+        span_processor = SimpleSpanProcessor(exporter)
+        tracer_provider.add_span_processor(span_processor)
+        return _TenantPipeline(resource, tracer_provider, span_processor)
+
+    monkeypatch.setattr(manager, "_create_pipeline", create_pipeline)
+    manager.configure(TracerConfig())  # Local-only default tenant
+    yield manager
+    manager.shutdown()
+
+
+def _exported(manager, model_id):
+    return [
+        (span.name, span.resource.attributes["model_id"])
+        for exporter in manager.exporters.get(model_id, [])
+        for span in exporter.get_finished_spans()
+    ]
+
+
+def test_spans_are_routed_to_their_tenant(manager):
+    tracer = manager.get_tracer()
+    with manager.use_tenant(TENANT_A):
+        with tracer.start_as_current_span("a") as span_a:
+            # No tenant in this context: the child inherits its parent's
+            child_context = trace.set_span_in_context(span_a, otel_context.Context())
+            tracer.start_span("a-child", context=child_context).end()
+    with manager.use_tenant(TENANT_B):
+        tracer.start_span("b").end()
+    tracer.start_span("local").end()
+
+    assert _exported(manager, "model-a") == [
+        ("a-child", "model-a"),
+        ("a", "model-a"),
+    ]
+    assert _exported(manager, "model-b") == [("b", "model-b")]
+
+
+def test_tenant_evicted_before_span_start_is_registered_again(manager, caplog):
+    tracer = manager.get_tracer()
+    context_a = manager.get_tenant_context(TENANT_A)
+    # Registering B evicts the idle tenant A
+    manager.get_tenant_context(TENANT_B)
+    assert manager._get_pipeline(TENANT_A.tenant_key()) is None
+
+    with caplog.at_level(logging.WARNING):
+        tracer.start_span("a", context=context_a).end()
+
+    assert _exported(manager, "model-a") == [("a", "model-a")]
+    assert len(manager.exporters["model-a"]) == 2
+    assert "Dropping span" not in caplog.text
+
+
+def test_tenant_with_spans_in_flight_is_not_evicted(manager):
+    tracer = manager.get_tracer()
+    span_a = tracer.start_span("a", context=manager.get_tenant_context(TENANT_A))
+    manager.get_tenant_context(TENANT_B)
+    assert manager.get_tenant_count() == 2
+
+    span_a.end()
+    assert _exported(manager, "model-a") == [("a", "model-a")]
+    assert len(manager.exporters["model-a"]) == 1
+
+
+def test_span_without_pipeline_is_logged(manager, caplog):
+    tracer = manager.get_tracer()
+    context = otel_context.set_value(
+        flexible_instrumentation._TENANT_CONTEXT_KEY, TENANT_A.tenant_key()
+    )
+
+    with caplog.at_level(logging.WARNING):
+        tracer.start_span("orphan", context=context).end()
+        tracer.start_span("local").end()
+
+    assert "Dropping span 'orphan'" in caplog.text
+    assert "'local'" not in caplog.text
+    assert manager.exporters == {}
@@ -0,0 +1,38 @@
+from src.llamaindex_app.ann_index import corpus_fingerprint
+from src.llamaindex_app.ingestion import parse_file
+
+MANUAL = (
+    "Check the tire pressure when the tires are cold. "
+    "The recommended pressure is {pressure} psi for the front tires. "
+    "Tighten the lug nuts to 150 lb-ft in a star pattern."
+)
+
+
+def _parse(tmp_path, pressure):
+    path = tmp_path / "2018-Ford-Mustang-Owners-Manual.txt"
+    path.write_text(MANUAL.format(pressure=pressure))
+    return parse_file(str(path), chunk_size=512, chunk_overlap=0)
+
+
+def test_node_ids_are_stable_across_parses(tmp_path):
+    first = _parse(tmp_path, 35)
+    second = _parse(tmp_path, 35)
+    assert [node.node_id for node in first] == [node.node_id for node in second]
+
+
+def test_revised_text_with_same_chunk_count_changes_fingerprint(tmp_path):
+    original = _parse(tmp_path, 35)
+    revised = _parse(tmp_path, 38)
+
+    assert len(original) == len(revised)
+    assert corpus_fingerprint([node.node_id for node in original]) != (
+        corpus_fingerprint([node.node_id for node in revised])
+    )
+
+
+def test_node_relationships_use_content_addressed_ids(tmp_path):
+    nodes = _parse(tmp_path, 35)
+    node_ids = {node.node_id for node in nodes}
+    for node in nodes:
+        for related in (node.prev_node, node.next_node):
+            assert related is None or related.node_id in node_ids
@@ -0,0 +1,59 @@
+import numpy as np
+from src.llamaindex_app.lexical_index import (
+    BM25Index,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+TEXTS = [
+    "Torque the lug nuts to 100 lb-ft.",
+    "Use 5W-20 oil; capacity is 8.0 quarts.",
+    "The spare tire is under the cargo floor. Check the tire pressure.",
+]
+NODE_IDS = ["lug", "oil", "tire"]
+
+
+def test_tokenize_keeps_numbers_and_identifiers_whole():
+    tokens = tokenize("Part 1915.12 of the 10-K, 5W-20")
+    assert tokens == ["part", "1915.12", "10-k", "5w-20"]
+
+
+def test_search_ranks_by_bm25():
+    index = BM25Index.build(TEXTS, NODE_IDS)
+    hits = index.search("tire pressure", top_k=3)
+    assert [node_id for node_id, _ in hits] == ["tire"]
+    assert index.search("5W-20 capacity", top_k=3)[0][0] == "oil"
+    assert index.search("unknown words", top_k=3) == []
+
+
+def test_search_within_rows():
+    index = BM25Index.build(TEXTS, NODE_IDS)
+    hits = index.search("tire oil", top_k=3, rows=np.array([1]))
+    assert [node_id for node_id, _ in hits] == ["oil"]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(TEXTS, NODE_IDS)
+    index.save(str(tmp_path))
+    loaded = BM25Index.load_or_build(str(tmp_path), NODE_IDS, load_texts=None)
+
+    assert loaded.fingerprint == index.fingerprint
+    assert loaded.search("lug nuts", top_k=2) == index.search("lug nuts", top_k=2)
+
+
+def test_load_or_build_rebuilds_for_a_new_corpus(tmp_path):
+    BM25Index.build(TEXTS, NODE_IDS).save(str(tmp_path))
+    rebuilt = BM25Index.load_or_build(
+        str(tmp_path), ["lug", "oil"], lambda ids: TEXTS[: len(ids)]
+    )
+    assert rebuilt.node_ids == ["lug", "oil"]
+    assert rebuilt.search("tire", top_k=3) == []
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion(
+        [[("a", 0.9), ("b", 0.8)], [("b", 12.0), ("c", 3.0)]], top_k=3, k=60
+    )
+    assert [node_id for node_id, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+    assert reciprocal_rank_fusion([[("a", 1.0)], []], top_k=0) == []
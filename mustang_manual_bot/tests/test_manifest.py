@@ -0,0 +1,78 @@
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from src.llamaindex_app.docstore import SQLiteDocumentStore
+from src.llamaindex_app.ingestion import embed_nodes, parse_file
+from src.llamaindex_app.manifest import IngestionManifest, replace_file_nodes
+from src.llamaindex_app.vector_store import MmapVectorStore
+
+EMBED_MODEL = MockEmbedding(embed_dim=8)
+
+
+def _parse(file_path):
+    return embed_nodes(parse_file(str(file_path), 256, 0), EMBED_MODEL, None)
+
+
+def _build(tmp_path, files):
+    storage_context = StorageContext.from_defaults(
+        vector_store=MmapVectorStore(),
+        docstore=SQLiteDocumentStore(str(tmp_path / "docstore.sqlite")),
+    )
+    nodes_by_file = {str(path): _parse(path) for path in files}
+    index = VectorStoreIndex(
+        [node for nodes in nodes_by_file.values() for node in nodes],
+        storage_context=storage_context,
+        embed_model=EMBED_MODEL,
+    )
+    manifest = IngestionManifest()
+    for file_path, nodes in nodes_by_file.items():
+        manifest.record(file_path, [node.node_id for node in nodes])
+    return index, manifest
+
+
+def test_changed_file_nodes_are_replaced(tmp_path):
+    oil = tmp_path / "oil.txt"
+    tires = tmp_path / "tires.txt"
+    oil.write_text("Check the engine oil level with the dipstick.")
+    tires.write_text("Inflate the tires to the pressure on the door label.")
+    index, manifest = _build(tmp_path, [oil, tires])
+    old_oil_ids = manifest.node_ids("oil.txt")
+    tire_ids = manifest.node_ids("tires.txt")
+
+    oil.write_text("Use 5W-20 engine oil and replace the filter yearly.")
+    changed, removed = manifest.diff([str(oil), str(tires)])
+    assert (changed, removed) == ([str(oil)], [])
+    replace_file_nodes(index, manifest, {str(oil): _parse(oil)}, removed)
+
+    new_oil_ids = manifest.node_ids("oil.txt")
+    assert new_oil_ids and not set(new_oil_ids) & set(old_oil_ids)
+    assert manifest.node_ids("tires.txt") == tire_ids
+    docstore = index.docstore
+    vector_store = index.vector_store
+    for node_id in old_oil_ids:
+        assert docstore.get_document(node_id, raise_error=False) is None
+        assert node_id not in vector_store.node_ids
+        assert node_id not in index.index_struct.nodes_dict
+    for node_id in new_oil_ids + tire_ids:
+        assert docstore.get_node(node_id).node_id == node_id
+        assert node_id in vector_store.node_ids
+        assert node_id in index.index_struct.nodes_dict
+    assert "5W-20" in docstore.get_node(new_oil_ids[0]).get_content()
+    assert "tires" in docstore.get_node(tire_ids[0]).get_content()
+
+
+def test_removed_file_nodes_are_deleted(tmp_path):
+    oil = tmp_path / "oil.txt"
+    tires = tmp_path / "tires.txt"
+    oil.write_text("Check the engine oil level with the dipstick.")
+    tires.write_text("Inflate the tires to the pressure on the door label.")
+    index, manifest = _build(tmp_path, [oil, tires])
+    oil_ids = manifest.node_ids("oil.txt")
+    tire_ids = manifest.node_ids("tires.txt")
+
+    changed, removed = manifest.diff([str(tires)])
+    assert (changed, removed) == ([], ["oil.txt"])
+    replace_file_nodes(index, manifest, {}, removed)
+
+    assert list(manifest.files) == ["tires.txt"]
+    assert all(node_id not in index.vector_store.node_ids for node_id in oil_ids)
+    assert all(node_id in index.vector_store.node_ids for node_id in tire_ids)
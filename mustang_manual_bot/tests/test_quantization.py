@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from src.llamaindex_app.quantization import QuantizedMatrix
+from src.llamaindex_app.retrieval import VectorSearchEngine
+from src.llamaindex_app.vector_store import normalize_rows
+
+
+def _fixture(seed=0, num_nodes=500, dim=32, num_queries=20):
+    rng = np.random.default_rng(seed)
+    matrix = normalize_rows(rng.normal(size=(num_nodes, dim))).astype(np.float32)
+    queries = rng.normal(size=(num_queries, dim)).astype(np.float32)
+    return matrix, [f"node-{i}" for i in range(num_nodes)], queries
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_rescored_scan_matches_float32_top_k(dtype):
+    matrix, node_ids, queries = _fixture()
+    exact = VectorSearchEngine(matrix, node_ids)
+    quantized = VectorSearchEngine(
+        matrix, node_ids, quantized=QuantizedMatrix.quantize(matrix, dtype), rescore=4
+    )
+    for query in queries:
+        expected = exact.search(query, top_k=10)
+        hits = quantized.search(query, top_k=10)
+        assert [node_id for node_id, _ in hits] == [i for i, _ in expected]
+        np.testing.assert_allclose(
+            [score for _, score in hits], [score for _, score in expected], rtol=1e-6
+        )
+
+
+def test_int8_codes_round_trip_within_one_step():
+    matrix, _, _ = _fixture()
+    quantized = QuantizedMatrix.quantize(matrix, "int8")
+    error = np.abs(quantized.codes * quantized.scales - matrix)
+    assert (error <= quantized.scales / 2 + 1e-7).all()
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+import math
+import numpy as np
+from llama_index.core import QueryBundle
+from llama_index.core.schema import TextNode
+from src.llamaindex_app.lexical_index import BM25Index
+from src.llamaindex_app.retrieval import (
+    EngineRetriever,
+    VectorSearchEngine,
+    adaptive_cutoff,
+)
+
+TEXTS = {
+    "oil": "Check the engine oil level with the dipstick.",
+    "seat": "Adjust the seat with the lever under the cushion.",
+    "wheel": "Tighten the wheel lug nuts to the specified torque.",
+    "wrench": "Use a torque wrench on the lug nuts.",
+}
+
+
+class _Docstore:
+    def __init__(self, nodes):
+        self._nodes = {node.node_id: node for node in nodes}
+
+    def get_nodes(self, node_ids):
+        return [self._nodes[node_id] for node_id in node_ids]
+
+
+def _retriever(similarities, **kwargs):
+    node_ids = list(TEXTS)
+    nodes = [TextNode(id_=node_id, text=TEXTS[node_id]) for node_id in node_ids]
+    index = SimpleNamespace(
+        docstore=_Docstore(nodes),
+        index_struct=SimpleNamespace(nodes_dict={}),
+        vector_store=None,
+        _embed_model=None,
+    )
+    # Unit rows at the given cosine similarity to the query [1, 0]
+    matrix = np.array(
+        [[s, math.sqrt(1 - s * s)] for s in similarities], dtype=np.float32
+    )
+    return EngineRetriever(
+        index,
+        engine=VectorSearchEngine(matrix, node_ids),
+        lexical=BM25Index.build([TEXTS[i] for i in node_ids], node_ids),
+        hybrid_candidates=4,
+        min_top_k=1,
+        max_top_k=4,
+        **kwargs,
+    )
+
+
+def _retrieve(retriever, query):
+    return retriever.retrieve(QueryBundle(query, embedding=[1.0, 0.0]))
+
+
+def test_adaptive_cutoff_keeps_one_dominant_hit():
+    assert adaptive_cutoff([0.9, 0.5, 0.45], min_k=1, max_k=3) == 1
+
+
+def test_hybrid_cutoff_keeps_dominant_vector_hit():
+    # The oil chunk dominates by vector similarity, so it is the one vector
+    # hit kept; the keyword hits fused above it come along, the rest do not
+    nodes = _retrieve(_retriever([0.95, 0.4, 0.5, 0.45]), "wheel lug torque")
+    assert [n.node.node_id for n in nodes] == ["wheel", "wrench", "oil"]
+
+
+def test_hybrid_cutoff_without_keyword_hits():
+    nodes = _retrieve(_retriever([0.95, 0.4, 0.5, 0.45]), "dipstick")
+    assert [n.node.node_id for n in nodes] == ["oil"]
+
+
+def test_hybrid_cutoff_keeps_close_vector_hits():
+    # Close vector similarities keep every hit, although the fused scores
+    # of the keyword hits are far above the vector-only ones
+    nodes = _retrieve(_retriever([0.9, 0.89, 0.88, 0.87]), "torque wrench")
+    assert len(nodes) == 4
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from src.llamaindex_app.ann_index import IVFIndex
+from src.llamaindex_app.quantization import QuantizedMatrix
+from src.llamaindex_app.retrieval import VectorSearchEngine
+from src.llamaindex_app.vector_store import normalize_rows
+
+NUM_NODES = 200
+DIM = 16
+
+
+def _fixture(seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(NUM_NODES, DIM))
+    # Every tenth row repeats the one before it, so scores tie
+    matrix[1::10] = matrix[::10]
+    matrix = normalize_rows(matrix).astype(np.float32)
+    queries = rng.normal(size=(10, DIM)).astype(np.float32)
+    return matrix, [f"node-{i}" for i in range(NUM_NODES)], queries
+
+
+def _brute_force(matrix, query, rows=None):
+    """Exact similarity of every candidate row, by row index."""
+    query = query / np.linalg.norm(query)
+    rows = np.arange(len(matrix)) if rows is None else rows
+    return {int(row): float(matrix[row].astype(np.float64) @ query) for row in rows}
+
+
+def _assert_matches(hits, similarities, node_ids, top_k):
+    """
+    Check hits against a full sort of the exact similarities. Rows tied at
+    the cutoff may come back in any order, so ids are compared as sets above
+    the lowest returned score.
+    """
+    expected = sorted(similarities.values(), reverse=True)[:top_k]
+    assert len(hits) == len(expected)
+    np.testing.assert_allclose([score for _, score in hits], expected, atol=1e-5)
+
+    rows = [node_ids.index(node_id) for node_id, _ in hits]
+    assert len(set(rows)) == len(rows)
+    for row, (_, score) in zip(rows, hits):
+        assert similarities[row] == pytest.approx(score, abs=1e-5)
+    if hits:
+        cutoff = hits[-1][1] + 1e-5
+        above = {row for row, similarity in similarities.items() if similarity > cutoff}
+        assert above <= set(rows)
+
+
+def _engine(matrix, node_ids, ann, quantized):
+    return VectorSearchEngine(
+        matrix,
+        node_ids,
+        # Probing every list and rescoring every candidate is exact search
+        ann=IVFIndex.build(matrix, n_lists=8) if ann else None,
+        n_probe=8,
+        quantized=QuantizedMatrix.quantize(matrix, quantized) if quantized else None,
+        rescore=len(node_ids),
+    )
+
+
+@pytest.mark.parametrize("top_k", [1, 5, NUM_NODES + 5])
+@pytest.mark.parametrize("quantized", [None, "float16", "int8"])
+@pytest.mark.parametrize("ann", [False, True])
+@pytest.mark.parametrize("filtered", [False, True])
+def test_search_matches_brute_force(filtered, ann, quantized, top_k):
+    matrix, node_ids, queries = _fixture()
+    engine = _engine(matrix, node_ids, ann, quantized)
+    rows = np.arange(0, NUM_NODES, 3) if filtered else None
+    for query in queries:
+        hits = engine.search(query, top_k, rows=rows)
+        _assert_matches(hits, _brute_force(matrix, query, rows), node_ids, top_k)
+
+
+def test_tied_rows_are_both_returned():
+    matrix, node_ids, _ = _fixture()
+    engine = VectorSearchEngine(matrix, node_ids)
+    hits = engine.search(matrix[10], top_k=2)
+    assert {node_id for node_id, _ in hits} == {"node-10", "node-11"}
+    np.testing.assert_allclose([score for _, score in hits], [1.0, 1.0], rtol=1e-6)
+
+
+@pytest.mark.parametrize("top_k", [3, NUM_NODES + 5])
+def test_search_batch_matches_brute_force(top_k):
+    matrix, node_ids, queries = _fixture()
+    results = VectorSearchEngine(matrix, node_ids).search_batch(queries, top_k)
+    assert len(results) == len(queries)
+    for query, hits in zip(queries, results):
+        _assert_matches(hits, _brute_force(matrix, query), node_ids, top_k)
+
+
+@pytest.mark.parametrize("quantized", [None, "int8"])
+def test_empty_store_and_empty_rows(quantized):
+    empty = VectorSearchEngine(np.zeros((0, DIM), dtype=np.float32), [])
+    assert empty.search(np.ones(DIM), top_k=3) == []
+    assert empty.search_batch(np.ones((2, DIM)), top_k=3) == [[], []]
+
+    matrix, node_ids, queries = _fixture()
+    engine = _engine(matrix, node_ids, False, quantized)
+    assert engine.search(queries[0], 3, rows=np.zeros(0, dtype=np.int64)) == []
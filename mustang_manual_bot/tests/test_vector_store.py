@@ -0,0 +1,47 @@
+import json
+import numpy as np
+from llama_index.core.schema import TextNode
+from src.llamaindex_app import vector_store
+from src.llamaindex_app.vector_store import MmapVectorStore, matrix_scores
+
+
+def _store(vectors, prefix):
+    store = MmapVectorStore()
+    store.add(
+        [
+            TextNode(id_=f"{prefix}{i}", text="", embedding=vector)
+            for i, vector in enumerate(vectors)
+        ]
+    )
+    return store
+
+
+def test_persist_swaps_matrix_and_ids_together(tmp_path):
+    persist_path = str(tmp_path / "default__vector_store.json")
+    for generation in range(3):
+        _store([[1.0, 0.0], [0.0, 1.0]], f"gen{generation}-").persist(persist_path)
+        loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+        assert loaded.node_ids == [f"gen{generation}-0", f"gen{generation}-1"]
+
+    # The current matrix and the one before it are kept
+    assert len(list(tmp_path.glob("default__vector_store.matrix-*.npy"))) == 2
+
+
+def test_loads_matrix_persisted_without_a_file_reference(tmp_path):
+    np.save(tmp_path / "default__vector_store.npy", np.eye(2, dtype=np.float32))
+    table = {"node_ids": ["a", "b"], "ref_doc_ids": ["None"] * 2, "metadata": [{}, {}]}
+    (tmp_path / "default__vector_store.ids.json").write_text(json.dumps(table))
+
+    assert MmapVectorStore.exists(str(tmp_path))
+    assert MmapVectorStore.from_persist_dir(str(tmp_path)).get("b") == [0.0, 1.0]
+
+
+def test_matrix_scores_scans_float16_in_blocks(monkeypatch):
+    monkeypatch.setattr(vector_store, "SCAN_BLOCK_ROWS", 3)
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(10, 4)).astype(np.float16)
+    query = rng.normal(size=4).astype(np.float32)
+
+    scores = matrix_scores(matrix, query)
+    assert scores.dtype == np.float32
+    np.testing.assert_allclose(scores, matrix.astype(np.float32) @ query, rtol=1e-6)
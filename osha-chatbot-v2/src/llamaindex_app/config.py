@@ -68,6 +68,7 @@ class Settings(BaseSettings):
     API_TIMEOUT: int = 60
     API_MAX_RETRIES: int = 3
     API_RETRY_DELAY: int = 1
+    GUARD_WORKERS: int = 32  # Threads for the blocking guard LLM calls
 
     # Phoenix settings
     phoenix_project_name: str = "10k-chatbot"
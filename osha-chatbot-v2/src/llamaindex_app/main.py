@@ -5,7 +5,8 @@ from .config import Settings
 import logging
 import sys
 import uuid
-from typing import Tuple, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Tuple, Optional
 from opentelemetry.trace.status import Status, StatusCode
 from openinference.semconv.trace import SpanAttributes
 from llama_index.core import Response
@@ -23,6 +24,80 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Guard models run blocking inference, so they get their own pool
+_guard_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _detect_jailbreak(query: str):
+    Guard().use(DetectJailbreak).validate(query)
+
+
+def _detect_toxic_language(query: str):
+    Guard().use(
+        ToxicLanguage,
+        threshold=0.5,  # Adjust sensitivity as needed
+        validation_method="sentence",
+        on_fail="exception",
+    ).validate(query)
+
+
+# Guards run concurrently; the first failing guard short-circuits validation.
+# Each entry is (guard name, validator raising on failure, error message).
+GUARDS: List[Tuple[str, Callable[[str], None], str]] = [
+    ("jailbreak", _detect_jailbreak, "Potential jailbreak attempt detected"),
+    ("toxic", _detect_toxic_language, "Toxic language is not allowed"),
+]
+
+
+def _get_guard_executor() -> ThreadPoolExecutor:
+    """Return the shared guard pool, creating it on first use."""
+    global _guard_executor
+    if _guard_executor is None:
+        _guard_executor = ThreadPoolExecutor(
+            max_workers=Settings().GUARD_WORKERS, thread_name_prefix="guard"
+        )
+    return _guard_executor
+
+
+def _check_guard(name: str, guard: Callable[[str], None], query: str) -> bool:
+    """Run one guard, returning False if it rejects the query or errors."""
+    try:
+        guard(query)
+        return True
+    except Exception as e:
+        # Log the specific validation error
+        logger.warning(f"Interaction validation failed ({name}): {str(e)}")
+        return False
+
+
+def _run_guards(query: str) -> Optional[str]:
+    """
+    Run GUARDS concurrently on the guard pool
+
+    Returns the error message of the first guard to fail, without waiting
+    for the others, or None if every guard passes. Guards that have not
+    started yet are cancelled; running guards finish in the background.
+    """
+    executor = _get_guard_executor()
+    futures = {
+        executor.submit(_check_guard, name, guard, query): message
+        for name, guard, message in GUARDS
+    }
+
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Check in GUARDS order so simultaneous failures are deterministic
+            for future, message in futures.items():
+                if future in done and not future.result():
+                    return message
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
+
+
 def validate_interaction(query: str) -> Optional[str]:
     """
     Validate the user query for potential issues before processing
@@ -31,33 +106,10 @@ def validate_interaction(query: str) -> Optional[str]:
     :return: Error message if validation fails, None if query is valid
     """
     try:
-        # Jailbreak detection
-        jailbreak_guard = Guard().use(DetectJailbreak)
-        jailbreak_guard.validate(query)
-
-        # Toxic language detection
-        toxic_guard = Guard().use(
-            ToxicLanguage,
-            threshold=0.5,  # Adjust sensitivity as needed
-            validation_method="sentence",
-            on_fail="exception",
-        )
-        toxic_guard.validate(query)
-
-        # If both validations pass, return None (no error)
-        return None
-
+        return _run_guards(query)
     except Exception as e:
-        # Log the specific validation error
         logger.warning(f"Interaction validation failed: {str(e)}")
-
-        # Return a generic error message
-        if "jailbreak" in str(e).lower():
-            return "Potential jailbreak attempt detected"
-        elif "toxic" in str(e).lower():
-            return "Toxic language is not allowed"
-        else:
-            return "Input validation failed"
+        return "Input validation failed"
 
 
 def process_interaction(
@@ -0,0 +1,143 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "ingestion_manifest.json"
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Record of the source files in the index, keyed by file name.
+
+    Each entry holds the file's content hash and the ids of the nodes it
+    produced, so a changed or removed file can have exactly its nodes
+    deleted and only the changed files re-parsed and re-embedded. The size
+    and mtime are kept too, so unchanged files are not re-hashed.
+    """
+
+    def __init__(self, files: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.files = files or {}
+        # Hashes computed by this instance, keyed by path, size and mtime
+        self._hashes: Dict[Tuple[str, int, float], str] = {}
+
+    @classmethod
+    def exists(cls, storage_dir: str) -> bool:
+        return (Path(storage_dir) / MANIFEST_FILE).exists()
+
+    @classmethod
+    def load(cls, storage_dir: str) -> "IngestionManifest":
+        path = Path(storage_dir) / MANIFEST_FILE
+        if not path.exists():
+            return cls()
+        with path.open(encoding="utf-8") as f:
+            return cls(json.load(f)["files"])
+
+    def save(self, storage_dir: str):
+        path = Path(storage_dir) / MANIFEST_FILE
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=2)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved ingestion manifest for {len(self.files)} files")
+
+    def _current_hash(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        entry = self.files.get(Path(file_path).name)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+        ):
+            return entry["hash"]
+        key = (file_path, stat.st_size, stat.st_mtime)
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(file_path)
+        return self._hashes[key]
+
+    def diff(self, file_paths: Sequence[str]) -> Tuple[List[str], List[str]]:
+        """
+        Compare source files with the manifest.
+
+        Returns (changed, removed): paths of new or modified files, and names
+        of recorded files that are no longer among the sources.
+        """
+        changed = []
+        for file_path in file_paths:
+            entry = self.files.get(Path(file_path).name)
+            if entry is None or self._current_hash(file_path) != entry["hash"]:
+                changed.append(file_path)
+            else:
+                # Touched but identical: refresh the stat so it is not re-hashed
+                self.record(file_path, entry["node_ids"])
+
+        current = {Path(p).name for p in file_paths}
+        removed = [name for name in self.files if name not in current]
+        return changed, removed
+
+    def node_ids(self, file_name: str) -> List[str]:
+        entry = self.files.get(file_name)
+        return list(entry["node_ids"]) if entry else []
+
+    def record(self, file_path: str, node_ids: List[str]):
+        """
+        Record a file's current hash and the nodes it produced.
+
+        A file missing on disk is recorded without a hash, so it counts as
+        changed once it appears.
+        """
+        entry = {"hash": None, "size": None, "mtime": None}
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            entry = {
+                "hash": self._current_hash(file_path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+            }
+        self.files[Path(file_path).name] = {**entry, "node_ids": list(node_ids)}
+
+    def remove(self, file_name: str):
+        self.files.pop(file_name, None)
+
+
+def replace_file_nodes(
+    index,
+    manifest: IngestionManifest,
+    nodes_by_file: Dict[str, List[Any]],
+    removed: Sequence[str] = (),
+):
+    """
+    Swap the nodes of changed and removed source files in an index.
+
+    Deletes the nodes the manifest recorded for each file in nodes_by_file
+    and each removed file name, then inserts the files' new nodes and
+    records them. Nodes of every other file are left untouched.
+    """
+    stale_files = [Path(file_path).name for file_path in nodes_by_file]
+    stale_files.extend(removed)
+    stale_node_ids = [
+        node_id for name in stale_files for node_id in manifest.node_ids(name)
+    ]
+    if stale_node_ids:
+        index.delete_nodes(stale_node_ids, delete_from_docstore=True)
+    for file_name in removed:
+        manifest.remove(file_name)
+
+    new_nodes = [node for nodes in nodes_by_file.values() for node in nodes]
+    if new_nodes:
+        index.insert_nodes(new_nodes)
+    for file_path, nodes in nodes_by_file.items():
+        manifest.record(file_path, [node.node_id for node in nodes])
@@ -44,6 +44,14 @@ class Settings(BaseSettings):
     STORAGE_DIR: str = str(Path("storage").absolute())
     CHUNK_SIZE: int = 1024
     CHUNK_OVERLAP: int = 20
+    # Fuse BM25 keyword hits with vector hits by reciprocal rank, which helps
+    # exact terms (standard numbers, part numbers, fiscal years)
+    HYBRID_SEARCH: bool = False
+    HYBRID_CANDIDATES: int = 20  # Hits taken from each ranking before fusion
+    HYBRID_RRF_K: int = 60
+    # Restrict retrieval to the OSHA parts and sections a question names
+    # ("1915.12"), read from the osha100.json page URLs at ingestion
+    METADATA_FILTERS: bool = False
     COLLECTOR_ENDPOINT: str = "https://otlp.arize.com/v1"
 
     # AWS/Bedrock settings
@@ -12,6 +12,15 @@ from llama_index.llms.bedrock import Bedrock
 from phoenix.trace import suppress_tracing
 from tenacity import retry, stop_after_attempt, wait_exponential
 from .config import Settings
+from .hybrid_retriever import (
+    HybridRetriever,
+    ScopedRetriever,
+    index_node_ids,
+    node_metadata,
+    node_texts,
+)
+from .lexical_index import BM25Index
+from .metadata_filters import OSHA_PAGES_FILE, MetadataPreFilter, load_osha_pages
 
 logger = logging.getLogger(__name__)
 
@@ -75,8 +84,12 @@ class IndexManager:
             self.storage_path.mkdir(parents=True, exist_ok=True)
 
         try:
-            documents = SimpleDirectoryReader(
-                input_dir=self.settings.DATA_PATH
+            # Crawled OSHA pages become one document each, tagged with their
+            # part and section numbers for METADATA_FILTERS
+            data_path = Path(self.settings.DATA_PATH)
+            documents = load_osha_pages(str(data_path / OSHA_PAGES_FILE))
+            documents += SimpleDirectoryReader(
+                input_dir=self.settings.DATA_PATH, exclude=[OSHA_PAGES_FILE]
             ).load_data()
             index = VectorStoreIndex.from_documents(documents, settings=LlamaSettings)
             index.storage_context.persist(persist_dir=str(self.storage_path))
@@ -85,8 +98,35 @@ class IndexManager:
             logger.error(f"Error creating index: {str(e)}")
             raise
 
+    def _load_lexical_index(self) -> BM25Index:
+        """Load the persisted BM25 index, rebuilding it if the corpus changed."""
+        return BM25Index.load_or_build(
+            str(self.storage_path),
+            index_node_ids(self.index),
+            lambda ids: node_texts(self.index, ids),
+        )
+
+    def _load_prefilter(self) -> MetadataPreFilter:
+        """Collect the OSHA parts and sections in the index for query filters."""
+        return MetadataPreFilter.from_metadata(
+            node_metadata(self.index, index_node_ids(self.index))
+        )
+
     def get_query_engine(self):
-        retriever = self.index.as_retriever(similarity_top_k=3)
+        prefilter = self._load_prefilter() if self.settings.METADATA_FILTERS else None
+        if self.settings.HYBRID_SEARCH:
+            retriever = HybridRetriever(
+                self.index,
+                self._load_lexical_index(),
+                similarity_top_k=3,
+                hybrid_candidates=self.settings.HYBRID_CANDIDATES,
+                rrf_k=self.settings.HYBRID_RRF_K,
+                prefilter=prefilter,
+            )
+        elif prefilter is not None:
+            retriever = ScopedRetriever(self.index, prefilter, similarity_top_k=3)
+        else:
+            retriever = self.index.as_retriever(similarity_top_k=3)
         return QueryEngine(retriever=retriever)
 
 
@@ -0,0 +1,113 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set
+import json
+import logging
+import re
+from llama_index.core import Document
+from llama_index.core.vector_stores import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+
+logger = logging.getLogger(__name__)
+
+OSHA_PAGES_FILE = "osha100.json"
+
+# ".../standardnumber/1915/1915.12" -> part 1915, section 1915.12
+_STANDARD_URL = re.compile(r"/standardnumber/(\d+)/(?:(\d+\.\d+)(?:/|$))?")
+
+# Values of each filterable field a query can name
+QUERY_PATTERNS: Dict[str, Pattern] = {
+    "osha_part": re.compile(r"(?<![\d.])(\d{4})(?!\d)"),
+    "osha_section": re.compile(r"(?<![\d.])(\d{4}\.\d+)(?![\d.])"),
+}
+
+
+def osha_standard(url: str) -> Dict[str, str]:
+    """OSHA part and section numbers from a standard's URL, where present."""
+    match = _STANDARD_URL.search(url)
+    if not match:
+        return {}
+    standard = {"osha_part": match.group(1)}
+    if match.group(2):
+        standard["osha_section"] = match.group(2)
+    return standard
+
+
+def load_osha_pages(path: str) -> List[Document]:
+    """
+    One document per crawled page of osha100.json, tagged with its URL,
+    title and OSHA part/section numbers.
+    """
+    with open(path, encoding="utf-8") as f:
+        pages = json.load(f)["data"]
+    documents = []
+    for page in pages:
+        url = page["metadata"].get("sourceURL", "")
+        documents.append(
+            Document(
+                text=page["markdown"],
+                metadata={
+                    "file_name": Path(path).name,
+                    "url": url,
+                    "title": page["metadata"].get("title", ""),
+                    **osha_standard(url),
+                },
+            )
+        )
+    logger.info(f"Loaded {len(documents)} pages from {path}")
+    return documents
+
+
+class MetadataPreFilter:
+    """
+    Parses the filterable values a query names (e.g. "1915.12" for
+    osha_section) into MetadataFilters, so retrieval only searches the
+    matching nodes. Only values present in the index are used, so a
+    number that names nothing indexed does not empty the results.
+    """
+
+    def __init__(
+        self,
+        values: Dict[str, Set[Any]],
+        patterns: Optional[Dict[str, Pattern]] = None,
+    ):
+        self.values = values
+        self.patterns = QUERY_PATTERNS if patterns is None else patterns
+
+    @classmethod
+    def from_metadata(
+        cls,
+        metadata: Iterable[Dict[str, Any]],
+        patterns: Optional[Dict[str, Pattern]] = None,
+    ) -> "MetadataPreFilter":
+        patterns = QUERY_PATTERNS if patterns is None else patterns
+        values: Dict[str, Set[Any]] = {field: set() for field in patterns}
+        for node_metadata in metadata:
+            for field in patterns:
+                if node_metadata.get(field) is not None:
+                    values[field].add(node_metadata[field])
+        logger.info(
+            "Metadata filters: "
+            + ", ".join(f"{len(v)} {field} values" for field, v in values.items())
+        )
+        return cls(values, patterns)
+
+    def parse(self, query: str) -> Optional[MetadataFilters]:
+        """Filters for the indexed values named in the query, or None."""
+        filters: List[MetadataFilter] = []
+        for field, pattern in self.patterns.items():
+            known = {str(value): value for value in self.values.get(field, ())}
+            matched = sorted(
+                {known[v] for v in pattern.findall(query) if v in known}, key=str
+            )
+            if matched:
+                filters.append(
+                    MetadataFilter(key=field, value=matched, operator=FilterOperator.IN)
+                )
+        return MetadataFilters(filters=filters) if filters else None
+
+    @staticmethod
+    def matches(metadata: Dict[str, Any], filters: MetadataFilters) -> bool:
+        return all(metadata.get(f.key) in f.value for f in filters.filters)